@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+
+from main.cache import get_object_versions
+
+
+UserModel = get_user_model()
+
+
+def user_cache_key(user_id, version):
+    return f'accounts:user:{user_id}:{version}'
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ``ModelBackend`` that keeps the users it loads for ``request.user`` in
+    ``AUTH_USER_CACHE``. Keys carry the user's change stamp, which is bumped
+    whenever the user is saved, so a new password or profile is seen by the
+    next request in every process.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user_id = UserModel._meta.pk.to_python(user_id)
+        except ValidationError:
+            return None
+        cache = caches[getattr(settings, 'AUTH_USER_CACHE', 'default')]
+        [version] = get_object_versions((UserModel, user_id))
+        key = user_cache_key(user_id, version)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300))
+        return user if user is not None and self.user_can_authenticate(user) else None
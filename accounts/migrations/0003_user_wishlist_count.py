@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_user_email_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='wishlist_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
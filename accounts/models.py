@@ -13,6 +13,15 @@ class User(AbstractUser):
     address = models.TextField()
     image = models.FileField(upload_to='users/image')
     status = models.CharField(max_length=50,choices=StatusChoices.choices,default=StatusChoices.CUSTOMER)
+    # Kept by main.wishlist so profile pages need no COUNT.
+    wishlist_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # Registration relies on this rather than checking first; users
+            # made by createsuperuser may still leave the email blank.
+            models.UniqueConstraint(fields=['email'], condition=~models.Q(email=''), name='unique_user_email'),
+        ]
 
     def __str__(self):
         return self.username
\ No newline at end of file
@@ -0,0 +1,57 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+
+class PoolBusy(Exception):
+    pass
+
+
+class PasswordHashPool:
+    """
+    Hashes passwords on threads of its own. At most ``workers`` hashes run
+    at once and ``queue`` more may wait for a thread; past that ``hash()``
+    raises ``PoolBusy`` straight away, so a burst of sign-ups is turned
+    away instead of holding every request worker for a hash.
+    """
+
+    def __init__(self, workers, queue):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self.slots = threading.BoundedSemaphore(workers + queue)
+        self.pid = os.getpid()
+
+    def submit(self, password):
+        if not self.slots.acquire(blocking=False):
+            raise PoolBusy
+        future = self.executor.submit(make_password, password)
+        future.add_done_callback(lambda future: self.slots.release())
+        return future
+
+    async def hash(self, password):
+        return await asyncio.wrap_future(self.submit(password))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        # Worker threads do not survive a fork, so each process makes its own.
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = PasswordHashPool(
+                getattr(settings, 'PASSWORD_HASH_WORKERS', 2), getattr(settings, 'PASSWORD_HASH_QUEUE', 8)
+            )
+        return _pool
+
+
+async def hash_password(password):
+    """Hash ``password`` on the pool, or in the caller's thread when ``PASSWORD_HASH_WORKERS`` is 0."""
+    if not getattr(settings, 'PASSWORD_HASH_WORKERS', 2):
+        return make_password(password)
+    return await get_pool().hash(password)
@@ -0,0 +1,18 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from main.cache import touch_objects
+
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def touch_user(sender, instance, **kwargs):
+    # Covers profile edits and password changes; queryset updates bypass it.
+    # Touched again after commit, in case another request cached the old
+    # row in between.
+    pk = instance.pk
+    touch_objects((User, pk))
+    transaction.on_commit(lambda: touch_objects((User, pk)))
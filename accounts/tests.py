@@ -1,3 +1,99 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import threading
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from unittest import mock
+
+from django.contrib.messages import get_messages
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import User
+from .passwords import PasswordHashPool, PoolBusy
+
+
+class CachedUserTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches['users'].clear()
+        self.user = User.objects.create_user('buyer', password='secret', first_name='Old')
+        self.client.force_login(self.user)
+
+    def test_signed_in_pages_load_the_user_from_the_cache(self):
+        url = reverse('accounts:profile_main')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        # The page's own order summary row; neither the session nor the user.
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_profile_edits_reach_the_next_request(self):
+        url = reverse('accounts:profile_settings')
+        self.client.get(url)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(MEDIA_ROOT=directory):
+            response = self.client.post(url, {
+                'username': 'buyer', 'first_name': 'New', 'last_name': 'Name', 'email': 'buyer@example.com',
+                'phone': '123', 'address': 'Street', 'image': SimpleUploadedFile('avatar.png', b'avatar'),
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.get(url).context['user'].first_name, 'New')
+
+    def test_password_change_signs_out_cached_sessions(self):
+        url = reverse('accounts:profile_main')
+        self.client.get(url)
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+
+class RegistrationTests(TestCase):
+
+    def register(self, username='buyer', email='buyer@example.com'):
+        return self.client.post(reverse('accounts:register'), {
+            'username': username, 'email': email, 'phone': '123', 'address': 'Street',
+            'password': 'correct horse', 'password2': 'correct horse',
+        })
+
+    def last_message(self, response):
+        return [str(message) for message in get_messages(response.wsgi_request)][-1]
+
+    def test_registration_is_one_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.register()
+        statements = [query['sql'] for query in queries if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('INSERT'))
+        self.assertRedirects(response, reverse('accounts:login'), fetch_redirect_response=False)
+        self.assertTrue(User.objects.get(username='buyer').check_password('correct horse'))
+
+    def test_duplicates_are_reported_from_the_constraints(self):
+        self.register()
+        response = self.register(email='other@example.com')
+        self.assertEqual(self.last_message(response), 'Username already exists!')
+        response = self.register(username='other')
+        self.assertEqual(self.last_message(response), 'Email already exists!')
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_a_full_pool_turns_sign_ups_away(self):
+        with mock.patch.object(PasswordHashPool, 'submit', side_effect=PoolBusy):
+            response = self.register()
+        self.assertRedirects(response, reverse('accounts:register'), fetch_redirect_response=False)
+        self.assertFalse(User.objects.exists())
+
+    def test_pool_rejects_hashes_beyond_its_queue(self):
+        pool = PasswordHashPool(workers=1, queue=0)
+        release = threading.Event()
+        with mock.patch('accounts.passwords.make_password', side_effect=lambda password: release.wait()):
+            future = pool.submit('first')
+            with self.assertRaises(PoolBusy):
+                pool.submit('second')
+            release.set()
+            future.result()
+        pool.submit('third').result()
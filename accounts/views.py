@@ -1,11 +1,20 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
-from django.views.generic import TemplateView, CreateView, UpdateView
+from django.views.generic import ListView, TemplateView, UpdateView
 from django.contrib.auth.views import LoginView, LogoutView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
 from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+
+from main.database import retry_on_locked
+from main.models import Order, OrderItem, OrderSummary, Product, WishlistItem
+from main.pagination import CursorPaginationMixin
+from main.sellers import counted_product_wishlists, get_seller_summary, low_stock_products
 
 from .models import User
+from .passwords import PoolBusy, hash_password
 
 
 class UserLoginView(LoginView):
@@ -20,40 +29,74 @@ class UserLoginView(LoginView):
         return super().form_invalid(form)
 
 
-class UserRegisterView(CreateView):
-    model = User
+def duplicate_field(error):
+    """The column an IntegrityError from the user insert is about, if it is a duplicate."""
+    # SQLite names the column, PostgreSQL the constraint.
+    message, table = str(error), User._meta.db_table
+    for field, markers in (
+        ('username', (f'{table}.username', f'{table}_username_key')),
+        ('email', (f'{table}.email', 'unique_user_email')),
+    ):
+        if any(marker in message for marker in markers):
+            return field
+    return None
+
+
+@retry_on_locked
+def insert_user(**fields):
+    with transaction.atomic():
+        return User.objects.create(**fields)
+
+
+class UserRegisterView(TemplateView):
     template_name = 'accounts/page-user-register.html'
-    fields = ['username', 'email', 'password', 'phone', 'address']
-    success_url = reverse_lazy('accounts:login')
+    duplicate_messages = {
+        'username': 'Username already exists!',
+        'email': 'Email already exists!',
+    }
+    
+    async def get(self, request, *args, **kwargs):
+        return self.render_to_response(self.get_context_data(**kwargs))
     
-    def post(self, request, *args, **kwargs):
-        username = request.POST.get('username')
-        email = request.POST.get('email')
+    async def post(self, request, *args, **kwargs):
+        username = request.POST.get('username', '')
+        email = request.POST.get('email', '')
         password = request.POST.get('password')
         password2 = request.POST.get('password2')
-        phone = request.POST.get('phone')
-        address = request.POST.get('address')
+        phone = request.POST.get('phone', '')
+        address = request.POST.get('address', '')
+        
+        if not username:
+            messages.error(request, 'Username is required!')
+            return redirect('accounts:register')
         
         if password != password2:
             messages.error(request, 'Passwords do not match!')
             return redirect('accounts:register')
         
-        if User.objects.filter(username=username).exists():
-            messages.error(request, 'Username already exists!')
+        # Hashing is the slow part of a sign-up, so it runs on its own small
+        # pool and the unique constraints settle duplicates in one insert.
+        try:
+            password = await hash_password(password)
+        except PoolBusy:
+            messages.error(request, 'Too many sign-ups right now, please try again in a moment.')
             return redirect('accounts:register')
         
-        if User.objects.filter(email=email).exists():
-            messages.error(request, 'Email already exists!')
+        try:
+            await sync_to_async(insert_user)(
+                username=User.normalize_username(username),
+                email=User.objects.normalize_email(email),
+                password=password,
+                phone=phone,
+                address=address
+            )
+        except IntegrityError as error:
+            field = duplicate_field(error)
+            if field is None:
+                raise
+            messages.error(request, self.duplicate_messages[field])
             return redirect('accounts:register')
         
-        user = User.objects.create_user(
-            username=username,
-            email=email,
-            password=password,
-            phone=phone,
-            address=address
-        )
-        
         messages.success(request, 'Registration successful! You can now login.')
         return redirect('accounts:login')
 
@@ -71,11 +114,12 @@ class ProfileMainView(LoginRequiredMixin, TemplateView):
         user = self.request.user
         context['user'] = user
         
-        context['orders_count'] = 0  
-        context['wishlist_count'] = 0  
-        context['awaiting_delivery'] = 0
-        context['delivered_items'] = 0
-        context['recent_orders'] = []  
+        summary = OrderSummary.objects.filter(user=user).first() or OrderSummary(user=user)
+        context['orders_count'] = summary.orders_count
+        context['wishlist_count'] = user.wishlist_count
+        context['awaiting_delivery'] = summary.awaiting_delivery
+        context['delivered_items'] = summary.delivered_items
+        context['recent_orders'] = summary.get_recent_orders()
         
         return context
 
@@ -91,8 +135,9 @@ class ProfileSettingView(LoginRequiredMixin, UpdateView):
         return self.request.user
     
     def form_valid(self, form):
+        self.object = retry_on_locked(form.save)()
         messages.success(self.request, 'Профиль успешно обновлен!')
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
 
 
 class ProfileAddressView(LoginRequiredMixin, TemplateView):
@@ -105,14 +150,19 @@ class ProfileAddressView(LoginRequiredMixin, TemplateView):
         return context
 
 
-class ProfileOrdersView(LoginRequiredMixin, TemplateView):
+class ProfileOrdersView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     template_name = 'accounts/page-profile-orders.html'
     login_url = reverse_lazy('accounts:login')
+    context_object_name = 'orders'
+    paginate_by = 10
+    cursor_pagination = True
     
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['orders'] = []
-        return context
+    def get_queryset(self):
+        # One query for the page and one for its items with their products.
+        return (
+            Order.objects.filter(user=self.request.user).order_by('-created_at', '-id')
+            .prefetch_related(Prefetch('items', queryset=OrderItem.objects.select_related('product')))
+        )
 
 
 class ProfileWishlistView(LoginRequiredMixin, TemplateView):
@@ -121,13 +171,27 @@ class ProfileWishlistView(LoginRequiredMixin, TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['wishlist'] = []
+        context['wishlist'] = (
+            WishlistItem.objects.filter(user=self.request.user)
+            .select_related('product').order_by('-created_at')
+        )
         return context
 
 
-class ProfileSellerView(LoginRequiredMixin, TemplateView):
+class ProfileSellerView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     template_name = 'accounts/page-profile-seller.html'
     login_url = reverse_lazy('accounts:login')
+    context_object_name = 'products'
+    paginate_by = 20
+    cursor_pagination = True
+    
+    def get_queryset(self):
+        if self.request.user.status != 'seller':
+            return Product.objects.none()
+        return (
+            Product.objects.filter(seller=self.request.user).order_by('-created_at', '-id')
+            .annotate(wishlisted=counted_product_wishlists())
+        )
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -135,6 +199,10 @@ class ProfileSellerView(LoginRequiredMixin, TemplateView):
         
         if user.status != 'seller':
             messages.warning(self.request, 'У вас нет прав продавца')
+            return context
         
-        context['products'] = []
-        return context
\ No newline at end of file
+        # Totals come from the stored summary and the alerts from an index,
+        # so neither grows with the size of the catalog.
+        context['summary'] = get_seller_summary(user)
+        context['low_stock'] = low_stock_products(user)
+        return context
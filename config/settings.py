@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -52,6 +53,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'main.middleware.StaticFilesMiddleware',
+    'main.middleware.RequestMetricsMiddleware',
+    'main.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -64,6 +68,9 @@ ROOT_URLCONF = 'config.urls'
 
 AUTH_USER_MODEL = 'accounts.User'
 
+# Loads request.user through AUTH_USER_CACHE instead of a query per request.
+AUTHENTICATION_BACKENDS = ['accounts.backends.CachedModelBackend']
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -90,9 +97,63 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # Keep connections open between requests and check them before reuse.
+        # config.asgi turns this off: each async request may run its sync
+        # code on a different thread, which would leave connections behind.
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Seconds a connection waits for another process's write lock.
+            'timeout': 10,
+        },
+        # A file rather than the shared in-memory database, so threads in the
+        # concurrency tests wait for the write lock instead of failing.
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    },
+    # Stand-in for a read replica: a copy of the primary that sync_replica
+    # refreshes. Reads use the primary until the file exists.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.replica.sqlite3',
+        # sync_replica swaps the file in with os.replace and an open
+        # connection keeps reading the old one, so reconnect every request.
+        'CONN_MAX_AGE': 0,
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
 }
 
+# Applied by main.database to every new SQLite connection. WAL lets
+# readers carry on while a write is in progress.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -32000,
+    'temp_store': 'memory',
+}
+
+# Writes that still find the database locked after the busy timeout are
+# retried with backoff this many times in all.
+DATABASE_WRITE_ATTEMPTS = 5
+DATABASE_WRITE_RETRY_DELAY = 0.05
+
+DATABASE_ROUTERS = ['main.routers.PrimaryReplicaRouter']
+
+DATABASE_READ_REPLICA = 'replica'
+
+# How long a client reads from the primary after its own write. The replica
+# can be a whole sync_replica --interval plus one copy behind, so keep it
+# above that.
+REPLICA_STICKY_SECONDS = 10
+
+# Pages rendered from the replica are cached this long at most, since they
+# may predate the version they are stored under.
+REPLICA_CACHE_TIMEOUT = 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -112,6 +173,12 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Threads that hash passwords for sign-ups, and sign-ups that may wait for
+# one before the rest are asked to try again. 0 hashes in the request.
+PASSWORD_HASH_WORKERS = 2
+
+PASSWORD_HASH_QUEUE = 8
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -134,10 +201,128 @@ STATICFILES_DIRS = [ BASE_DIR/'static']
 
 STATIC_ROOT = BASE_DIR/'staticfiles'
 
+# Content-hashed names, unused CSS selectors stripped and gzip/brotli siblings,
+# all written by collectstatic (see the build_static command).
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'main.staticfiles.StorefrontStaticFilesStorage',
+    },
+}
+
+# Class name prefixes to keep when stripping CSS, for classes built at runtime.
+STATIC_PURGE_SAFELIST = []
+
 MEDIA_URL = '/media/'
 
 MEDIA_ROOT = BASE_DIR/'media'   
 
+# Widths of the resized copies made of product, category and country images,
+# and the processes that make them after an upload. 0 resizes in the request.
+IMAGE_DERIVATIVE_WIDTHS = (160, 320, 800)
+
+IMAGE_DERIVATIVE_WORKERS = 2
+
+# Neighbours stored per product for the "Related Products" sidebar, and
+# whether saving a product recomputes the neighbourhood it touches.
+RELATED_PRODUCTS_COUNT = 6
+
+RELATED_PRODUCTS_UPDATE_ON_SAVE = True
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# File based so every worker process sees the same version numbers; a
+# local-memory cache would keep serving stale pages in the other workers.
+# Tests swap it for a local-memory cache of their own (see TEST_RUNNER),
+# so clearing it between tests leaves a running server's cache alone.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DJANGO_CACHE_DIR', BASE_DIR / '.cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+    # Signed-in users, per process. Safe to keep locally because the keys
+    # carry each user's version from the shared cache above.
+    'users': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'online-shop-users',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+TEST_RUNNER = 'main.testing.TestRunner'
+
+AUTH_USER_CACHE = 'users'
+
+AUTH_USER_CACHE_TIMEOUT = 60 * 5
+
+# Sessions are read from the cache and only written through to the
+# database; 'django.contrib.sessions.backends.signed_cookies' keeps them
+# out of the server altogether.
+SESSION_ENGINE = os.environ.get('DJANGO_SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+
+STOREFRONT_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+# Request metrics
+# Per-view query budgets are checked by main.middleware.RequestMetricsMiddleware;
+# QUERY_BUDGET_ACTION is 'log' or 'raise'. Set REQUEST_METRICS_LOG to a file
+# path to append one JSON line per request.
+
+REQUEST_METRICS_LOG = None
+
+QUERY_BUDGET_ACTION = 'log'
+
+QUERY_BUDGETS = {
+    'main:home': 10,
+    'main:category_list': 4,
+    'main:category_detail': 4,
+    'main:product_list': 8,
+    'main:product_list_large': 8,
+    'main:product_detail': 8,
+    'main:search': 8,
+    'main:content': 3,
+    'accounts:profile_main': 4,
+    'accounts:profile_orders': 4,
+    'accounts:profile_wishlist': 4,
+    'accounts:profile_seller': 8,
+}
+
+
+# Product search
+# Any subclass of main.search.BaseSearchBackend; use
+# 'main.search.DatabaseSearchBackend' on databases without FTS5.
+
+SEARCH_BACKEND = 'main.search.SQLiteFTSBackend'
+
+
+# Inventory
+# Seconds a reservation holds stock before release_expired_reservations
+# puts it back on the shelf.
+
+INVENTORY_RESERVATION_TTL = 60 * 15
+
+
+# Sellers
+# The dashboard reads main.SellerSummary, refreshed by refresh_seller_summaries
+# and again on a visit once it is older than SELLER_SUMMARY_MAX_AGE seconds.
+# Product views are written to the database every PRODUCT_VIEW_FLUSH_INTERVAL
+# seconds per process.
+
+SELLER_SUMMARY_MAX_AGE = 60 * 5
+
+SELLER_LOW_STOCK = 5
+
+PRODUCT_VIEW_FLUSH_INTERVAL = 10
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -1,7 +1,8 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.admin import TabularInline
 from unfold.admin import ModelAdmin
-from .models import Category, ProductCategory, Country, Product, ProductImage, Service
+from .models import Category, ProductCategory, Country, Product, ProductImage, Service, Order, OrderItem, OrderStatus
+from .orders import OrderError, set_order_status
 
 
 @admin.register(Category)
@@ -35,11 +36,12 @@ class ProductImageInline(TabularInline):
 
 @admin.register(Product)
 class ProductAdmin(ModelAdmin):
-    list_display = ['title', 'price', 'product_category', 'country', 'quantity', 'star', 'verified', 'is_active']
+    list_display = ['title', 'price', 'product_category', 'country', 'seller', 'quantity', 'star', 'verified', 'is_active']
     list_filter = ['is_active', 'verified', 'recommended', 'product_category', 'country', 'created_at']
     search_fields = ['title', 'desc', 'company', 'brand']
     prepopulated_fields = {'slug': ('title',)}
     readonly_fields = ['created_at', 'update_at']
+    raw_id_fields = ['seller']
     inlines = [ProductImageInline]
     
     fieldsets = (
@@ -49,6 +51,9 @@ class ProductAdmin(ModelAdmin):
         ('Категория и страна', {
             'fields': ('product_category', 'country')
         }),
+        ('Продавец', {
+            'fields': ('seller',)
+        }),
         ('Цена и количество', {
             'fields': ('price', 'quantity', 'dicount')
         }),
@@ -79,4 +84,36 @@ class ProductImageAdmin(ModelAdmin):
 class ServiceAdmin(ModelAdmin):
     list_display = ['title', 'is_active']
     list_filter = ['is_active']
-    search_fields = ['title', 'desc']
\ No newline at end of file
+    search_fields = ['title', 'desc']
+
+
+class OrderItemInline(TabularInline):
+    model = OrderItem
+    extra = 0
+    fields = ['product', 'title', 'price', 'quantity']
+    readonly_fields = fields
+    can_delete = False
+
+
+def order_status_action(status):
+    # Statuses only move through set_order_status(), so the customers'
+    # order summaries follow.
+    def action(modeladmin, request, queryset):
+        for order in queryset:
+            try:
+                set_order_status(order, status)
+            except OrderError as error:
+                modeladmin.message_user(request, str(error), messages.WARNING)
+    action.__name__ = f'mark_{status}'
+    action.short_description = f'Mark as {status.label.lower()}'
+    return action
+
+
+@admin.register(Order)
+class OrderAdmin(ModelAdmin):
+    list_display = ['id', 'user', 'status', 'total', 'item_count', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['user__username', 'user__email']
+    readonly_fields = ['user', 'status', 'total', 'item_count', 'created_at', 'updated_at']
+    inlines = [OrderItemInline]
+    actions = [order_status_action(status) for status in OrderStatus if status != OrderStatus.PENDING]
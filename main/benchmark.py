@@ -0,0 +1,150 @@
+import asyncio
+import json
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+
+from .metrics import percentile
+
+
+HOST = 'localhost'
+
+
+def wsgi_get(application, url):
+    parts = urlsplit(url)
+    environ = {'PATH_INFO': parts.path, 'QUERY_STRING': parts.query, 'HTTP_HOST': HOST}
+    setup_testing_defaults(environ)
+    status = []
+    body = application(environ, lambda code, headers, exc_info=None: status.append(int(code.split()[0])))
+    try:
+        b''.join(body)
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+    return status[0]
+
+
+async def asgi_get(application, url):
+    parts = urlsplit(url)
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': parts.path, 'raw_path': parts.path.encode(), 'query_string': parts.query.encode(),
+        'root_path': '', 'headers': [(b'host', HOST.encode())], 'client': ('127.0.0.1', 0), 'server': (HOST, 80),
+    }
+    status = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(latencies):
+    """Latency percentiles in milliseconds for a list of seconds."""
+    milliseconds = [latency * 1000 for latency in latencies]
+    return {
+        'count': len(milliseconds),
+        'p50_ms': round(percentile(milliseconds, 0.50), 3),
+        'p95_ms': round(percentile(milliseconds, 0.95), 3),
+        'p99_ms': round(percentile(milliseconds, 0.99), 3),
+        'max_ms': round(max(milliseconds, default=0), 3),
+    }
+
+
+class LoadRun:
+    """
+    Runs ``worker(client_number, record)`` in ``clients`` threads. Workers
+    call ``record(name, seconds, ok)`` for every operation; the run reports
+    throughput and latency percentiles per name.
+    """
+
+    def __init__(self, clients):
+        self.clients = clients
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.elapsed = 0.0
+
+    def record(self, name, seconds, ok=True):
+        with self.lock:
+            self.latencies[name].append(seconds)
+            if not ok:
+                self.errors[name] += 1
+
+    def run(self, worker):
+        threads = [
+            threading.Thread(target=worker, args=(number, self.record))
+            for number in range(self.clients)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.elapsed = time.perf_counter() - started
+        return self.results()
+
+    def run_async(self, worker):
+        """Like ``run()`` for a coroutine ``worker``, with every client a task on one event loop."""
+        async def clients():
+            await asyncio.gather(*(worker(number, self.record) for number in range(self.clients)))
+
+        started = time.perf_counter()
+        asyncio.run(clients())
+        self.elapsed = time.perf_counter() - started
+        return self.results()
+
+    def results(self):
+        total = sum(len(values) for values in self.latencies.values())
+        everything = [latency for values in self.latencies.values() for latency in values]
+        return {
+            'clients': self.clients,
+            'elapsed_s': round(self.elapsed, 3),
+            'requests': total,
+            'errors': sum(self.errors.values()),
+            'throughput_rps': round(total / self.elapsed, 2) if self.elapsed else 0,
+            'latency': summarize(everything),
+            'targets': {
+                name: {**summarize(values), 'errors': self.errors[name]}
+                for name, values in sorted(self.latencies.items())
+            },
+        }
+
+
+def write_results(path, name, options, results):
+    document = {
+        'benchmark': name,
+        'revision': git_revision(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'options': options,
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as output:
+        json.dump(document, output, indent=2, default=str)
+    return document
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as source:
+        return json.load(source)
@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from .routers import REPLICA_SYNCED_KEY, reading_from_replica
+
+
+# The pk a model's own change stamp is stored under, like an object's.
+MODEL_STAMP = 'changed'
+
+
+def version_key(model):
+    return f'main:version:{model._meta.label_lower}'
+
+
+def new_version():
+    # Versions start from the clock rather than 1, so a key that was evicted
+    # never comes back with a number some stale fragment was stored under.
+    return int(time.time() * 1000)
+
+
+def get_versions(*models):
+    """Return ``{model_name: version}`` without touching the database."""
+    keys = {version_key(model): model._meta.model_name for model in models}
+    stored = cache.get_many(keys)
+    for key in keys.keys() - stored.keys():
+        cache.add(key, new_version(), timeout=None)
+        stored[key] = cache.get(key)
+    return {name: stored[key] for key, name in keys.items()}
+
+
+def bump_version(model):
+    try:
+        cache.incr(version_key(model))
+    except ValueError:
+        cache.set(version_key(model), new_version(), timeout=None)
+    # The version only counts changes; this stamp records when the last was.
+    touch_objects((model, MODEL_STAMP))
+
+
+def object_version_key(model, pk):
+    return f'{version_key(model)}:{pk}'
+
+
+def get_object_versions(*objects):
+    """
+    Return the change stamps of ``(model, pk)`` pairs. They are millisecond
+    timestamps, so the newest one doubles as a Last-Modified date.
+    """
+    keys = [object_version_key(model, pk) for model, pk in objects]
+    stored = cache.get_many(keys)
+    for key in keys:
+        if key not in stored:
+            cache.add(key, new_version(), timeout=None)
+            stored[key] = cache.get(key)
+    return [stored[key] for key in keys]
+
+
+def touch_objects(*objects):
+    stamp = new_version()
+    cache.set_many({
+        object_version_key(model, pk): stamp
+        for model, pk in objects
+        if pk is not None
+    }, timeout=None)
+
+
+aget_versions = sync_to_async(get_versions)
+aget_object_versions = sync_to_async(get_object_versions)
+
+
+async def aget_page_versions(models, objects):
+    """
+    The versions of ``models`` and the stamps of ``objects`` a page is built
+    from. The stamps include when each of ``models`` last changed, so the
+    Last-Modified date moves whenever the versions do.
+    """
+    return await asyncio.gather(
+        aget_versions(*models), aget_object_versions(*objects, *[(model, MODEL_STAMP) for model in models])
+    )
+
+
+async def get_user_pk(request):
+    # The user is loaded from the session on first access, which is a query
+    # and so cannot happen on the event loop.
+    return await sync_to_async(lambda: request.user.pk)()
+
+
+class ConditionalGetMixin:
+    """
+    Answers GET and HEAD from validators that ``get_validators()`` computes
+    before the object is loaded: a conditional request that still matches
+    gets a 304, and a plain HEAD gets the headers without a render.
+    ``get_validators()`` is a coroutine returning ``(parts, stamps)``; the
+    ETag hashes both and the newest stamp is the Last-Modified date.
+    For async views.
+    """
+
+    async def get_validators(self):
+        return None
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or CookieStorage.cookie_name in request.COOKIES:
+            return await super().dispatch(request, *args, **kwargs)
+        validators = await self.get_validators()
+        if validators is None:
+            return await super().dispatch(request, *args, **kwargs)
+
+        parts, stamps = validators
+        # Pages greet the signed in user by name, so each user gets their own tag.
+        parts = [*parts, *stamps, await get_user_pk(request)]
+        if reading_from_replica():
+            # The page shows the replica's copy, which changes when it is synced.
+            parts.append(await cache.aget(REPLICA_SYNCED_KEY))
+        etag = quote_etag(hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest())
+        last_modified = max(stamps) // 1000
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            if request.method == 'HEAD':
+                response = HttpResponse(content_type='text/html; charset=utf-8')
+            else:
+                response = await super().dispatch(request, *args, **kwargs)
+        if not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(last_modified)
+        response.headers.setdefault('ETag', etag)
+        return response
+
+
+class VersionedCacheMixin:
+    """
+    Serves the whole page to anonymous visitors from the cache and exposes
+    ``versions`` and ``cache_timeout`` so templates can wrap their sections
+    in ``{% cache %}`` fragments for everyone else. Keys change whenever a
+    model in ``cache_models`` is saved or deleted. For async views.
+    """
+    cache_models = ()
+    cache_timeout = None
+
+    def get_cache_timeout(self):
+        timeout = self.cache_timeout
+        if timeout is None:
+            timeout = getattr(settings, 'STOREFRONT_CACHE_TIMEOUT', 60 * 60 * 24)
+        if reading_from_replica():
+            timeout = min(timeout, getattr(settings, 'REPLICA_CACHE_TIMEOUT', 60))
+        return timeout
+
+    def get_versions(self):
+        if not hasattr(self, '_versions'):
+            self._versions = get_versions(*self.cache_models)
+        return self._versions
+
+    def get_page_cache_key(self):
+        versions = '.'.join(str(version) for version in self.get_versions().values())
+        return f'main:page:{self.request.resolver_match.view_name}:{self.request.path}:{versions}'
+
+    async def can_cache_page(self):
+        return (
+            self.request.method in ('GET', 'HEAD')
+            and CookieStorage.cookie_name not in self.request.COOKIES
+            and await get_user_pk(self.request) is None
+        )
+
+    async def dispatch(self, request, *args, **kwargs):
+        self._versions = await aget_versions(*self.cache_models)
+        if not await self.can_cache_page():
+            return await super().dispatch(request, *args, **kwargs)
+
+        key = self.get_page_cache_key()
+        content = await cache.aget(key)
+        if content is not None:
+            return HttpResponse(content)
+
+        response = await super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            response.add_post_render_callback(
+                lambda response: cache.set(key, response.content, self.get_cache_timeout())
+            )
+        return response
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['versions'] = self.get_versions()
+        context['cache_timeout'] = self.get_cache_timeout()
+        return context
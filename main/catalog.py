@@ -0,0 +1,313 @@
+import csv
+import json
+import time
+from collections import defaultdict
+from datetime import date
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
+from .cache import bump_version, touch_objects
+from .counters import reconcile_product_counts
+from .facets import rebuild_facet_counts
+from .models import Category, ProductCategory, Country, Product, ProductImage
+from .search import get_backend
+from .slugs import SlugAllocator, slug_base
+from .sorting import SORT_KEY_SOURCES, set_sort_keys, sort_key_expressions
+
+
+FORMATS = ('csv', 'jsonl')
+COLUMNS = [
+    'slug', 'title', 'desc', 'price', 'category', 'product_category', 'country', 'main_image', 'images',
+    'quantity', 'review', 'year', 'delivery_time', 'star', 'company', 'brand', 'size', 'dicount', 'color',
+    'verified', 'recommended', 'condition', 'is_active',
+]
+RELATED_COLUMNS = ('category', 'product_category', 'country', 'images')
+FIELDS = [column for column in COLUMNS if column not in RELATED_COLUMNS and column != 'slug']
+REQUIRED = ('title', 'price', 'product_category')
+IMAGE_SEPARATOR = '|'
+
+
+def guess_format(path):
+    return 'jsonl' if str(path).endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_rows(stream, format):
+    if format == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def parse_boolean(value):
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in ('1', 'true', 't', 'yes', 'y'):
+        return True
+    if value in ('0', 'false', 'f', 'no', 'n'):
+        return False
+    raise ValidationError(f'"{value}" is not a boolean')
+
+
+def parse_value(name, value):
+    field = Product._meta.get_field(name)
+    if value is None or value == '':
+        if field.null:
+            return None
+        if field.has_default():
+            return field.get_default()
+        return ''
+    if field.get_internal_type() == 'BooleanField':
+        return parse_boolean(value)
+    value = field.to_python(value.strip() if isinstance(value, str) else value)
+    if field.choices and value not in dict(field.flatchoices):
+        raise ValidationError(f'"{value}" is not a valid {name}')
+    return value
+
+
+def update_products(products, names):
+    """
+    Write ``names`` of every product with one prepared UPDATE run through
+    ``executemany``. ``bulk_update`` builds a CASE with a branch per row,
+    which gets quadratically slower as batches grow.
+    """
+    fields = [Product._meta.get_field(name) for name in names]
+    quote = connection.ops.quote_name
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        quote(Product._meta.db_table),
+        ', '.join(f'{quote(field.column)} = %s' for field in fields),
+        quote(Product._meta.pk.column),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [field.get_db_prep_save(getattr(product, field.attname), connection) for field in fields] + [product.pk]
+            for product in products
+        ])
+
+
+class CatalogImporter:
+    """
+    Creates and updates products from rows of CSV or JSONL, a batch at a
+    time. Categories, product categories and countries are looked up in maps
+    loaded once up front, and slugs are allocated for a whole batch at once,
+    so the number of queries depends on the number of batches, not rows.
+    """
+
+    def __init__(self, batch_size=1000, update_existing=True):
+        self.batch_size = batch_size
+        self.update_existing = update_existing
+        self.slugs = {model: SlugAllocator(model) for model in (Category, ProductCategory, Product)}
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.errors = []
+        self.load_lookups()
+
+    def load_lookups(self):
+        self.categories = {}
+        for category in Category.objects.all():
+            self.categories.setdefault(category.slug, category)
+            self.categories.setdefault(category.name.lower(), category)
+        self.product_categories = {}
+        for product_category in ProductCategory.objects.all():
+            self.product_categories.setdefault(product_category.slug, product_category)
+            self.product_categories.setdefault(
+                (product_category.category_id, product_category.name.lower()), product_category
+            )
+        self.countries = {}
+        for country in Country.objects.all():
+            self.countries.setdefault(country.name.lower(), country)
+
+    def resolve_category(self, value):
+        key = value.strip()
+        category = self.categories.get(key) or self.categories.get(key.lower())
+        if category is None:
+            category = Category(name=key, slug=self.slugs[Category].allocate(key), image='', description='')
+            Category.objects.bulk_create([category])
+            self.categories[category.slug] = self.categories[key.lower()] = category
+        return category
+
+    def resolve_product_category(self, value, category_value):
+        key = value.strip()
+        if key in self.product_categories:
+            return self.product_categories[key]
+        if not category_value:
+            raise ValidationError(f'Unknown product category "{key}" and no category to create it in')
+        category = self.resolve_category(category_value)
+        product_category = self.product_categories.get((category.pk, key.lower()))
+        if product_category is None:
+            product_category = ProductCategory(
+                name=key, slug=self.slugs[ProductCategory].allocate(key), category=category
+            )
+            ProductCategory.objects.bulk_create([product_category])
+            self.product_categories[product_category.slug] = product_category
+            self.product_categories[(category.pk, key.lower())] = product_category
+        return product_category
+
+    def resolve_country(self, value):
+        if not value or not value.strip():
+            return None
+        key = value.strip()
+        country = self.countries.get(key.lower())
+        if country is None:
+            country = Country(name=key, icon='')
+            Country.objects.bulk_create([country])
+            self.countries[key.lower()] = country
+        return country
+
+    def build(self, row):
+        missing = [column for column in REQUIRED if not row.get(column)]
+        if missing:
+            raise ValidationError(f'Missing {", ".join(missing)}')
+        values = {name: parse_value(name, row[name]) for name in FIELDS if name in row}
+        values['product_category'] = self.resolve_product_category(
+            str(row['product_category']), str(row.get('category') or '')
+        )
+        if 'country' in row:
+            values['country'] = self.resolve_country(row['country'])
+        return values
+
+    def run(self, rows):
+        started = time.perf_counter()
+        number = 0
+        for batch in batches(rows, self.batch_size):
+            self.import_batch(batch, number)
+            number += len(batch)
+
+        if self.created or self.updated:
+            rebuild_facet_counts()
+            reconcile_product_counts()
+            for model in (Category, ProductCategory, Country, Product):
+                bump_version(model)
+        elapsed = time.perf_counter() - started
+        return {
+            'rows': number,
+            'created': self.created,
+            'updated': self.updated,
+            'skipped': self.skipped,
+            'errors': len(self.errors),
+            'elapsed_s': round(elapsed, 3),
+            'rows_per_s': round(number / elapsed, 1) if elapsed else 0,
+        }
+
+    @transaction.atomic
+    def import_batch(self, rows, offset):
+        existing, pages = {}, set()
+        for slug, pk, product_category_id, category_id in (
+            Product.objects.filter(slug__in=[row['slug'] for row in rows if row.get('slug')])
+            .values_list('slug', 'pk', 'product_category_id', 'product_category__category_id')
+        ):
+            existing[slug] = pk
+            pages.update([(ProductCategory, product_category_id), (Category, category_id)])
+        creates, updates, images = [], [], []
+        # Rows may leave columns out; each is only written the ones it has.
+        update_groups = defaultdict(list)
+        seen = set()
+        for number, row in enumerate(rows, offset + 1):
+            try:
+                values = self.build(row)
+            except (ValidationError, ValueError, TypeError) as error:
+                message = '; '.join(error.messages) if isinstance(error, ValidationError) else str(error)
+                self.errors.append((number, message))
+                continue
+
+            slug = row.get('slug')
+            if slug and slug in seen:
+                self.errors.append((number, f'Duplicate slug "{slug}"'))
+                continue
+            seen.add(slug)
+            if slug in existing:
+                if not self.update_existing:
+                    self.skipped += 1
+                    continue
+                product = Product(pk=existing[slug], slug=slug, update_at=date.today(), **values)
+                updates.append(product)
+                update_groups[frozenset(values)].append(product)
+            else:
+                product = Product(slug=slug or None, **values)
+                set_sort_keys(product)
+                creates.append(product)
+            if row.get('images') not in (None, ''):
+                images.append((product, row['images']))
+
+        # Bases are loaded before the rows' own slugs are reserved, so
+        # "phone-3" from the file is never handed out again for "Phone".
+        allocator = self.slugs[Product]
+        given = [product.slug for product in creates if product.slug]
+        unnamed = [product for product in creates if not product.slug]
+        allocator.load(given + [slug_base(Product, product.title) for product in unnamed])
+        for slug in given:
+            allocator.reserve(slug)
+        for product, slug in zip(unnamed, allocator.allocate_many([product.title for product in unnamed])):
+            product.slug = slug
+
+        replaced = [product.pk for product, paths in images if product.pk is not None]
+        Product.objects.bulk_create(creates)
+        for names, products in update_groups.items():
+            update_products(products, [*names, 'update_at'])
+            if names & set(SORT_KEY_SOURCES):
+                # Rows may carry only one of the two, so the keys come from the stored values.
+                Product.objects.filter(pk__in=[product.pk for product in products]).update(**sort_key_expressions())
+        if updates:
+            ProductImage.objects.filter(product__in=replaced).delete()
+        ProductImage.objects.bulk_create([
+            ProductImage(product=product, image=path.strip())
+            for product, paths in images
+            for path in (paths if isinstance(paths, list) else paths.split(IMAGE_SEPARATOR))
+            if path.strip()
+        ])
+        # Updated rows are indexed as stored, not as the partial rows read.
+        get_backend().index(creates + list(
+            Product.objects.filter(pk__in=[product.pk for product in updates]).only('id', 'title', 'desc', 'brand', 'company')
+        ))
+        for product in creates + updates:
+            pages.update([(ProductCategory, product.product_category_id), (Category, product.product_category.category_id)])
+        touch_objects(*[(Product, product.pk) for product in updates], *pages)
+        self.created += len(creates)
+        self.updated += len(updates)
+
+
+def product_row(product):
+    row = {'slug': product.slug}
+    for name in FIELDS:
+        value = getattr(product, name)
+        row[name] = value.name if hasattr(value, 'name') else value
+    row['price'] = str(product.price)
+    row['category'] = product.product_category.category.slug
+    row['product_category'] = product.product_category.slug
+    row['country'] = product.country.name if product.country else ''
+    row['images'] = IMAGE_SEPARATOR.join(image.image.name for image in product.images.all())
+    return {column: row[column] for column in COLUMNS}
+
+
+def export_products(stream, format, queryset=None, batch_size=1000):
+    if queryset is None:
+        queryset = Product.objects.all()
+    queryset = (
+        queryset.select_related('product_category__category', 'country')
+        .prefetch_related('images')
+        .order_by('pk')
+    )
+    writer = None
+    if format == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=COLUMNS)
+        writer.writeheader()
+    total = 0
+    for product in queryset.iterator(chunk_size=batch_size):
+        row = product_row(product)
+        if writer:
+            writer.writerow(row)
+        else:
+            stream.write(json.dumps(row, default=str, ensure_ascii=False) + '\n')
+        total += 1
+    return total
@@ -0,0 +1,67 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Category, ProductCategory, Product
+
+
+def product_counter_keys(values):
+    """The ``(model, pk)`` counters an active product adds one to."""
+    if not values.get('is_active'):
+        return set()
+    return {
+        (ProductCategory, values.get('product_category_id')),
+        (Category, values.get('product_category__category_id')),
+    } - {(ProductCategory, None), (Category, None)}
+
+
+def apply_counter_deltas(before, after):
+    deltas = Counter()
+    for key in after - before:
+        deltas[key] += 1
+    for key in before - after:
+        deltas[key] -= 1
+
+    # One UPDATE per model and delta, however many rows it touches.
+    groups = defaultdict(list)
+    for (model, pk), delta in deltas.items():
+        if delta:
+            groups[model, delta].append(pk)
+    for (model, delta), pks in groups.items():
+        model.objects.filter(pk__in=pks).update(product_count=F('product_count') + delta)
+
+
+def move_product_category(previous_category_id, category_id, count):
+    """Carry a product category's products over when it moves to another category."""
+    if previous_category_id == category_id or not count:
+        return
+    Category.objects.filter(pk=previous_category_id).update(product_count=F('product_count') - count)
+    Category.objects.filter(pk=category_id).update(product_count=F('product_count') + count)
+
+
+def counted_products(model):
+    """The true active product count of each ``model`` row, as a subquery."""
+    field = 'product_category' if model is ProductCategory else 'product_category__category'
+    counts = (
+        Product.objects.filter(is_active=True, **{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(total=Count('pk')).values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def reconcile_product_counts(fix=True):
+    """
+    Compare every stored counter with a fresh count and, with ``fix``,
+    rewrite the ones that drifted. Returns ``{model_name: drifted rows}``.
+    """
+    drift = {}
+    with transaction.atomic():
+        for model in (ProductCategory, Category):
+            drifted = model.objects.alias(actual=counted_products(model)).filter(~Q(product_count=F('actual')))
+            pks = list(drifted.values_list('pk', flat=True))
+            if fix and pks:
+                model.objects.filter(pk__in=pks).update(product_count=counted_products(model))
+            drift[model._meta.model_name] = len(pks)
+    return drift
@@ -0,0 +1,97 @@
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+
+logger = logging.getLogger(__name__)
+
+LOCKED_MESSAGES = ('database is locked', 'database table is locked', 'database schema has changed')
+
+
+class ConnectionStats:
+    """Counts requests, new connections and write retries, to show how often connections are reused."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+
+    def add(self, name, amount=1):
+        with self.lock:
+            self.counts[name] += amount
+
+    def clear(self):
+        with self.lock:
+            self.counts.clear()
+
+    def report(self):
+        with self.lock:
+            counts = dict(self.counts)
+        requests = counts.get('requests', 0)
+        opened = counts.get(f'opened:{DEFAULT_DB_ALIAS}', 0)
+        return {
+            **counts,
+            'reuse_ratio': round(max(0, 1 - opened / requests), 3) if requests else None,
+        }
+
+
+stats = ConnectionStats()
+
+
+def get_pragmas(connection):
+    pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    replica = getattr(settings, 'DATABASE_READ_REPLICA', None)
+    if connection.alias == replica and connection.alias != DEFAULT_DB_ALIAS:
+        # sync_replica swaps the whole file, so the copy keeps its rollback
+        # journal and is never written through Django.
+        pragmas.pop('journal_mode', None)
+        pragmas['query_only'] = 1
+    return pragmas
+
+
+def configure_connection(connection):
+    """Apply ``SQLITE_PRAGMAS`` to a connection Django has just opened."""
+    stats.add(f'opened:{connection.alias}')
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in get_pragmas(connection).items():
+        # Run on the raw connection so query counts and logs stay unchanged.
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+def is_locked(error):
+    return isinstance(error, OperationalError) and str(error).startswith(LOCKED_MESSAGES)
+
+
+def retry_on_locked(func=None, *, using=DEFAULT_DB_ALIAS, attempts=None, delay=None):
+    """
+    Run ``func`` again when SQLite reports the database as locked, waiting a
+    little longer with jitter each time. The busy timeout already covers
+    plain waits; this handles the lock upgrades SQLite refuses to wait for.
+    Only whole transactions can be retried, so inside an atomic block the
+    error is raised as is.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            tries = attempts or getattr(settings, 'DATABASE_WRITE_ATTEMPTS', 5)
+            wait = delay or getattr(settings, 'DATABASE_WRITE_RETRY_DELAY', 0.05)
+            for attempt in range(1, tries + 1):
+                try:
+                    return func(*args, **kwargs)
+                except OperationalError as error:
+                    if not is_locked(error) or connections[using].in_atomic_block or attempt == tries:
+                        if is_locked(error):
+                            stats.add('write_failures')
+                        raise
+                stats.add('write_retries')
+                logger.info('Database locked, retrying %s (attempt %d of %d)', func.__qualname__, attempt + 1, tries)
+                time.sleep(wait * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+        return wrapper
+
+    return decorator(func) if func is not None else decorator
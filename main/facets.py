@@ -0,0 +1,176 @@
+from collections import Counter, namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils.translation import gettext_lazy as _
+
+from .models import (
+    FacetCount, Product, CompanyChoices, BrandChoices, SizeChoices, ColorChoices, ConditionChoices
+)
+
+
+FacetValue = namedtuple('FacetValue', 'value label count')
+
+# facet name -> Product column the counts are grouped by
+FACET_FIELDS = {
+    'category': 'product_category_id',
+    'country': 'country_id',
+    'company': 'company',
+    'brand': 'brand',
+    'size': 'size',
+    'color': 'color',
+    'condition': 'condition',
+    'verified': 'verified',
+}
+
+# Lower bounds of the fixed price ranges; each range runs up to the next
+# bound and the last one is open.
+PRICE_BUCKETS = (0, 50, 100, 250, 500, 1000)
+
+CHOICE_FACETS = {
+    'company': CompanyChoices,
+    'brand': BrandChoices,
+    'size': SizeChoices,
+    'color': ColorChoices,
+    'condition': ConditionChoices,
+}
+
+
+def facet_options(categories, countries):
+    """
+    Return ``{facet: [(key, value, label), ...]}`` where ``key`` is the
+    column value that is counted and ``value`` is what the listing expects
+    in the query string.
+    """
+    options = {
+        name: [(value, value, label) for value, label in choices.choices]
+        for name, choices in CHOICE_FACETS.items()
+    }
+    options['category'] = [(category.id, category.slug, category.name) for category in categories]
+    options['country'] = [(country.id, country.id, country.name) for country in countries]
+    options['verified'] = [(True, 'true', _('Verified'))]
+    options['price'] = [(low, price_query(low), price_label(low)) for low in PRICE_BUCKETS]
+    return options
+
+
+def price_high(low):
+    index = PRICE_BUCKETS.index(low) + 1
+    return PRICE_BUCKETS[index] if index < len(PRICE_BUCKETS) else None
+
+
+def price_query(low):
+    # Prices have two decimal places, so max_price=99.99 ends the range just below 100.
+    high = price_high(low)
+    if high is None:
+        return f'min_price={low}'
+    return f'min_price={low}&max_price={high - Decimal("0.01")}'
+
+
+def price_label(low):
+    high = price_high(low)
+    return f'${low} - ${high}' if high is not None else f'${low}+'
+
+
+def price_bucket(price):
+    lows = [low for low in PRICE_BUCKETS if low <= price]
+    return lows[-1] if lows else None
+
+
+def facet_condition(facet, key):
+    """The Q a product matches to count towards ``key`` of ``facet``."""
+    if facet == 'price':
+        high = price_high(key)
+        return Q(price__gte=key, price__lt=high) if high is not None else Q(price__gte=key)
+    return Q(**{FACET_FIELDS[facet]: key})
+
+
+def facet_counts(queryset, options, selected=None):
+    """
+    Count every facet value under the current filters in a single aggregate
+    query. ``selected`` maps facet names to the Q objects applied for them;
+    a facet's own selection is left out of its counts so the other values
+    stay visible.
+    """
+    selected = selected or {}
+    aggregates = {}
+    for facet, values in options.items():
+        others = [condition for name, condition in selected.items() if name != facet]
+        for index, (key, value, label) in enumerate(values):
+            aggregates[f'{facet}_{index}'] = Count('pk', filter=Q(*others, facet_condition(facet, key)))
+
+    counts = queryset.order_by().aggregate(**aggregates) if aggregates else {}
+    return {
+        facet: [
+            FacetValue(value, label, counts[f'{facet}_{index}'])
+            for index, (key, value, label) in enumerate(values)
+        ]
+        for facet, values in options.items()
+    }
+
+
+def stored_facet_counts(options):
+    """Counts for the whole active catalog, read from the FacetCount table."""
+    stored = {
+        (facet, value): count
+        for facet, value, count in FacetCount.objects.filter(facet__in=options).values_list('facet', 'value', 'count')
+    }
+    return {
+        facet: [
+            FacetValue(value, label, stored.get((facet, str(key)), 0))
+            for key, value, label in values
+        ]
+        for facet, values in options.items()
+    }
+
+
+def product_facet_keys(values):
+    """The ``(facet, value)`` pairs an active product contributes to."""
+    if not values.get('is_active'):
+        return set()
+    keys = set()
+    for facet, field in FACET_FIELDS.items():
+        value = values.get(field)
+        if value in (None, '', False):
+            continue
+        keys.add((facet, str(value)))
+    price = values.get('price')
+    if price is not None and price_bucket(price) is not None:
+        keys.add(('price', str(price_bucket(price))))
+    return keys
+
+
+def apply_facet_deltas(before, after):
+    deltas = Counter()
+    for key in after - before:
+        deltas[key] += 1
+    for key in before - after:
+        deltas[key] -= 1
+
+    for (facet, value), delta in deltas.items():
+        rows = FacetCount.objects.filter(facet=facet, value=value)
+        if not rows.update(count=F('count') + delta) and delta > 0:
+            FacetCount.objects.bulk_create([FacetCount(facet=facet, value=value)], ignore_conflicts=True)
+            rows.update(count=F('count') + delta)
+
+
+def rebuild_facet_counts():
+    active = Product.objects.filter(is_active=True).order_by()
+    rows = []
+    for facet, field in FACET_FIELDS.items():
+        for value, count in active.values_list(field).annotate(count=Count('pk')):
+            if value in (None, '', False):
+                continue
+            rows.append(FacetCount(facet=facet, value=str(value), count=count))
+    prices = active.aggregate(**{
+        f'price_{low}': Count('pk', filter=facet_condition('price', low)) for low in PRICE_BUCKETS
+    })
+    rows.extend(
+        FacetCount(facet='price', value=str(low), count=prices[f'price_{low}'])
+        for low in PRICE_BUCKETS if prices[f'price_{low}']
+    )
+
+    with transaction.atomic():
+        FacetCount.objects.all().delete()
+        FacetCount.objects.bulk_create(rows)
+    return len(rows)
@@ -0,0 +1,140 @@
+import logging
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+try:
+    from PIL import Image, ImageOps, UnidentifiedImageError
+except ImportError:
+    Image = None
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WIDTHS = (160, 320, 800)
+DERIVATIVES_DIR = 'derivatives'
+RASTER_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff')
+# Formats that may carry transparency keep it in a PNG fallback; photos get JPEG.
+TRANSPARENT_EXTENSIONS = ('.png', '.gif', '.webp')
+QUALITY = 80
+
+# Derivatives that are known to exist, so templates only stat a file once.
+_existing = set()
+_executor = None
+
+
+def get_widths():
+    return tuple(sorted(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', DEFAULT_WIDTHS)))
+
+
+def can_resize(name):
+    return bool(name) and posixpath.splitext(name)[1].lower() in RASTER_EXTENSIONS
+
+
+def fallback_format(name):
+    return 'png' if posixpath.splitext(name)[1].lower() in TRANSPARENT_EXTENSIONS else 'jpg'
+
+
+def derivative_name(name, width, format):
+    stem = posixpath.splitext(name)[0]
+    return f'{DERIVATIVES_DIR}/{stem}-{width}w.{format}'
+
+
+def derivative_url(name, width, format):
+    return default_storage.url(derivative_name(name, width, format))
+
+
+def has_derivatives(name):
+    if not can_resize(name):
+        return False
+    # The largest fallback is written last, so its presence means the set is complete.
+    sentinel = derivative_name(name, get_widths()[-1], fallback_format(name))
+    if sentinel in _existing:
+        return True
+    if default_storage.exists(sentinel):
+        _existing.add(sentinel)
+        return True
+    return False
+
+
+def encode(image, format):
+    output = BytesIO()
+    if format == 'jpg':
+        image.convert('RGB').save(output, 'JPEG', quality=QUALITY, optimize=True, progressive=True)
+    elif format == 'png':
+        image.save(output, 'PNG', optimize=True)
+    else:
+        image.save(output, 'WEBP', quality=QUALITY, method=4)
+    return output.getvalue()
+
+
+def generate_derivatives(name, force=False):
+    """
+    Write a WebP and a fallback variant of ``name`` for every configured
+    width and return ``(original_bytes, derivative_bytes)`` for the largest
+    width, or ``None`` when the file is missing or not an image.
+    """
+    if Image is None or not can_resize(name):
+        return None
+    if not force and has_derivatives(name):
+        return None
+    try:
+        with default_storage.open(name) as source:
+            original = source.read()
+        image = ImageOps.exif_transpose(Image.open(BytesIO(original)))
+        image.load()
+    except (OSError, UnidentifiedImageError) as error:
+        logger.warning('Cannot create derivatives of %s: %s', name, error)
+        return None
+
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    fallback = fallback_format(name)
+    largest = 0
+    for width in get_widths():
+        resized = image
+        if image.width > width:
+            resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        # Fallbacks go last so has_derivatives() never sees a half-written set.
+        for format in ('webp', fallback):
+            content = encode(resized, format)
+            target = derivative_name(name, width, format)
+            if default_storage.exists(target):
+                default_storage.delete(target)
+            default_storage.save(target, ContentFile(content))
+            if format == 'webp':
+                largest = len(content)
+    _existing.add(derivative_name(name, get_widths()[-1], fallback))
+    return len(original), largest
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_DERIVATIVE_WORKERS)
+    return _executor
+
+
+def schedule_derivatives(*names):
+    """Create missing derivatives in the process pool once the upload is committed."""
+    if Image is None:
+        return
+    names = [name for name in names if can_resize(name) and not has_derivatives(name) and default_storage.exists(name)]
+    if not names:
+        return
+
+    def submit():
+        if not getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 0):
+            for name in names:
+                generate_derivatives(name)
+            return
+        executor = get_executor()
+        for name in names:
+            executor.submit(generate_derivatives, name)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,150 @@
+import uuid
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import touch_objects
+from .database import retry_on_locked
+from .models import Product, StockReservation
+
+
+class OutOfStock(Exception):
+
+    def __init__(self, product_id):
+        self.product_id = product_id
+        super().__init__(f'Product {product_id} does not have enough stock')
+
+
+class ReservationExpired(Exception):
+    pass
+
+
+def touch_products(product_ids):
+    # The updates skip the model signals, so the product pages would keep
+    # answering 304 with the old stock; touched again after commit in case a
+    # reader cached them meanwhile.
+    objects = [(Product, product_id) for product_id in product_ids]
+    touch_objects(*objects)
+    transaction.on_commit(lambda: touch_objects(*objects))
+
+
+def reservation_ttl():
+    return timedelta(seconds=getattr(settings, 'INVENTORY_RESERVATION_TTL', 15 * 60))
+
+
+def merge_items(items):
+    """``[(product_id, quantity), ...]`` as ``{product_id: total quantity}``."""
+    quantities = Counter()
+    for product_id, quantity in items:
+        quantity = int(quantity)
+        if quantity < 1:
+            raise ValueError('Reserved quantities must be positive')
+        quantities[int(product_id)] += quantity
+    return quantities
+
+
+@retry_on_locked
+@transaction.atomic
+def reserve(items, ttl=None):
+    """
+    Take ``items``, ``[(product_id, quantity), ...]``, off the shelf and
+    return the reservation key. Either every product has the stock or none
+    is touched: ``OutOfStock`` rolls back the decrements made so far.
+    """
+    quantities = merge_items(items)
+    # Each decrement is a single conditional UPDATE, so stock never goes
+    # below zero and nothing is read first. Products are always taken in id
+    # order, so two reservations cannot wait on each other's rows.
+    for product_id in sorted(quantities):
+        quantity = quantities[product_id]
+        taken = Product.objects.filter(pk=product_id, is_active=True, quantity__gte=quantity).update(
+            quantity=F('quantity') - quantity
+        )
+        if not taken:
+            raise OutOfStock(product_id)
+    touch_products(quantities)
+
+    key = uuid.uuid4()
+    expires_at = timezone.now() + (ttl or reservation_ttl())
+    StockReservation.objects.bulk_create([
+        StockReservation(key=key, product_id=product_id, quantity=quantity, expires_at=expires_at)
+        for product_id, quantity in quantities.items()
+    ])
+    return key
+
+
+def restock(rows):
+    """Put ``[(product_id, quantity), ...]`` back, one UPDATE per distinct quantity."""
+    totals = Counter()
+    for product_id, quantity in rows:
+        totals[product_id] += quantity
+    groups = defaultdict(list)
+    for product_id, quantity in totals.items():
+        groups[quantity].append(product_id)
+    for quantity, product_ids in groups.items():
+        Product.objects.filter(pk__in=product_ids).update(quantity=F('quantity') + quantity)
+    touch_products(totals)
+
+
+def take(queryset):
+    """Delete the reservations of ``queryset``, returning ``[(product_id, quantity), ...]`` of the rows removed."""
+    # Claiming the rows under a fresh key is the first statement, so SQLite
+    # takes the write lock before reading (a read first would have to upgrade
+    # and fail under load) and a concurrent caller finds nothing left to claim.
+    claim = uuid.uuid4()
+    if not queryset.update(key=claim):
+        return []
+    claimed = StockReservation.objects.filter(key=claim)
+    rows = list(claimed.values_list('product_id', 'quantity'))
+    claimed.delete()
+    return rows
+
+
+@retry_on_locked
+@transaction.atomic
+def release(key):
+    """Return the stock held by ``key`` to the shelf; releasing twice is harmless."""
+    rows = take(StockReservation.objects.filter(key=key))
+    restock(rows)
+    return sum(quantity for product_id, quantity in rows)
+
+
+@retry_on_locked
+@transaction.atomic
+def confirm(key):
+    """
+    Turn ``key`` into a sale: the reservation goes and the stock stays
+    taken. Raises ``ReservationExpired`` once it has run out, swept or not.
+    """
+    rows = take(StockReservation.objects.filter(key=key, expires_at__gt=timezone.now()))
+    if not rows:
+        raise ReservationExpired(f'Reservation {key} has expired')
+    return dict(rows)
+
+
+@retry_on_locked
+@transaction.atomic
+def release_expired_batch(now, batch_size):
+    expired = StockReservation.objects.filter(expires_at__lte=now).order_by('expires_at').values('pk')[:batch_size]
+    rows = take(StockReservation.objects.filter(pk__in=expired))
+    restock(rows)
+    return len(rows)
+
+
+def release_expired(batch_size=500, now=None):
+    """
+    Return the stock of every reservation that expired by ``now``. Each
+    batch is its own short transaction, so checkouts keep going while a
+    large backlog drains. Returns the number of reservations released.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        count = release_expired_batch(now, batch_size)
+        released += count
+        if count < batch_size:
+            return released
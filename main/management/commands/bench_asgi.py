@@ -0,0 +1,93 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.urls import reverse
+
+from main.benchmark import LoadRun, asgi_get, write_results, wsgi_get
+from main.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = 'Compare the storefront read views served through config.wsgi and config.asgi under concurrent clients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=50, help='Requests per client')
+        parser.add_argument('--only', choices=['wsgi', 'asgi'], help='Run one of the two handlers')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        targets = self.targets()
+        results = {}
+        for mode in ('wsgi', 'asgi'):
+            if options['only'] in (None, mode):
+                run = LoadRun(options['clients'])
+                if mode == 'wsgi':
+                    results[mode] = run.run(self.wsgi_worker(targets, options['requests']))
+                else:
+                    results[mode] = run.run_async(self.asgi_worker(targets, options['requests']))
+                connections.close_all()
+
+        self.report(results)
+        if options['output']:
+            write_results(options['output'], 'asgi', {
+                key: options[key] for key in ('clients', 'requests')
+            }, results)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+    def targets(self):
+        product = Product.objects.filter(is_active=True).order_by('?').first()
+        category = Category.objects.filter(is_active=True).order_by('?').first()
+        if product is None or category is None:
+            raise CommandError('The catalog is empty, run generate_catalog first')
+        products = reverse('main:product_list')
+        return [
+            ('main:home', reverse('main:home')),
+            ('main:product_list', products),
+            ('main:product_list?sort=price', products + '?sort=price&cursor='),
+            ('main:product_list?condition=new', products + '?condition=new'),
+            ('main:product_detail', reverse('main:product_detail', args=[product.slug])),
+            ('main:search?q=phone', reverse('main:search') + '?q=phone'),
+            ('main:category_detail', reverse('main:category_detail', args=[category.slug])),
+        ]
+
+    def wsgi_worker(self, targets, requests):
+        from config.wsgi import application
+
+        def worker(number, record):
+            try:
+                for index in range(requests):
+                    name, url = targets[(number + index) % len(targets)]
+                    started = time.perf_counter()
+                    status = wsgi_get(application, url)
+                    record(name, time.perf_counter() - started, status < 400)
+            finally:
+                connections.close_all()
+        return worker
+
+    def asgi_worker(self, targets, requests):
+        from config.asgi import application
+
+        async def worker(number, record):
+            for index in range(requests):
+                name, url = targets[(number + index) % len(targets)]
+                started = time.perf_counter()
+                status = await asgi_get(application, url)
+                record(name, time.perf_counter() - started, status < 400)
+        return worker
+
+    def report(self, results):
+        modes = list(results)
+        self.stdout.write(f'{"target":<40}' + ''.join(f'{mode + " p50":>11}{mode + " p95":>11}' for mode in modes))
+        for name in results[modes[0]]['targets']:
+            row = ''.join(
+                f'{results[mode]["targets"][name]["p50_ms"]:>11.2f}{results[mode]["targets"][name]["p95_ms"]:>11.2f}'
+                for mode in modes
+            )
+            self.stdout.write(f'{name:<40}{row}')
+        for mode in modes:
+            self.stdout.write(self.style.SUCCESS(
+                f'{mode}: {results[mode]["requests"]} requests from {results[mode]["clients"]} clients in '
+                f'{results[mode]["elapsed_s"]}s ({results[mode]["throughput_rps"]} req/s, {results[mode]["errors"]} errors)'
+            ))
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Prefetch, Q
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from main.benchmark import summarize, write_results
+from main.models import Category, ProductCategory
+
+
+def counted_categories():
+    """The category list with its product counts counted while rendering, as it had to be without the counters."""
+    categories = list(
+        Category.objects.filter(is_active=True)
+        .annotate(counted=Count('product_categories__products', filter=Q(product_categories__products__is_active=True)))
+        .prefetch_related(Prefetch(
+            'product_categories',
+            queryset=ProductCategory.objects.annotate(counted=Count('products', filter=Q(products__is_active=True)))
+        ))
+    )
+    for category in categories:
+        category.product_count = category.counted
+        for product_category in category.product_categories.all():
+            product_category.product_count = product_category.counted
+    return categories
+
+
+def stored_categories():
+    return list(Category.objects.filter(is_active=True).prefetch_related('product_categories'))
+
+
+class Command(BaseCommand):
+    help = 'Time rendering the category page with product counts counted per render and read from the stored counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=50)
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        if not Category.objects.filter(is_active=True).exists():
+            raise CommandError('The catalog is empty, run generate_catalog first')
+        request = RequestFactory().get(reverse('main:category_list'), SERVER_NAME='localhost')
+
+        results = {}
+        for mode, load in (('counted', counted_categories), ('stored', stored_categories)):
+            timings = []
+            for _ in range(options['renders']):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    render_to_string('main/page-category.html', {'categories': load()}, request)
+                    timings.append(time.perf_counter() - started)
+            results[mode] = {**summarize(timings), 'queries': len(queries)}
+            self.stdout.write(
+                f'{mode:<8} p50 {results[mode]["p50_ms"]:8.2f} ms   p95 {results[mode]["p95_ms"]:8.2f} ms   '
+                f'{results[mode]["queries"]} queries per render'
+            )
+
+        if options['output']:
+            write_results(options['output'], 'category_counts', {'renders': options['renders']}, results)
+            self.stdout.write(f'Results written to {options["output"]}')
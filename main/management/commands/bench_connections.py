@@ -0,0 +1,181 @@
+import multiprocessing
+import random
+import sqlite3
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.db.models import F
+from django.test import override_settings
+from django.urls import reverse
+
+from main.benchmark import summarize, wsgi_get, write_results
+from main.database import is_locked, retry_on_locked, stats
+from main.models import Product
+
+
+# Forked so every worker inherits the configured Django process.
+CONTEXT = multiprocessing.get_context('fork')
+
+# Django's defaults before the connection settings were tuned: a connection
+# per request, the rollback journal, the driver's 5 second busy timeout and
+# no retries.
+BASELINE = {
+    'journal_mode': 'delete',
+    'database': {'CONN_MAX_AGE': 0, 'OPTIONS': {}},
+    'settings': {'SQLITE_PRAGMAS': {}, 'DATABASE_WRITE_ATTEMPTS': 1},
+}
+
+
+def read(targets, until, results):
+    from config.wsgi import application
+
+    stats.clear()
+    latencies, errors, index = [], 0, random.randrange(len(targets))
+    while time.monotonic() < until:
+        index += 1
+        started = time.perf_counter()
+        try:
+            ok = wsgi_get(application, targets[index % len(targets)]) < 400
+        except Exception:
+            ok = False
+        latencies.append(time.perf_counter() - started)
+        errors += not ok
+    connections.close_all()
+    results.put(('read', latencies, errors, stats.report()))
+
+
+def write(ids, until, results):
+    @retry_on_locked
+    @transaction.atomic
+    def update(pk):
+        Product.objects.filter(pk=pk).update(quantity=F('quantity'))
+
+    stats.clear()
+    latencies, errors = [], 0
+    while time.monotonic() < until:
+        # Fire the request signals so connections are opened and closed
+        # exactly as for a request that saves a product.
+        request_started.send(sender=__name__)
+        started = time.perf_counter()
+        try:
+            update(random.choice(ids))
+        except OperationalError as error:
+            if not is_locked(error):
+                raise
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+        request_finished.send(sender=__name__)
+    connections.close_all()
+    results.put(('write', latencies, errors, stats.report()))
+
+
+class Command(BaseCommand):
+    help = 'Measure reads and writes from several processes against the database, with the default and the tuned connection settings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4, help='Reading processes')
+        parser.add_argument('--writers', type=int, default=2, help='Writing processes')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds each configuration runs')
+        parser.add_argument('--products', type=int, default=20, help='Products the readers and writers share')
+        parser.add_argument('--only', choices=['baseline', 'tuned'], help='Run one of the two configurations')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        database = connections[DEFAULT_DB_ALIAS]
+        if database.vendor != 'sqlite':
+            raise CommandError('The benchmark compares SQLite settings')
+        products = list(Product.objects.filter(is_active=True).order_by('?')[:options['products']])
+        if not products:
+            raise CommandError('The catalog is empty, run generate_catalog first')
+        product_list = reverse('main:product_list')
+        targets = [product_list, product_list + '?condition=new', reverse('main:search') + '?q=phone'] + [
+            reverse('main:product_detail', args=[product.slug]) for product in products
+        ]
+        tuned = {
+            'journal_mode': settings.SQLITE_PRAGMAS.get('journal_mode', 'delete'),
+            'database': {key: database.settings_dict[key] for key in ('CONN_MAX_AGE', 'OPTIONS')},
+            'settings': {},
+        }
+
+        results = {}
+        for mode, config in (('baseline', BASELINE), ('tuned', tuned)):
+            if options['only'] in (None, mode):
+                results[mode] = self.run(config, targets, [product.pk for product in products], options)
+                self.report(mode, results[mode])
+
+        if options['output']:
+            write_results(options['output'], 'connections', {
+                key: options[key] for key in ('readers', 'writers', 'duration', 'products')
+            }, results)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+    def run(self, config, targets, ids, options):
+        connections.close_all()
+        database = connections[DEFAULT_DB_ALIAS].settings_dict
+        saved = {key: database[key] for key in config['database']}
+        # The journal mode belongs to the file, so it is switched once here
+        # while nothing else has it open.
+        raw = sqlite3.connect(database['NAME'])
+        raw.execute(f'PRAGMA journal_mode = {config["journal_mode"]}')
+        raw.close()
+        database.update(config['database'])
+        try:
+            # Pages are not cached and always read the primary, so every
+            # read reaches the database the writers are using.
+            with override_settings(STOREFRONT_CACHE_TIMEOUT=0, DATABASE_READ_REPLICA=None, **config['settings']):
+                return self.measure(targets, ids, options)
+        finally:
+            database.update(saved)
+
+    def measure(self, targets, ids, options):
+        results = CONTEXT.Queue()
+        until = time.monotonic() + options['duration']
+        workers = [
+            CONTEXT.Process(target=read, args=(targets, until, results)) for _ in range(options['readers'])
+        ] + [
+            CONTEXT.Process(target=write, args=(ids, until, results)) for _ in range(options['writers'])
+        ]
+        for worker in workers:
+            worker.start()
+        latencies, errors, counts = {'read': [], 'write': []}, Counter(), Counter()
+        for _ in workers:
+            kind, values, failed, report = results.get()
+            latencies[kind] += values
+            errors[kind] += failed
+            counts.update({key: value for key, value in report.items() if key != 'reuse_ratio'})
+        for worker in workers:
+            worker.join()
+
+        opened = counts[f'opened:{DEFAULT_DB_ALIAS}']
+        return {
+            **{
+                kind: {
+                    'operations': len(values),
+                    'per_s': round(len(values) / options['duration'], 1),
+                    'errors': errors[kind],
+                    'latency': summarize(values),
+                }
+                for kind, values in latencies.items()
+            },
+            'requests': counts['requests'],
+            'connections_opened': opened,
+            'reuse_ratio': round(max(0, 1 - opened / counts['requests']), 3) if counts['requests'] else None,
+            'write_retries': counts['write_retries'],
+            'write_failures': counts['write_failures'],
+        }
+
+    def report(self, mode, result):
+        for kind in ('read', 'write'):
+            self.stdout.write(
+                f'{mode:<9}{kind:<6}{result[kind]["per_s"]:>8.1f} /s   p50 {result[kind]["latency"]["p50_ms"]:8.2f} ms   '
+                f'p95 {result[kind]["latency"]["p95_ms"]:8.2f} ms   p99 {result[kind]["latency"]["p99_ms"]:8.2f} ms   '
+                f'{result[kind]["errors"]} errors'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'{mode}: {result["connections_opened"]} connections for {result["requests"]} requests '
+            f'(reuse {result["reuse_ratio"]}), {result["write_retries"]} write retries'
+        ))
@@ -0,0 +1,91 @@
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from main.benchmark import LoadRun, write_results
+from main.models import Product
+
+
+PREFIX = 'bench-registration-'
+
+
+class Command(BaseCommand):
+    help = 'Measure sign-ups per second and catalog browsing latency while both run, hashing passwords in the request and on the pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--registrants', type=int, default=8, help='Clients signing up')
+        parser.add_argument('--browsers', type=int, default=8, help='Clients browsing the catalog')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds each configuration runs')
+        parser.add_argument('--only', choices=['inline', 'pool'], help='Run one of the two configurations')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        product = Product.objects.filter(is_active=True).order_by('?').first()
+        if product is None:
+            raise CommandError('The catalog is empty, run generate_catalog first')
+        products = reverse('main:product_list')
+        targets = [
+            ('main:product_list', products),
+            ('main:product_detail', reverse('main:product_detail', args=[product.slug])),
+            ('main:search?q=phone', reverse('main:search') + '?q=phone'),
+        ]
+
+        results = {}
+        for mode, workers in (('inline', 0), ('pool', None)):
+            if options['only'] not in (None, mode):
+                continue
+            overrides = {} if workers is None else {'PASSWORD_HASH_WORKERS': workers}
+            # Pages are rendered every time, so browsing costs what it does
+            # for signed-in visitors.
+            with override_settings(STOREFRONT_CACHE_TIMEOUT=0, DATABASE_READ_REPLICA=None, **overrides):
+                try:
+                    run = LoadRun(options['registrants'] + options['browsers'])
+                    results[mode] = run.run(self.worker(targets, options))
+                finally:
+                    get_user_model().objects.filter(username__startswith=PREFIX).delete()
+            self.report(mode, results[mode], options['duration'])
+
+        if options['output']:
+            write_results(options['output'], 'registration', {
+                key: options[key] for key in ('registrants', 'browsers', 'duration')
+            }, results)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+    def worker(self, targets, options):
+        register, login = reverse('accounts:register'), reverse('accounts:login')
+        until = time.monotonic() + options['duration']
+
+        def worker(number, record):
+            client = Client(SERVER_NAME='localhost')
+            index = number
+            try:
+                while time.monotonic() < until:
+                    index += 1
+                    started = time.perf_counter()
+                    if number < options['registrants']:
+                        username = f'{PREFIX}{uuid.uuid4().hex[:12]}'
+                        response = client.post(register, {
+                            'username': username, 'email': f'{username}@example.com', 'phone': '123',
+                            'address': 'Street', 'password': 'correct horse', 'password2': 'correct horse',
+                        })
+                        name = 'register' if response.get('Location') == login else 'register (turned away)'
+                        record(name, time.perf_counter() - started, response.status_code == 302)
+                    else:
+                        name, url = targets[index % len(targets)]
+                        response = client.get(url)
+                        record(name, time.perf_counter() - started, response.status_code < 400)
+            finally:
+                connections.close_all()
+        return worker
+
+    def report(self, mode, result, duration):
+        for name, target in result['targets'].items():
+            self.stdout.write(
+                f'{mode:<7}{name:<26}{target["count"] / duration:>8.1f} /s   p50 {target["p50_ms"]:8.2f} ms   '
+                f'p95 {target["p95_ms"]:8.2f} ms   {target["errors"]} errors'
+            )
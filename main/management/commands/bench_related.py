@@ -0,0 +1,78 @@
+import io
+import random
+import statistics
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from main import related
+from main.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Time the related products rebuild, incremental updates and page lookups on a synthetic catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--updates', type=int, default=20, help='Products changed one at a time')
+        parser.add_argument('--lookups', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if related.np is None:
+            raise CommandError('NumPy is required to compute related products')
+        random.seed(options['seed'])
+        # Everything runs inside one transaction that is rolled back, so the
+        # benchmark never leaves synthetic rows behind.
+        with transaction.atomic():
+            started = time.perf_counter()
+            call_command(
+                'generate_catalog', products=options['products'], users=0, images=0,
+                seed=options['seed'], stdout=io.StringIO()
+            )
+            self.stdout.write(f'Populated {options["products"]} products in {time.perf_counter() - started:.1f}s')
+
+            result = related.rebuild_related_products()
+            total = result['load_s'] + result['compute_s'] + result['write_s']
+            self.stdout.write(
+                f'rebuild   {total:8.2f} s   load {result["load_s"]:.2f}s   score {result["compute_s"]:.2f}s   '
+                f'write {result["write_s"]:.2f}s   {result["products"] / total:.0f} products/s'
+            )
+
+            ids = list(Product.objects.filter(is_active=True).values_list('pk', flat=True))
+            self.report_updates(random.sample(ids, min(options['updates'], len(ids))))
+            self.report_lookups(random.sample(ids, min(options['lookups'], len(ids))))
+            transaction.set_rollback(True)
+
+    def report_updates(self, ids):
+        timings, affected = [], []
+        for pk in ids:
+            Product.objects.filter(pk=pk).update(price=random.randint(1, 5000))
+            started = time.perf_counter()
+            affected.append(related.update_related_products([pk]))
+            timings.append(time.perf_counter() - started)
+        self.stdout.write(
+            f'update    {statistics.median(timings) * 1000:8.2f} ms median, '
+            f'{statistics.median(affected):.0f} products recomputed'
+        )
+
+    def report_lookups(self, ids):
+        stored, computed = [], []
+        for pk in ids:
+            started = time.perf_counter()
+            list(Product.objects.filter(related_to_rows__product_id=pk, is_active=True).order_by('related_to_rows__rank')[:4])
+            stored.append(time.perf_counter() - started)
+
+            # What the page would cost if it scored its category per request.
+            started = time.perf_counter()
+            category_id = Product.objects.filter(pk=pk).values_list('product_category__category_id', flat=True).get()
+            catalog = related.Catalog.load(product_category__category_id=category_id)
+            list(catalog.neighbours(catalog.positions([pk]), 4))
+            computed.append(time.perf_counter() - started)
+        stored_ms, computed_ms = statistics.median(stored) * 1000, statistics.median(computed) * 1000
+        self.stdout.write(
+            f'lookup    {stored_ms:8.2f} ms stored   {computed_ms:.2f} ms scored per request   '
+            f'x{computed_ms / stored_ms:.0f}'
+        )
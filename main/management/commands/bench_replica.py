@@ -0,0 +1,106 @@
+import io
+import multiprocessing
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import F
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from main.benchmark import LoadRun, write_results
+from main.models import Product
+from main.routers import get_replica_alias
+
+
+# Forked so the writer inherits the configured Django process.
+CONTEXT = multiprocessing.get_context('fork')
+
+
+def write(batch_size, pause, done, writes):
+    # Rewrites rows with their own values: the same locks and page writes
+    # as a bulk admin edit, without changing the catalog.
+    ids = list(Product.objects.values_list('pk', flat=True))
+    while not done.is_set():
+        for start in range(0, len(ids), batch_size):
+            with transaction.atomic():
+                Product.objects.filter(pk__in=ids[start:start + batch_size]).update(quantity=F('quantity'))
+            with writes.get_lock():
+                writes.value += 1
+            if done.wait(pause):
+                break
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Measure storefront read throughput while a write-heavy job runs, reading from the primary and the replica'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=40, help='Requests per client')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Products the writer rewrites per transaction')
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds the writer waits between transactions')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        call_command('sync_replica', stdout=io.StringIO())
+        if get_replica_alias() is None:
+            raise CommandError('No read replica is configured')
+        product = Product.objects.filter(is_active=True).order_by('?').first()
+        if product is None:
+            raise CommandError('The catalog is empty, run generate_catalog first')
+        products = reverse('main:product_list')
+        targets = [
+            ('main:product_list', products),
+            ('main:product_list?condition=new', products + '?condition=new'),
+            ('main:product_detail', reverse('main:product_detail', args=[product.slug])),
+            ('main:search?q=phone', reverse('main:search') + '?q=phone'),
+        ]
+
+        results = {}
+        for mode, replica in (('primary', None), ('replica', 'replica')):
+            with override_settings(DATABASE_READ_REPLICA=replica):
+                results[mode] = self.run(targets, options)
+            self.stdout.write(
+                f'{mode:<8} {results[mode]["throughput_rps"]:>8.1f} req/s   p50 {results[mode]["latency"]["p50_ms"]:8.2f} ms   '
+                f'p95 {results[mode]["latency"]["p95_ms"]:8.2f} ms   p99 {results[mode]["latency"]["p99_ms"]:8.2f} ms   '
+                f'{results[mode]["errors"]} errors   {results[mode]["writes"]} write transactions'
+            )
+
+        if options['output']:
+            write_results(options['output'], 'replica', {
+                key: options[key] for key in ('clients', 'requests', 'batch_size', 'pause')
+            }, results)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+    def run(self, targets, options):
+        # The writer gets its own process, as an admin or worker process
+        # would, so it competes for the database rather than for the GIL.
+        done, writes = CONTEXT.Event(), CONTEXT.Value('i', 0)
+        connections.close_all()
+        writer = CONTEXT.Process(target=write, args=(options['batch_size'], options['pause'], done, writes))
+        writer.start()
+        try:
+            results = LoadRun(options['clients']).run(self.reader(targets, options['requests']))
+        finally:
+            done.set()
+            writer.join()
+        results['writes'] = writes.value
+        return results
+
+    def reader(self, targets, requests):
+        def worker(number, record):
+            client = Client(SERVER_NAME='localhost')
+            try:
+                for index in range(requests):
+                    name, url = targets[(number + index) % len(targets)]
+                    started = time.perf_counter()
+                    try:
+                        ok = client.get(url).status_code < 400
+                    except Exception:
+                        ok = False
+                    record(name, time.perf_counter() - started, ok)
+            finally:
+                connections.close_all()
+        return worker
@@ -0,0 +1,143 @@
+import random
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.db.models import Sum
+
+from main.benchmark import LoadRun, write_results
+from main.inventory import OutOfStock, ReservationExpired, confirm, release_expired, reserve
+from main.models import Product, StockReservation
+
+
+class Command(BaseCommand):
+    help = (
+        'Reserve a few hot products from many threads at once, sell half of the reservations and let the sweeper '
+        'return the rest, then check that no unit was sold twice'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Threads reserving stock')
+        parser.add_argument('--products', type=int, default=5, help='Products every thread competes for')
+        parser.add_argument('--stock', type=int, default=1000, help='Units each product starts with')
+        parser.add_argument('--max-items', type=int, default=3, help='Most products in one reservation')
+        parser.add_argument('--ttl', type=float, default=1.0, help='Seconds before an unconfirmed reservation expires')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds the threads run')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        products = list(Product.objects.filter(is_active=True).order_by('pk')[:options['products']])
+        if len(products) < options['products']:
+            raise CommandError('Not enough active products, run generate_catalog first')
+        ids = [product.pk for product in products]
+        journal_mode = None
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                [journal_mode] = cursor.fetchone()
+
+        sold = Counter()
+        try:
+            StockReservation.objects.filter(product_id__in=ids).delete()
+            Product.objects.filter(pk__in=ids).update(quantity=options['stock'])
+            run = LoadRun(options['threads'] + 1)
+            result = run.run(self.worker(ids, sold, options))
+            release_expired()
+            check = self.check_stock(ids, sold, options['stock'])
+        finally:
+            StockReservation.objects.filter(product_id__in=ids).delete()
+            Product.objects.bulk_update(products, ['quantity'])
+
+        reserved = result['targets'].get('reserve', {'count': 0, 'p50_ms': 0, 'p95_ms': 0})
+        self.stdout.write(
+            f'journal mode {journal_mode}: {reserved["count"] / options["duration"]:.1f} reservations/s   '
+            f'p50 {reserved["p50_ms"]:.2f} ms   p95 {reserved["p95_ms"]:.2f} ms   {result["errors"]} errors'
+        )
+        for name, target in result['targets'].items():
+            self.stdout.write(f'  {name:<22}{target["count"]:>8}   p95 {target["p95_ms"]:8.2f} ms')
+        self.stdout.write(
+            f'{check["sold"]} units sold of {check["stock"]}, {check["left"]} left on the shelf, '
+            f'lowest stock {check["lowest"]}'
+        )
+        if check['oversold']:
+            raise CommandError(f'Stock does not add up for products {check["oversold"]}')
+        self.stdout.write(self.style.SUCCESS('No product was oversold'))
+
+        if options['output']:
+            write_results(options['output'], 'reservations', {
+                key: options[key] for key in ('threads', 'products', 'stock', 'max_items', 'ttl', 'duration')
+            }, {'journal_mode': journal_mode, 'load': result, 'check': check})
+            self.stdout.write(f'Results written to {options["output"]}')
+
+    def worker(self, ids, sold, options):
+        until = time.monotonic() + options['duration']
+        ttl = timedelta(seconds=options['ttl'])
+        lock = threading.Lock()
+
+        def worker(number, record):
+            rng = random.Random(number)
+            try:
+                while time.monotonic() < until:
+                    started = time.perf_counter()
+                    # The last thread is the sweeper.
+                    if number == options['threads']:
+                        try:
+                            release_expired()
+                            record('sweep', time.perf_counter() - started)
+                        except OperationalError:
+                            record('sweep', time.perf_counter() - started, False)
+                        time.sleep(options['ttl'] / 2)
+                        continue
+
+                    items = [(product_id, rng.randint(1, 2)) for product_id in rng.sample(ids, rng.randint(1, options['max_items']))]
+                    try:
+                        key = reserve(items, ttl=ttl)
+                    except OutOfStock:
+                        record('reserve (sold out)', time.perf_counter() - started)
+                        continue
+                    except OperationalError:
+                        record('reserve', time.perf_counter() - started, False)
+                        continue
+                    record('reserve', time.perf_counter() - started)
+
+                    # Half of the carts check out; the others are abandoned
+                    # for the sweeper.
+                    if rng.random() < 0.5:
+                        started = time.perf_counter()
+                        try:
+                            units = confirm(key)
+                        except ReservationExpired:
+                            record('confirm (expired)', time.perf_counter() - started)
+                            continue
+                        except OperationalError:
+                            record('confirm', time.perf_counter() - started, False)
+                            continue
+                        record('confirm', time.perf_counter() - started)
+                        with lock:
+                            sold.update(units)
+            finally:
+                connections.close_all()
+        return worker
+
+    def check_stock(self, ids, sold, stock):
+        """Every unit is on the shelf, held by a reservation or sold, and never more than once."""
+        quantities = dict(Product.objects.filter(pk__in=ids).values_list('pk', 'quantity'))
+        held = dict(
+            StockReservation.objects.filter(product_id__in=ids).values('product_id')
+            .annotate(total=Sum('quantity')).values_list('product_id', 'total')
+        )
+        oversold = [
+            product_id for product_id in ids
+            if quantities[product_id] < 0 or quantities[product_id] + held.get(product_id, 0) + sold[product_id] != stock
+        ]
+        return {
+            'stock': stock * len(ids),
+            'sold': sum(sold.values()),
+            'left': sum(quantities.values()),
+            'held': sum(held.values()),
+            'lowest': min(quantities.values()),
+            'oversold': oversold,
+        }
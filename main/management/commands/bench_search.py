@@ -0,0 +1,94 @@
+import random
+import statistics
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from main.models import Category, ProductCategory, Country, Product, CompanyChoices, BrandChoices
+from main.search import get_backend, search_products
+
+
+WORDS = (
+    'phone smart watch laptop cable charger leather jacket shoes running cotton shirt '
+    'wireless headphones speaker camera lens tablet keyboard mouse monitor screen glass '
+    'kitchen chair table lamp wooden steel bottle bag backpack travel sport classic slim'
+).split()
+
+
+class Command(BaseCommand):
+    help = 'Compare full-text search with the legacy icontains query on a synthetic catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--queries', nargs='+', default=['phone', 'wireless head', 'leather jacket', 'zzz'])
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        # Everything runs inside one transaction that is rolled back, so the
+        # benchmark never leaves synthetic rows behind.
+        with transaction.atomic():
+            self.populate(options['products'])
+            for query in options['queries']:
+                legacy = self.measure(self.legacy_queryset(query), options['repeat'])
+                indexed = self.measure(search_products(Product.objects.filter(is_active=True), query), options['repeat'])
+                self.stdout.write(
+                    f'{query!r:20} legacy {legacy * 1000:9.2f} ms   fts {indexed * 1000:9.2f} ms   '
+                    f'x{legacy / indexed if indexed else 0:.1f}'
+                )
+            transaction.set_rollback(True)
+
+    def populate(self, count):
+        started = time.perf_counter()
+        category = Category.objects.create(name='Benchmark', description='Benchmark')
+        product_category = ProductCategory.objects.create(name='Benchmark', category=category)
+        country = Country.objects.create(name='Benchmark')
+        companies = [value for value, label in CompanyChoices.choices]
+        brands = [value for value, label in BrandChoices.choices]
+
+        # Descriptions are mostly filler from a large vocabulary with a few
+        # product words mixed in, so a query matches a realistic share of rows.
+        filler = [''.join(random.choices(string.ascii_lowercase, k=random.randint(4, 9))) for _ in range(5000)]
+
+        batch = []
+        for number in range(count):
+            batch.append(Product(
+                title=' '.join(random.choices(WORDS, k=4)),
+                slug=f'benchmark-{number}',
+                desc=' '.join(random.choices(filler, k=100) + random.choices(WORDS, k=3)),
+                price=random.randint(1, 5000),
+                country=country,
+                product_category=product_category,
+                delivery_time='3 days',
+                company=random.choice(companies),
+                brand=random.choice(brands),
+            ))
+            if len(batch) == 5000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
+        get_backend().rebuild()
+        self.stdout.write(f'Populated {count} products in {time.perf_counter() - started:.1f}s')
+
+    def legacy_queryset(self, query):
+        return Product.objects.filter(
+            Q(title__icontains=query) |
+            Q(desc__icontains=query) |
+            Q(brand__icontains=query) |
+            Q(company__icontains=query),
+            is_active=True
+        )
+
+    def measure(self, queryset, repeat):
+        # One listing page is a COUNT plus the first twelve rows.
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            queryset.count()
+            list(queryset[:12])
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
@@ -0,0 +1,85 @@
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from main.benchmark import summarize, write_results
+from main.models import Product
+from main.sellers import counted_product_wishlists, low_stock_threshold, refresh_seller_summaries
+
+
+USERNAME = 'bench-seller'
+
+
+def looped_totals(seller):
+    """The dashboard figures added up product by product, as a view without the summary would."""
+    totals = defaultdict(Decimal)
+    for product in Product.objects.filter(seller=seller).annotate(wishlisted=counted_product_wishlists()).iterator():
+        totals['product_count'] += 1
+        totals['active_count'] += product.is_active
+        totals['stock_total'] += product.quantity
+        totals['stock_value'] += product.price * product.quantity
+        totals['low_stock_count'] += product.is_active and product.quantity <= low_stock_threshold()
+        totals['view_count'] += product.view_count
+        totals['wishlist_count'] += product.wishlisted
+    return totals
+
+
+class Command(BaseCommand):
+    help = "Time a seller's dashboard totals added up per product, aggregated live and read from the summary table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=50000, help='Products handed to the benchmark seller')
+        parser.add_argument('--renders', type=int, default=20)
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        ids = list(Product.objects.order_by('pk').values_list('pk', flat=True)[:options['listings']])
+        if len(ids) < options['listings']:
+            raise CommandError(f'Only {len(ids)} products, run generate_catalog --products {options["listings"]} first')
+        owners = defaultdict(list)
+        for pk, seller_id in Product.objects.filter(pk__in=ids).values_list('pk', 'seller_id'):
+            owners[seller_id].append(pk)
+
+        seller = get_user_model().objects.create_user(USERNAME, status='seller')
+        try:
+            Product.objects.filter(pk__in=ids).update(seller=seller)
+            client = Client(SERVER_NAME='localhost')
+            client.force_login(seller)
+            url = reverse('accounts:profile_seller')
+            modes = (
+                ('loop', lambda: looped_totals(seller)),
+                ('aggregate', lambda: refresh_seller_summaries([seller.pk])),
+                ('dashboard', lambda: client.get(url)),
+            )
+
+            results = {}
+            for mode, run in modes:
+                run()
+                timings = []
+                for _ in range(options['renders']):
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        run()
+                        timings.append(time.perf_counter() - started)
+                results[mode] = {**summarize(timings), 'queries': len(queries)}
+                self.stdout.write(
+                    f'{mode:<10} p50 {results[mode]["p50_ms"]:9.2f} ms   p95 {results[mode]["p95_ms"]:9.2f} ms   '
+                    f'{results[mode]["queries"]} queries'
+                )
+        finally:
+            for seller_id, pks in owners.items():
+                Product.objects.filter(pk__in=pks).update(seller_id=seller_id)
+            seller.delete()
+
+        if options['output']:
+            write_results(options['output'], 'seller_dashboard', {
+                key: options[key] for key in ('listings', 'renders')
+            }, results)
+            self.stdout.write(f'Results written to {options["output"]}')
@@ -0,0 +1,169 @@
+import time
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.mixins import AccessMixin
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.urls import URLPattern, reverse
+
+from accounts import urls as accounts_urls
+from main import urls as main_urls
+from main.benchmark import LoadRun, load_results, write_results
+
+
+# Logging out would drop the session of the client that requested it, and
+# the metrics report is an internal endpoint.
+SKIPPED = {'accounts:logout', 'main:request_metrics'}
+VARIANTS = {
+    'main:product_list': ['?sort=price', '?sort=-price&cursor=', '?condition=new', '?search=phone'],
+    'main:product_list_large': ['?sort=price'],
+    'main:search': ['?q=phone', '?q=smart+watch'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Drive every storefront URL with concurrent clients and report throughput and latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=50, help='Requests per client')
+        parser.add_argument('--base-url', help='Benchmark a running server instead of in-process clients')
+        parser.add_argument('--username', help='Account used for the profile pages')
+        parser.add_argument('--password', default='password')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='Print the change against an earlier JSON result')
+
+    def handle(self, *args, **options):
+        targets = self.targets()
+        user = self.get_user(options['username'])
+        if user is None:
+            targets = [target for target in targets if not target[2]]
+            self.stdout.write('No user found, skipping pages that need login.')
+
+        if options['base_url']:
+            worker = self.http_worker(targets, options, user)
+        else:
+            worker = self.client_worker(targets, options, user)
+
+        results = LoadRun(options['clients']).run(worker)
+        self.report(results)
+
+        if options['output']:
+            write_results(options['output'], 'storefront', {
+                key: options[key] for key in ('clients', 'requests', 'base_url')
+            }, results)
+            self.stdout.write(f'Results written to {options["output"]}')
+        if options['compare']:
+            self.compare(load_results(options['compare'])['results'], results)
+
+    def targets(self):
+        """Return ``(name, url, needs_login)`` for every GET page of the shop."""
+        targets = []
+        for module in (main_urls, accounts_urls):
+            for pattern in module.urlpatterns:
+                if not isinstance(pattern, URLPattern):
+                    continue
+                name = f'{module.app_name}:{pattern.name}'
+                if name in SKIPPED:
+                    continue
+                view_class = getattr(pattern.callback, 'view_class', None)
+                kwargs = {}
+                if 'slug' in pattern.pattern.converters:
+                    instance = view_class.model.objects.filter(is_active=True).order_by('?').first()
+                    if instance is None:
+                        self.stdout.write(f'No {view_class.model._meta.verbose_name} to request, skipping {name}.')
+                        continue
+                    kwargs['slug'] = instance.slug
+                url = reverse(name, kwargs=kwargs)
+                needs_login = issubclass(view_class, AccessMixin)
+                targets.append((name, url, needs_login))
+                for query in VARIANTS.get(name, []):
+                    targets.append((f'{name}{query}', url + query, needs_login))
+        return targets
+
+    def get_user(self, username):
+        users = get_user_model().objects.filter(is_active=True)
+        if username:
+            try:
+                return users.get(username=username)
+            except get_user_model().DoesNotExist:
+                raise CommandError(f'User "{username}" does not exist')
+        return users.filter(is_staff=False).order_by('pk').first()
+
+    def client_worker(self, targets, options, user):
+        def worker(number, record):
+            host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+            client = Client(SERVER_NAME=host)
+            if user is not None:
+                client.force_login(user)
+            try:
+                for index in range(options['requests']):
+                    name, url, needs_login = targets[(number + index) % len(targets)]
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    record(name, time.perf_counter() - started, response.status_code < 400)
+            finally:
+                connections.close_all()
+        return worker
+
+    def http_worker(self, targets, options, user):
+        base_url = options['base_url'].rstrip('/')
+
+        def login(opener, cookies):
+            url = base_url + reverse('accounts:login')
+            opener.open(url).read()
+            token = next(cookie.value for cookie in cookies if cookie.name == 'csrftoken')
+            data = urlencode({
+                'username': user.username, 'password': options['password'], 'csrfmiddlewaretoken': token
+            }).encode()
+            opener.open(Request(url, data=data, headers={'Referer': url})).read()
+
+        def worker(number, record):
+            cookies = CookieJar()
+            opener = build_opener(HTTPCookieProcessor(cookies))
+            if user is not None:
+                login(opener, cookies)
+            for index in range(options['requests']):
+                name, url, needs_login = targets[(number + index) % len(targets)]
+                started = time.perf_counter()
+                try:
+                    with opener.open(base_url + url) as response:
+                        response.read()
+                        ok = response.status < 400
+                except (HTTPError, URLError):
+                    ok = False
+                record(name, time.perf_counter() - started, ok)
+        return worker
+
+    def report(self, results):
+        self.stdout.write(f'{"target":<50} {"count":>6} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"errors":>6}')
+        rows = list(results['targets'].items()) + [('total', {**results['latency'], 'errors': results['errors']})]
+        for name, stats in rows:
+            self.stdout.write(
+                f'{name:<50} {stats["count"]:>6} {stats["p50_ms"]:>9.2f} '
+                f'{stats["p95_ms"]:>9.2f} {stats["p99_ms"]:>9.2f} {stats["errors"]:>6}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'{results["requests"]} requests from {results["clients"]} clients in {results["elapsed_s"]}s '
+            f'({results["throughput_rps"]} req/s)'
+        ))
+
+    def compare(self, before, after):
+        def change(old, new):
+            return f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
+
+        self.stdout.write(f'{"target":<50} {"p95 before":>11} {"p95 after":>11} {"change":>8}')
+        for name, stats in after['targets'].items():
+            if name in before['targets']:
+                old = before['targets'][name]['p95_ms']
+                self.stdout.write(f'{name:<50} {old:>11.2f} {stats["p95_ms"]:>11.2f} {change(old, stats["p95_ms"]):>8}')
+        self.stdout.write(
+            f'Throughput {before["throughput_rps"]} -> {after["throughput_rps"]} req/s '
+            f'({change(before["throughput_rps"], after["throughput_rps"])})'
+        )
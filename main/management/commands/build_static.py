@@ -0,0 +1,34 @@
+import json
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from main.staticfiles import REPORT_NAME
+
+
+def saved(before, after):
+    return f'{before / 1024:.0f} KiB -> {after / 1024:.0f} KiB ({(before - after) * 100 / before if before else 0:.0f}% saved)'
+
+
+class Command(BaseCommand):
+    help = 'Collect static files with hashed names, purged CSS and pre-compressed siblings, and report bytes saved'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help='Remove the previous build first')
+
+    def handle(self, *args, **options):
+        call_command('collectstatic', interactive=False, clear=options['clear'], verbosity=0)
+        with staticfiles_storage.open(REPORT_NAME) as source:
+            report = json.load(source)
+
+        for name, (before, after) in sorted(report['purged'].items()):
+            self.stdout.write(f'{name:<30} {saved(before, after)}')
+        css_before = sum(before for before, after in report['purged'].values())
+        css_after = sum(after for before, after in report['purged'].values())
+        self.stdout.write(f'{"unused CSS":<30} {saved(css_before, css_after)}')
+        for encoding in ('gzip', 'brotli'):
+            before, after = report[encoding]
+            if before:
+                self.stdout.write(f'{encoding:<30} {saved(before, after)}')
+        self.stdout.write(self.style.SUCCESS(f'Built {report["files"]} static files'))
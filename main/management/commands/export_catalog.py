@@ -0,0 +1,29 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.catalog import FORMATS, export_products, guess_format
+
+
+class Command(BaseCommand):
+    help = 'Write every product to a CSV or JSONL file that import_catalog can read back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to write, or - for standard output')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or guess_format(path)
+        started = time.perf_counter()
+        if path == '-':
+            total = export_products(sys.stdout, format, batch_size=options['batch_size'])
+            return
+        with open(path, 'w', newline='', encoding='utf-8') as output:
+            total = export_products(output, format, batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {total} products in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.0f} rows/s)'
+        ))
@@ -0,0 +1,226 @@
+import random
+import string
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.text import slugify
+
+from main.cache import bump_version
+from main.counters import reconcile_product_counts
+from main.facets import rebuild_facet_counts
+from main.models import (
+    Category, ProductCategory, Country, Product, ProductImage, Service,
+    CompanyChoices, BrandChoices, SizeChoices, ColorChoices, ConditionChoices
+)
+from main.search import get_backend
+from main.sorting import set_sort_keys
+
+
+CATEGORY_NAMES = [
+    'Electronics', 'Clothing', 'Shoes', 'Home and Kitchen', 'Beauty', 'Sports', 'Toys',
+    'Books', 'Automotive', 'Garden', 'Health', 'Jewelry', 'Office', 'Pet Supplies',
+]
+COUNTRY_NAMES = [
+    'Uzbekistan', 'Kazakhstan', 'China', 'Turkey', 'Germany', 'Italy', 'Japan', 'Korea',
+    'United States', 'United Kingdom', 'France', 'India', 'Vietnam', 'Poland', 'Spain',
+]
+ADJECTIVES = ['Classic', 'Smart', 'Slim', 'Pro', 'Ultra', 'Eco', 'Mini', 'Max', 'Sport', 'Premium', 'Light', 'Wireless']
+NOUNS = [
+    'Phone', 'Laptop', 'Headphones', 'Watch', 'Jacket', 'Sneakers', 'Backpack', 'Lamp', 'Chair',
+    'Blender', 'Camera', 'Speaker', 'Shirt', 'Dress', 'Kettle', 'Monitor', 'Keyboard', 'Bottle',
+]
+SENTENCES = [
+    'Made from durable materials for everyday use.',
+    'Ships in original packaging with a full warranty.',
+    'Lightweight design that is easy to carry anywhere.',
+    'Carefully tested before shipping by our quality team.',
+    'A popular choice among our returning customers.',
+    'Compatible with most standard accessories.',
+    'Energy efficient and quiet in operation.',
+    'Available in several colors and sizes.',
+]
+DELIVERY_TIMES = ['1-2 days', '3-5 days', '1 week', '2 weeks']
+
+
+def weighted(values, weights):
+    return lambda: random.choices(values, weights)[0]
+
+
+@contextmanager
+def explicit_dates(model, *names):
+    # bulk_create would otherwise stamp every row with today's date.
+    fields = [model._meta.get_field(name) for name in names]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic catalog and users with realistic value distributions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=12)
+        parser.add_argument('--product-categories', type=int, default=8, help='Per category')
+        parser.add_argument('--countries', type=int, default=15)
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--images', type=int, default=3, help='Maximum images per product')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        self.batch_size = options['batch_size']
+        # Every run gets its own tag so slugs and usernames never collide
+        # with rows generated earlier.
+        self.tag = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            countries = self.create_countries(options['countries'])
+            product_categories = self.create_categories(options['categories'], options['product_categories'])
+            products = self.create_products(options['products'], product_categories, countries)
+            images = self.create_images(products, options['images'])
+            users = self.create_users(options['users'])
+            self.create_services()
+
+            get_backend().rebuild()
+            rebuild_facet_counts()
+            reconcile_product_counts()
+        for model in (Category, ProductCategory, Country, Product, Service):
+            bump_version(model)
+
+        elapsed = time.perf_counter() - started
+        rows = len(countries) + len(product_categories) + len(products) + images + users
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(products)} products, {images} images, {len(product_categories)} product categories, '
+            f'{len(countries)} countries and {users} users in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)'
+        ))
+
+    def bulk_create(self, model, objects):
+        return model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    def create_countries(self, count):
+        return self.bulk_create(Country, [
+            Country(name=COUNTRY_NAMES[number % len(COUNTRY_NAMES)], icon=f'country/icons/{number % len(COUNTRY_NAMES)}.png')
+            for number in range(count)
+        ])
+
+    def create_categories(self, count, per_category):
+        categories = self.bulk_create(Category, [
+            Category(
+                name=CATEGORY_NAMES[number % len(CATEGORY_NAMES)],
+                slug=f'{slugify(CATEGORY_NAMES[number % len(CATEGORY_NAMES)])}-{self.tag}-{number}',
+                image='category/image/sample.png',
+                description=' '.join(random.sample(SENTENCES, 2)),
+                color=random.choice(ColorChoices.values),
+            )
+            for number in range(count)
+        ])
+        return self.bulk_create(ProductCategory, [
+            ProductCategory(
+                name=f'{category.name} {noun}',
+                slug=f'{slugify(category.name)}-{slugify(noun)}-{self.tag}-{category.pk}-{number}',
+                category=category,
+                is_active=random.random() < 0.95,
+            )
+            for category in categories
+            for number, noun in enumerate(random.sample(NOUNS, min(per_category, len(NOUNS))))
+        ])
+
+    def create_products(self, count, product_categories, countries):
+        # A few product categories and countries hold most of the catalog,
+        # like in a real shop.
+        product_category = weighted(product_categories, [1 / (rank + 1) ** 0.8 for rank in range(len(product_categories))])
+        country = weighted(countries, [1 / (rank + 1) for rank in range(len(countries))])
+        company = weighted(CompanyChoices.values, [8, 8, 6, 4, 3, 3, 5, 5, 3, 3, 3, 6])
+        brand = weighted(BrandChoices.values, [2, 6, 4, 1, 3, 1])
+        size = weighted([''] + SizeChoices.values, [30, 3, 8, 12, 12, 8, 4, 2, 8, 3])
+        color = weighted([''] + ColorChoices.values, [10, 5, 6, 3, 2, 12, 10, 2, 2, 6])
+        condition = weighted(ConditionChoices.values, [70, 10, 12, 5, 2, 1])
+        discount = weighted([0, 5, 10, 15, 20, 30, 50], [70, 8, 8, 5, 5, 3, 1])
+        today = date.today()
+
+        products = []
+        with explicit_dates(Product, 'created_at', 'update_at'):
+            for number in range(count):
+                created_at = today - timedelta(days=min(int(random.expovariate(1 / 120)), 1000))
+                title = f'{random.choice(ADJECTIVES)} {CompanyChoices(company()).label} {random.choice(NOUNS)}'
+                products.append(Product(
+                    title=title,
+                    slug=f'{slugify(title)}-{self.tag}-{number}',
+                    desc=' '.join(random.sample(SENTENCES, random.randint(2, 4))),
+                    main_image=f'products/main_images/sample-{number % 20}.jpg',
+                    price=Decimal(str(round(min(max(random.lognormvariate(3.5, 1.0), 1), 99999), 2))),
+                    country=country() if random.random() < 0.9 else None,
+                    product_category=product_category(),
+                    quantity=int(random.expovariate(1 / 50)),
+                    review=min(int(random.paretovariate(1.2)) - 1, 10000),
+                    year=random.randint(2010, today.year) if random.random() < 0.8 else None,
+                    delivery_time=random.choice(DELIVERY_TIMES),
+                    star=min(max(round(random.gauss(7.5, 1.5)), 0), 10),
+                    company=company(),
+                    brand=brand(),
+                    size=size(),
+                    dicount=discount(),
+                    color=color(),
+                    verified=random.random() < 0.3,
+                    recommended=random.random() < 0.05,
+                    condition=condition(),
+                    is_active=random.random() < 0.95,
+                    created_at=created_at,
+                    update_at=created_at + timedelta(days=random.randint(0, (today - created_at).days)),
+                ))
+                set_sort_keys(products[-1])
+                if len(products) % self.batch_size == 0:
+                    self.stdout.write(f'  {len(products)} products prepared')
+            return self.bulk_create(Product, products)
+
+    def create_images(self, products, maximum):
+        images = [
+            ProductImage(image=f'products/images/sample-{random.randint(0, 49)}.jpg', product=product)
+            for product in products
+            for _ in range(random.randint(0, maximum))
+        ]
+        return len(self.bulk_create(ProductImage, images))
+
+    def create_users(self, count):
+        User = get_user_model()
+        # Hashing is the slow part of creating users, and every generated
+        # account shares the same password anyway.
+        password = make_password('password')
+        return len(self.bulk_create(User, [
+            User(
+                username=f'user_{self.tag}_{number}',
+                email=f'user_{self.tag}_{number}@example.com',
+                password=password,
+                first_name=random.choice(['Aziz', 'Dilnoza', 'Timur', 'Malika', 'Sardor', 'Nodira']),
+                phone=f'+998{random.randint(900000000, 999999999)}',
+                address=f'{random.randint(1, 200)} {random.choice(["Amir Temur", "Navoi", "Bobur"])} street',
+                status='seller' if random.random() < 0.1 else 'customer',
+            )
+            for number in range(count)
+        ]))
+
+    def create_services(self):
+        if not Service.objects.exists():
+            self.bulk_create(Service, [
+                Service(title=title, image='services/images/sample.png', desc=desc)
+                for title, desc in [
+                    ('Fast delivery', 'Delivery across the country'),
+                    ('Secure payment', 'Pay online or on delivery'),
+                    ('Easy returns', 'Return within 14 days'),
+                    ('Support', 'We are here every day'),
+                ]
+            ])
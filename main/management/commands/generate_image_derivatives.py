@@ -0,0 +1,49 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main import images
+from main.models import Category, Country, Product, ProductImage
+
+
+SOURCES = [(Product, 'main_image'), (ProductImage, 'image'), (Category, 'image'), (Country, 'icon')]
+
+
+class Command(BaseCommand):
+    help = 'Create the resized WebP and fallback copies of every product, category and country image'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Processes to use, defaults to one per CPU')
+        parser.add_argument('--force', action='store_true', help='Regenerate derivatives that already exist')
+
+    def handle(self, *args, **options):
+        if images.Image is None:
+            raise CommandError('Pillow is required to create image derivatives')
+
+        names = set()
+        for model, field in SOURCES:
+            names.update(model.objects.exclude(**{field: ''}).values_list(field, flat=True).distinct())
+        names = sorted(name for name in names if images.can_resize(name))
+
+        started = time.perf_counter()
+        created = original_bytes = derivative_bytes = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            results = executor.map(
+                images.generate_derivatives, names, [options['force']] * len(names), chunksize=16
+            )
+            for result in results:
+                if result:
+                    created += 1
+                    original_bytes += result[0]
+                    derivative_bytes += result[1]
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created derivatives for {created} of {len(names)} images in {elapsed:.1f}s'
+        ))
+        if created:
+            self.stdout.write(
+                f'Originals {original_bytes / 1024:.0f} KiB, largest WebP variants {derivative_bytes / 1024:.0f} KiB '
+                f'({100 - derivative_bytes * 100 / original_bytes:.0f}% smaller)'
+            )
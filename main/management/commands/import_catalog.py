@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.catalog import FORMATS, CatalogImporter, guess_format, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Create or update products from a CSV or JSONL file, streaming it in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to read, or - for standard input')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--skip-existing', action='store_true', help='Leave products whose slug already exists untouched')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or guess_format(path)
+        importer = CatalogImporter(batch_size=options['batch_size'], update_existing=not options['skip_existing'])
+        try:
+            if path == '-':
+                result = importer.run(read_rows(sys.stdin, format))
+            else:
+                with open(path, newline='', encoding='utf-8') as source:
+                    result = importer.run(read_rows(source, format))
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+
+        for number, message in importer.errors[:20]:
+            self.stderr.write(f'Row {number}: {message}')
+        if len(importer.errors) > 20:
+            self.stderr.write(f'... and {len(importer.errors) - 20} more errors')
+        self.stdout.write(self.style.SUCCESS(
+            f'{result["rows"]} rows in {result["elapsed_s"]}s ({result["rows_per_s"]} rows/s): '
+            f'{result["created"]} created, {result["updated"]} updated, '
+            f'{result["skipped"]} skipped, {result["errors"]} errors'
+        ))
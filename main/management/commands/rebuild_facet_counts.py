@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main.facets import rebuild_facet_counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored listing facet counts from the product table'
+
+    def handle(self, *args, **options):
+        total = rebuild_facet_counts()
+        self.stdout.write(self.style.SUCCESS(f'Stored {total} facet counts'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main import related
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored related products of every active product'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=None, help='Neighbours per product')
+
+    def handle(self, *args, **options):
+        if related.np is None:
+            raise CommandError('NumPy is required to compute related products')
+        result = related.rebuild_related_products(options['count'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {result["rows"]} related products for {result["products"]} products '
+            f'(load {result["load_s"]:.2f}s, score {result["compute_s"]:.2f}s, write {result["write_s"]:.2f}s)'
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from main.counters import reconcile_product_counts
+
+
+class Command(BaseCommand):
+    help = 'Recount the active products of every category and product category and repair stored counters that drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without repairing it')
+
+    def handle(self, *args, **options):
+        drift = reconcile_product_counts(fix=not options['dry_run'])
+        verb = 'Found' if options['dry_run'] else 'Repaired'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {drift["productcategory"]} product category and {drift["category"]} category counters'
+        ))
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.sellers import refresh_seller_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute every seller's dashboard totals from their listings"
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = refresh_seller_summaries()
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshed {count} seller summaries in {time.perf_counter() - started:.2f}s'
+        ))
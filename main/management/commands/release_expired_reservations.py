@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from main.inventory import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Return the stock of expired reservations to their products, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Reservations released per transaction')
+
+    def handle(self, *args, **options):
+        released = release_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired reservations'))
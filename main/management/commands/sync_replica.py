@@ -0,0 +1,53 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from main.routers import REPLICA_SYNCED_KEY
+
+
+def copy_database(source, target):
+    """Snapshot ``source`` into ``target`` without ever exposing a half-written file."""
+    partial = f'{target}.partial'
+    primary, replica = sqlite3.connect(source), sqlite3.connect(partial)
+    try:
+        primary.backup(replica)
+        # The copy would otherwise keep the primary's WAL mode, and a
+        # WAL file cannot follow the main file through os.replace.
+        replica.execute('PRAGMA journal_mode = delete')
+    finally:
+        replica.close()
+        primary.close()
+    # New connections open the new file; open ones finish on the old copy.
+    os.replace(partial, target)
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database into the read replica stand-in, once or every --interval seconds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None, help='Keep syncing, this many seconds apart')
+
+    def handle(self, *args, **options):
+        alias = getattr(settings, 'DATABASE_READ_REPLICA', None)
+        if not alias or alias not in connections.settings:
+            raise CommandError('No read replica is configured')
+        primary, replica = connections[DEFAULT_DB_ALIAS].settings_dict, connections[alias].settings_dict
+        if not (primary['ENGINE'].endswith('sqlite3') and replica['ENGINE'].endswith('sqlite3')):
+            raise CommandError("Only the SQLite stand-in can be synced; use the database's own replication")
+        if str(primary['NAME']) == str(replica['NAME']):
+            raise CommandError('The replica is the primary database')
+
+        while True:
+            started = time.perf_counter()
+            copy_database(primary['NAME'], replica['NAME'])
+            connections[alias].close()
+            cache.set(REPLICA_SYNCED_KEY, time.time_ns(), timeout=None)
+            self.stdout.write(f'Synced {replica["NAME"]} in {(time.perf_counter() - started) * 1000:.0f} ms')
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
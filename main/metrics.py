@@ -0,0 +1,108 @@
+import json
+import math
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+
+METRIC_FIELDS = ('queries', 'duplicate_queries', 'similar_queries', 'sql_ms', 'template_ms', 'wall_ms')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryRecorder:
+    """``connection.execute_wrapper`` that counts and times every query."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        self.templates = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.templates[sql] += 1
+            try:
+                self.statements[(sql, repr(params))] += 1
+            except Exception:
+                pass
+
+    @property
+    def duplicates(self):
+        """Queries repeated with the very same parameters."""
+        return sum(count - 1 for count in self.statements.values())
+
+    @property
+    def similar(self):
+        """Queries repeated with different parameters, the N+1 signature."""
+        return sum(count - 1 for count in self.templates.values())
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[index]
+
+
+class MetricsStore:
+    """Keeps the latest samples per URL name in memory for percentile reports."""
+
+    def __init__(self, max_samples=1000):
+        self.max_samples = max_samples
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=self.max_samples))
+        self.totals = Counter()
+
+    def add(self, name, sample):
+        with self.lock:
+            self.samples[name].append(sample)
+            self.totals[name] += 1
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+            self.totals.clear()
+
+    def report(self):
+        with self.lock:
+            samples = {name: list(values) for name, values in self.samples.items()}
+            totals = dict(self.totals)
+
+        report = {}
+        for name, values in sorted(samples.items()):
+            stats = {'requests': totals[name]}
+            for field in METRIC_FIELDS:
+                column = [sample[field] for sample in values]
+                stats[field] = {
+                    'p50': percentile(column, 0.50),
+                    'p95': percentile(column, 0.95),
+                    'p99': percentile(column, 0.99),
+                    'max': max(column),
+                }
+            report[name] = stats
+        return report
+
+
+class JSONLWriter:
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, default=str) + '\n'
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as log:
+                log.write(line)
+
+
+store = MetricsStore()
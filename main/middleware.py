@@ -0,0 +1,231 @@
+import logging
+import mimetypes
+import os
+import time
+from contextlib import ExitStack
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from .metrics import JSONLWriter, QueryBudgetExceeded, QueryRecorder, store
+from .routers import get_replica_alias, routing_state
+from .staticfiles import is_hashed
+
+
+logger = logging.getLogger('main.metrics')
+
+
+class RequestMetricsMiddleware:
+    """
+    Records query count, duplicate queries, SQL time, template render time
+    and wall time for every request, grouped by URL name, and enforces
+    ``QUERY_BUDGETS``. Template time includes queries run lazily while
+    rendering.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        log_path = getattr(settings, 'REQUEST_METRICS_LOG', None)
+        self.log = JSONLWriter(log_path) if log_path else None
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        request._template_duration = 0.0
+        started = time.perf_counter()
+        with self.record_queries(recorder):
+            response = self.get_response(request)
+        return self.finish(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        request._template_duration = 0.0
+        started = time.perf_counter()
+        # Connections belong to threads, so the wrapper is installed on the
+        # thread the request's queries run in rather than the event loop's.
+        stack = await sync_to_async(self.record_queries)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, recorder, started)
+
+    def record_queries(self, recorder):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        return stack
+
+    def finish(self, request, response, recorder, started):
+        wall = time.perf_counter() - started
+
+        name = request.resolver_match.view_name if request.resolver_match else 'unresolved'
+        sample = {
+            'queries': recorder.count,
+            'duplicate_queries': recorder.duplicates,
+            'similar_queries': recorder.similar,
+            'sql_ms': round(recorder.duration * 1000, 3),
+            'template_ms': round(request._template_duration * 1000, 3),
+            'wall_ms': round(wall * 1000, 3),
+        }
+        store.add(name, sample)
+        if self.log:
+            self.log.write({'view': name, 'path': request.path, 'status': response.status_code, 'time': time.time(), **sample})
+
+        self.check_budget(name, recorder.count)
+        return response
+
+    def process_template_response(self, request, response):
+        render = response.render
+
+        def timed_render():
+            started = time.perf_counter()
+            try:
+                return render()
+            finally:
+                request._template_duration += time.perf_counter() - started
+
+        response.render = timed_render
+        return response
+
+    def check_budget(self, name, count):
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(name)
+        if budget is None or count <= budget:
+            return
+        message = f'{name} ran {count} queries, its budget is {budget}'
+        if getattr(settings, 'QUERY_BUDGET_ACTION', 'log') == 'raise':
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class StaticFilesMiddleware:
+    """
+    Serves files collected into ``STATIC_ROOT``. Clients that accept brotli
+    or gzip get the compressed sibling written at build time, and hashed
+    names are cached for a year since their content can never change.
+    """
+    encodings = (('br', '.br'), ('gzip', '.gz'))
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = urlsplit(settings.STATIC_URL).path
+        if not self.prefix.startswith('/'):
+            self.prefix = '/' + self.prefix
+        self.root = str(settings.STATIC_ROOT) if settings.STATIC_ROOT else None
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        response = self.serve_static(request)
+        if iscoroutinefunction(self):
+            return self.__acall__(request, response)
+        return response or self.get_response(request)
+
+    async def __acall__(self, request, response):
+        return response or await self.get_response(request)
+
+    def serve_static(self, request):
+        if self.root and request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix):
+            return self.serve(request, request.path[len(self.prefix):])
+        return None
+
+    def serve(self, request, name):
+        try:
+            path = safe_join(self.root, name)
+            stat = os.stat(path)
+        except (ValueError, OSError):
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+            response = HttpResponseNotModified()
+        else:
+            accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+            encoding = None
+            for candidate, suffix in self.encodings:
+                if candidate in accepted and os.path.isfile(path + suffix):
+                    encoding, path = candidate, path + suffix
+                    break
+            content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+            response['Content-Length'] = os.path.getsize(path)
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        patch_vary_headers(response, ['Accept-Encoding'])
+        if is_hashed(name):
+            response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        else:
+            response['Cache-Control'] = 'public, max-age=60'
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets GET and HEAD requests served by the storefront views in
+    ``main.views`` read the catalog from the replica. A request that writes
+    sends its client to the primary for ``REPLICA_STICKY_SECONDS``, so users
+    see their own changes while the replica catches up.
+    """
+    sync_capable = True
+    async_capable = True
+    cookie_name = 'primary_until'
+    storefront_module = 'main.views'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routing_state() as state:
+            request.routing_state = state
+            response = self.get_response(request)
+        return self.stick_to_primary(response, state)
+
+    async def __acall__(self, request):
+        with routing_state() as state:
+            request.routing_state = state
+            response = await self.get_response(request)
+        return self.stick_to_primary(response, state)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method in ('GET', 'HEAD')
+            and view_func.__module__ == self.storefront_module
+            and not self.is_sticky(request)
+        ):
+            request.routing_state.replica = get_replica_alias()
+
+    def is_sticky(self, request):
+        try:
+            return float(request.COOKIES.get(self.cookie_name, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def stick_to_primary(self, response, state):
+        if state.wrote:
+            seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+            response.set_cookie(
+                self.cookie_name, str(int(time.time() + seconds)), max_age=seconds, httponly=True, samesite='Lax'
+            )
+        return response
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS main_product_fts USING fts5("
+        "title, description, brand, company, "
+        "prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        'INSERT INTO main_product_fts (rowid, title, description, brand, company) '
+        'SELECT id, title, "desc", brand, company FROM main_product'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS main_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_alter_product_brand_alter_product_company_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:26
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+FACET_FIELDS = {
+    'category': 'product_category_id',
+    'country': 'country_id',
+    'company': 'company',
+    'brand': 'brand',
+    'size': 'size',
+    'color': 'color',
+    'condition': 'condition',
+    'verified': 'verified',
+}
+
+
+def populate_facet_counts(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    FacetCount = apps.get_model('main', 'FacetCount')
+    active = Product.objects.filter(is_active=True).order_by()
+    rows = []
+    for facet, field in FACET_FIELDS.items():
+        for value, count in active.values_list(field).annotate(count=Count('pk')):
+            if value in (None, '', False):
+                continue
+            rows.append(FacetCount(facet=facet, value=str(value), count=count))
+    FacetCount.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=50)),
+                ('value', models.CharField(max_length=200)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='facetcount',
+            constraint=models.UniqueConstraint(fields=('facet', 'value'), name='unique_facet_value'),
+        ),
+        migrations.RunPython(populate_facet_counts, migrations.RunPython.noop),
+    ]
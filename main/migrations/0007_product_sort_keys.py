@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:24
+
+from django.db import migrations, models
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast
+
+# Copied from main.sorting as they were when the columns were added.
+PRIOR_REVIEWS = 10
+PRIOR_STARS = 5
+
+
+def populate_sort_keys(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    Product.objects.update(
+        rating_score=(Cast(F('star') * F('review'), FloatField()) + PRIOR_STARS * PRIOR_REVIEWS)
+        / (F('review') + Value(PRIOR_REVIEWS)),
+        popularity_score=F('star') * F('review'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_relatedproduct'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='popularity_score',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_sort_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-rating_score', '-id'], name='product_active_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-popularity_score', '-id'], name='product_active_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-dicount', '-id'], name='product_active_discount_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:25
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_product_counts(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    for model_name, field in (('ProductCategory', 'product_category'), ('Category', 'product_category__category')):
+        counts = (
+            Product.objects.filter(is_active=True, **{field: OuterRef('pk')}).order_by()
+            .values(field).annotate(total=Count('pk')).values('total')
+        )
+        apps.get_model('main', model_name).objects.update(
+            product_count=Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_product_sort_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productcategory',
+            name='product_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_product_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_sellers'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_active_category_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_active_country_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_active_condition_idx',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['product_category', '-created_at', '-id'], name='product_active_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['country', '-created_at', '-id'], name='product_active_country_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['condition', '-created_at', '-id'], name='product_active_condition_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['company', '-created_at', '-id'], name='product_active_company_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['size', '-created_at', '-id'], name='product_active_size_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('verified', True)), fields=['-created_at', '-id', 'is_active', 'verified'], name='product_verified_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:05
+
+from django.db import migrations
+from django.db.models import Count, Q
+
+
+PRICE_BUCKETS = (0, 50, 100, 250, 500, 1000)
+
+
+def populate_price_counts(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    FacetCount = apps.get_model('main', 'FacetCount')
+    active = Product.objects.filter(is_active=True).order_by()
+    aggregates = {}
+    for low, high in zip(PRICE_BUCKETS, [*PRICE_BUCKETS[1:], None]):
+        condition = Q(price__gte=low, price__lt=high) if high is not None else Q(price__gte=low)
+        aggregates[f'price_{low}'] = Count('pk', filter=condition)
+    counts = active.aggregate(**aggregates)
+    FacetCount.objects.bulk_create([
+        FacetCount(facet='price', value=str(low), count=counts[f'price_{low}'])
+        for low in PRICE_BUCKETS if counts[f'price_{low}']
+    ], ignore_conflicts=True)
+
+
+def remove_price_counts(apps, schema_editor):
+    apps.get_model('main', 'FacetCount').objects.filter(facet='price').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_product_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_price_counts, remove_price_counts),
+    ]
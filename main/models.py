@@ -1,8 +1,10 @@
+from django.conf import settings
 from django.db import models
+from django.utils.dateparse import parse_datetime
 from django.utils.translation import gettext_lazy as _
-from django.utils.text import slugify
-from random import shuffle, choices, randint
-from string import ascii_letters, digits 
+
+from .slugs import UniqueSlugMixin
+from .sorting import SORT_KEY_FIELDS, SORT_KEY_SOURCES, set_sort_keys
 
 class ColorChoices(models.TextChoices):
     RED = 'red', _('Red')
@@ -61,13 +63,30 @@ class ConditionChoices(models.TextChoices):
     FOR_PARTS = 'for_parts', _('For Parts')
 
 
-class Category(models.Model):
+class ProductCountMixin:
+    """
+    Leaves ``product_count`` out of saves of loaded rows: it only changes
+    through F() updates, which a form save would otherwise overwrite.
+    """
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'product_count'
+            ]
+        return super().save(*args, **kwargs)
+
+
+class Category(ProductCountMixin, UniqueSlugMixin, models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
     image = models.FileField(upload_to='category/image')
     description = models.TextField()
     color = models.CharField(max_length=50, choices=ColorChoices.choices, default=ColorChoices.BLACK)
     is_active = models.BooleanField(default=True)
+    # Active products, kept up to date by main.signals.
+    product_count = models.IntegerField(default=0, editable=False)
 
     class Meta:
         verbose_name_plural = 'Categories'
@@ -75,38 +94,19 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
-    def save(self, *args, **kwargs):
-        slug = slugify(self.name)
-        number = 1
-
-        while Category.objects.filter(slug=slug).exists():
-            slug = slugify(self.name) + f"-{number}"
-            number += 1
-        self.slug = slug
 
-        return super().save(*args, **kwargs)
-    
-
-class ProductCategory(models.Model):
+class ProductCategory(ProductCountMixin, UniqueSlugMixin, models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='product_categories')
     is_active = models.BooleanField(default=True)
+    product_count = models.IntegerField(default=0, editable=False)
 
     class Meta:
         verbose_name_plural = 'Product Categories'
 
     def __str__(self):
         return self.name
-    
-    def save(self, *args, **kwargs):
-        slug = slugify(self.name)
-        suffix = choices(ascii_letters + digits, k=randint(5, 20))
-        shuffle(suffix)
-        slug += "".join(suffix)
-        self.slug = slug
-
-        return super().save(*args, **kwargs)
 
 
 class Country(models.Model):
@@ -121,7 +121,7 @@ class Country(models.Model):
         return self.name
 
 
-class Product(models.Model):
+class Product(UniqueSlugMixin, models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True, blank=True)
     desc = models.TextField()
@@ -129,6 +129,7 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     country = models.ForeignKey(Country, on_delete=models.SET_NULL, null=True, related_name='products')
     product_category = models.ForeignKey(ProductCategory, on_delete=models.CASCADE, related_name='products')
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='listings')
     quantity = models.PositiveIntegerField(default=0)
     review = models.PositiveIntegerField(default=0)
     year = models.PositiveSmallIntegerField(null=True, blank=True)
@@ -145,19 +146,60 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateField(auto_now_add=True)
     update_at = models.DateField(auto_now=True)
+    # Sort keys derived from star and review, kept up to date by save().
+    rating_score = models.FloatField(default=0, editable=False)
+    popularity_score = models.PositiveIntegerField(default=0, editable=False)
+    # Detail page renders, added in batches by main.sellers.product_views.
+    view_count = models.PositiveIntegerField(default=0, editable=False)
 
-    def __str__(self):
-        return self.title
+    slug_source = 'title'
+
+    class Meta:
+        # The storefront only ever reads active products, so every index is
+        # partial on is_active. Django renders boolean filters as a bare
+        # column, which SQLite can match against a partial index condition but
+        # not seek on, hence recommended lives in the condition as well.
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_active=True), name='product_active_newest_idx'),
+            models.Index(fields=['-created_at'], condition=models.Q(is_active=True, recommended=True), name='product_recommended_idx'),
+            models.Index(fields=['product_category', '-created_at', '-id'], condition=models.Q(is_active=True), name='product_active_category_idx'),
+            models.Index(fields=['country', '-created_at', '-id'], condition=models.Q(is_active=True), name='product_active_country_idx'),
+            models.Index(fields=['condition', '-created_at', '-id'], condition=models.Q(is_active=True), name='product_active_condition_idx'),
+            models.Index(fields=['company', '-created_at', '-id'], condition=models.Q(is_active=True), name='product_active_company_idx'),
+            models.Index(fields=['size', '-created_at', '-id'], condition=models.Q(is_active=True), name='product_active_size_idx'),
+            # Verified products are only ever a filter, so they live in the
+            # condition; the trailing flags make the index covering for COUNT.
+            models.Index(
+                fields=['-created_at', '-id', 'is_active', 'verified'],
+                condition=models.Q(is_active=True, verified=True),
+                name='product_verified_idx'
+            ),
+            models.Index(fields=['price', 'id'], condition=models.Q(is_active=True), name='product_active_price_idx'),
+            models.Index(fields=['-rating_score', '-id'], condition=models.Q(is_active=True), name='product_active_rating_idx'),
+            models.Index(fields=['-popularity_score', '-id'], condition=models.Q(is_active=True), name='product_active_popular_idx'),
+            models.Index(fields=['-dicount', '-id'], condition=models.Q(is_active=True), name='product_active_discount_idx'),
+            # The seller dashboard's listing table and low stock alerts.
+            models.Index(fields=['seller', '-created_at', '-id'], name='product_seller_newest_idx'),
+            models.Index(fields=['seller', 'quantity', 'id'], condition=models.Q(is_active=True), name='product_seller_stock_idx'),
+            # Covers COUNT(*) and the facet aggregate so neither reads the wide
+            # rows; SQLite only treats it as covering with is_active included.
+            models.Index(
+                fields=['is_active', 'product_category', 'country', 'company', 'brand', 'size', 'color', 'condition', 'verified', 'price'],
+                condition=models.Q(is_active=True),
+                name='product_active_facets_idx'
+            ),
+        ]
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            slug = slugify(self.title)
-            suffix = choices(ascii_letters + digits, k=randint(5, 15))
-            shuffle(suffix)
-            self.slug = slug + "-" + "".join(suffix)
-        
+        set_sort_keys(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(SORT_KEY_SOURCES):
+            kwargs['update_fields'] = {*update_fields, *SORT_KEY_FIELDS}
         return super().save(*args, **kwargs)
 
+    def __str__(self):
+        return self.title
+
 
 class ProductImage(models.Model):
     image = models.FileField(upload_to='products/images')
@@ -168,6 +210,127 @@ class ProductImage(models.Model):
         return f"Image for {self.product.title}"
 
 
+class WishlistItem(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='wishlist_items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='wishlist_items')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='unique_wishlist_product'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='wishlist_user_newest_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product} in {self.user}'s wishlist"
+
+
+class StockReservation(models.Model):
+    """Units taken off ``Product.quantity`` until checkout confirms or releases them, see main.inventory."""
+    key = models.UUIDField(db_index=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='reservation_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} until {self.expires_at}"
+
+
+class SellerSummary(models.Model):
+    """A seller's catalog totals, refreshed by main.sellers.refresh_seller_summaries()."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='seller_summary')
+    product_count = models.PositiveIntegerField(default=0)
+    active_count = models.PositiveIntegerField(default=0)
+    stock_total = models.PositiveBigIntegerField(default=0)
+    stock_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    low_stock_count = models.PositiveIntegerField(default=0)
+    view_count = models.PositiveBigIntegerField(default=0)
+    wishlist_count = models.PositiveIntegerField(default=0)
+    refreshed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Catalog of {self.user}"
+
+
+class OrderStatus(models.TextChoices):
+    PENDING = 'pending', _('Pending')
+    PAID = 'paid', _('Paid')
+    SHIPPED = 'shipped', _('Shipped')
+    DELIVERED = 'delivered', _('Delivered')
+    CANCELLED = 'cancelled', _('Cancelled')
+
+
+class Order(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='orders')
+    # Changed only through main.orders.set_order_status(), which keeps
+    # the user's OrderSummary in step.
+    status = models.CharField(max_length=20, choices=OrderStatus.choices, default=OrderStatus.PENDING, editable=False)
+    address = models.TextField(blank=True)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_newest_idx'),
+        ]
+
+    def __str__(self):
+        return f"Order #{self.pk}"
+
+
+class OrderItem(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    # Title and price are copied at checkout, so the order still reads the
+    # same after the product changes or is deleted.
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name='order_items')
+    title = models.CharField(max_length=200)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.title}"
+
+
+class OrderSummary(models.Model):
+    """A user's orders counted by status, plus the latest few, for the profile page."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='order_summary')
+    pending_count = models.PositiveIntegerField(default=0)
+    paid_count = models.PositiveIntegerField(default=0)
+    shipped_count = models.PositiveIntegerField(default=0)
+    delivered_count = models.PositiveIntegerField(default=0)
+    cancelled_count = models.PositiveIntegerField(default=0)
+    delivered_items = models.PositiveIntegerField(default=0)
+    # [{'id', 'status', 'created_at'}, ...], newest first.
+    recent_orders = models.JSONField(default=list)
+
+    @property
+    def orders_count(self):
+        return sum(getattr(self, f'{status}_count') for status in OrderStatus.values)
+
+    @property
+    def awaiting_delivery(self):
+        return self.pending_count + self.paid_count + self.shipped_count
+
+    def get_recent_orders(self):
+        return [
+            {**order, 'created_at': parse_datetime(order['created_at']), 'status': OrderStatus(order['status']).label}
+            for order in self.recent_orders
+        ]
+
+    def __str__(self):
+        return f"Orders of {self.user}"
+
+
 class Service(models.Model):
     title = models.CharField(max_length=200)
     image = models.FileField(upload_to='services/images')
@@ -175,4 +338,33 @@ class Service(models.Model):
     is_active = models.BooleanField(default=True)
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+
+class FacetCount(models.Model):
+    facet = models.CharField(max_length=50)
+    value = models.CharField(max_length=200)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['facet', 'value'], name='unique_facet_value'),
+        ]
+
+    def __str__(self):
+        return f"{self.facet}={self.value}: {self.count}"
+
+
+class RelatedProduct(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_rows')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_to_rows')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_related_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.rank})"
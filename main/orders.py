@@ -0,0 +1,104 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .database import retry_on_locked
+from .models import Order, OrderItem, OrderStatus, OrderSummary, Product
+
+
+# Orders the profile page lists from the summary row.
+RECENT_ORDERS = 4
+
+TRANSITIONS = {
+    OrderStatus.PENDING: {OrderStatus.PAID, OrderStatus.CANCELLED},
+    OrderStatus.PAID: {OrderStatus.SHIPPED, OrderStatus.CANCELLED},
+    OrderStatus.SHIPPED: {OrderStatus.DELIVERED},
+}
+
+
+class OrderError(Exception):
+    pass
+
+
+def status_counter(status):
+    return f'{status}_count'
+
+
+def lock_summary(user_id):
+    summary, created = OrderSummary.objects.select_for_update().get_or_create(user_id=user_id)
+    return summary
+
+
+def update_summary(summary, recent_orders, **changes):
+    """Apply ``changes`` to the summary in one UPDATE; counters move by F() so none is lost."""
+    OrderSummary.objects.filter(pk=summary.pk).update(recent_orders=recent_orders, **changes)
+
+
+@retry_on_locked
+@transaction.atomic
+def place_order(user_id, lines, address=''):
+    """
+    Create a pending order of ``lines``, ``[(product_id, quantity), ...]``,
+    at the products' current prices. Raises ``OrderError`` when a product is
+    missing or inactive, or a quantity is not positive.
+    """
+    lines = [(int(product_id), int(quantity)) for product_id, quantity in lines]
+    if not lines or any(quantity < 1 for product_id, quantity in lines):
+        raise OrderError('An order needs at least one item, each with a positive quantity')
+    products = Product.objects.filter(is_active=True).in_bulk([product_id for product_id, quantity in lines])
+    if len(products) != len({product_id for product_id, quantity in lines}):
+        raise OrderError('Some of the products are no longer available')
+
+    items = [
+        OrderItem(product=products[product_id], title=products[product_id].title, price=products[product_id].price, quantity=quantity)
+        for product_id, quantity in lines
+    ]
+    order = Order.objects.create(
+        user_id=user_id,
+        address=address,
+        total=sum((item.price * item.quantity for item in items), Decimal(0)),
+        item_count=sum(item.quantity for item in items),
+    )
+    for item in items:
+        item.order = order
+    OrderItem.objects.bulk_create(items)
+
+    # The order insert already holds the write lock on SQLite; elsewhere the
+    # row lock keeps two checkouts from dropping each other's recent order.
+    summary = lock_summary(user_id)
+    recent = {'id': order.pk, 'status': order.status, 'created_at': order.created_at.isoformat()}
+    update_summary(
+        summary,
+        [recent, *summary.recent_orders][:RECENT_ORDERS],
+        **{status_counter(order.status): F(status_counter(order.status)) + 1},
+    )
+    return order
+
+
+@retry_on_locked
+@transaction.atomic
+def set_order_status(order, status):
+    """
+    Move ``order`` to ``status`` and the user's summary with it. Raises
+    ``OrderError`` for a transition ``TRANSITIONS`` does not allow, including
+    one another request made first.
+    """
+    if status not in TRANSITIONS.get(order.status, ()):
+        raise OrderError(f'An order cannot go from {order.status} to {status}')
+    updated = Order.objects.filter(pk=order.pk, status=order.status).update(status=status, updated_at=timezone.now())
+    if not updated:
+        raise OrderError(f'Order #{order.pk} is no longer {order.status}')
+
+    changes = {
+        status_counter(order.status): F(status_counter(order.status)) - 1,
+        status_counter(status): F(status_counter(status)) + 1,
+    }
+    if status == OrderStatus.DELIVERED:
+        changes['delivered_items'] = F('delivered_items') + order.item_count
+    summary = lock_summary(order.user_id)
+    recent = [{**entry, 'status': status} if entry['id'] == order.pk else entry for entry in summary.recent_orders]
+    update_summary(summary, recent, **changes)
+    order.status = status
+    return order
@@ -0,0 +1,182 @@
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+CURSOR_SALT = 'main.pagination.cursor'
+
+
+def cursor_ordering(queryset):
+    """
+    Return the queryset ordering as ``[(field, descending), ...]`` ending in
+    the primary key, or ``None`` when it cannot be paginated by keyset
+    (random order, expressions, relations, nullable or annotated columns).
+    """
+    model = queryset.model
+    if queryset.query.extra_order_by:
+        return None
+
+    ordering = []
+    for term in queryset.query.order_by or model._meta.ordering:
+        if not isinstance(term, str) or term == '?':
+            return None
+        descending = term.startswith('-')
+        name = term.lstrip('-')
+        if name == 'pk':
+            name = model._meta.pk.name
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if not field.concrete or field.is_relation or field.null:
+            return None
+        ordering.append((field, descending))
+
+    pk = model._meta.pk
+    if not any(field == pk for field, descending in ordering):
+        ordering.append((pk, ordering[0][1] if ordering else True))
+    return ordering
+
+
+class CursorPage:
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.next_query = ''
+        self.previous_query = ''
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Keyset paginator: every page is a ``WHERE (sort key, id) > cursor LIMIT n``
+    query, so deep pages cost the same as the first one. The total is counted
+    over at most ``count_cap + 1`` rows.
+    """
+
+    def __init__(self, queryset, per_page, ordering, count_cap=1000):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = ordering
+        self.count_cap = count_cap
+
+    @cached_property
+    def order_by(self):
+        return [('-' if descending else '') + field.name for field, descending in self.ordering]
+
+    @cached_property
+    def _capped_count(self):
+        return self.queryset.order_by()[:self.count_cap + 1].count()
+
+    @property
+    def count(self):
+        return min(self._capped_count, self.count_cap)
+
+    @property
+    def count_is_capped(self):
+        return self._capped_count > self.count_cap
+
+    def encode_cursor(self, obj, backwards=False):
+        values = [field.value_to_string(obj) for field, descending in self.ordering]
+        return signing.dumps({'o': self.order_by, 'v': values, 'b': backwards}, salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        # Tampered cursors and cursors issued for another sort order simply
+        # restart from the first page.
+        if not cursor:
+            return None, False
+        try:
+            payload = signing.loads(cursor, salt=CURSOR_SALT)
+            if payload['o'] != self.order_by or len(payload['v']) != len(self.ordering):
+                return None, False
+            values = [field.to_python(value) for (field, descending), value in zip(self.ordering, payload['v'])]
+        except (signing.BadSignature, ValidationError, KeyError, TypeError):
+            return None, False
+        return values, bool(payload.get('b'))
+
+    def keyset_filter(self, values, backwards):
+        condition = Q()
+        equal = {}
+        for (field, descending), value in zip(self.ordering, values):
+            lookup = 'lt' if descending != backwards else 'gt'
+            condition |= Q(**equal, **{f'{field.name}__{lookup}': value})
+            equal[field.name] = value
+        return condition
+
+    def page(self, cursor=None):
+        values, backwards = self.decode_cursor(cursor)
+        order_by = self.order_by
+        if backwards:
+            order_by = [term[1:] if term.startswith('-') else '-' + term for term in order_by]
+
+        queryset = self.queryset.order_by(*order_by)
+        if values is not None:
+            queryset = queryset.filter(self.keyset_filter(values, backwards))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=self.encode_cursor(rows[-1]) if rows and has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], backwards=True) if rows and has_previous else None,
+        )
+
+
+class CursorPaginationMixin:
+    """
+    Opt-in keyset pagination for ListViews. Enabled for the whole view with
+    ``cursor_pagination = True`` or per request by passing ``?cursor=``;
+    orderings that cannot be keyset-paginated fall back to page numbers.
+    """
+    cursor_pagination = False
+    cursor_query_param = 'cursor'
+    count_cap = 1000
+
+    def use_cursor_pagination(self):
+        return self.cursor_pagination or self.cursor_query_param in self.request.GET
+
+    def paginate_queryset(self, queryset, page_size):
+        ordering = cursor_ordering(queryset) if self.use_cursor_pagination() else None
+        if ordering is None:
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = CursorPaginator(queryset, page_size, ordering, count_cap=self.count_cap)
+        page = paginator.page(self.request.GET.get(self.cursor_query_param))
+        page.next_query = self.cursor_query(page.next_cursor)
+        page.previous_query = self.cursor_query(page.previous_cursor)
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def cursor_query(self, cursor):
+        if cursor is None:
+            return ''
+        params = self.request.GET.copy()
+        params.pop(self.page_kwarg, None)
+        params[self.cursor_query_param] = cursor
+        return params.urlencode()
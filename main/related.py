@@ -0,0 +1,228 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.db.models import Count, FloatField, Min
+from django.db.models.functions import Cast
+
+from .cache import bump_version, touch_objects
+from .database import retry_on_locked
+from .models import Product, RelatedProduct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Equal values score their weight; price band and year score by closeness.
+WEIGHTS = {
+    'product_category_id': 4.0,
+    'company': 2.0,
+    'brand': 1.0,
+    'condition': 1.0,
+    'color': 0.5,
+    'size': 0.5,
+}
+PRICE_WEIGHT = 2.0
+YEAR_WEIGHT = 1.0
+# Price bands are powers of two; a product two bands away no longer scores.
+PRICE_BANDS = 2.0
+YEARS = 5.0
+CHUNK_SIZE = 512
+WRITE_BATCH_SIZE = 5000
+COLUMNS = ['id', 'product_category__category_id', *WEIGHTS, 'price_value', 'year']
+
+
+def get_count():
+    return getattr(settings, 'RELATED_PRODUCTS_COUNT', 6)
+
+
+def encode(values):
+    """Integer codes for categorical values; blanks become -1 and never match."""
+    codes = {}
+    return np.fromiter(
+        (-1 if value in (None, '') else codes.setdefault(value, len(codes)) for value in values),
+        dtype=np.int32, count=len(values)
+    )
+
+
+def one_hot(codes, weight):
+    """
+    Columns whose dot product is ``weight`` for equal codes and 0 otherwise,
+    so every categorical match is scored by one matrix product.
+    """
+    matrix = np.zeros((len(codes), int(codes.max(initial=-1)) + 1), dtype=np.float32)
+    known = np.flatnonzero(codes >= 0)
+    matrix[known, codes[known]] = np.sqrt(weight)
+    return matrix
+
+
+class Catalog:
+    """Attributes of the active products of one category as NumPy arrays."""
+
+    def __init__(self, rows):
+        columns = dict(zip(COLUMNS, zip(*rows))) if rows else {column: () for column in COLUMNS}
+        self.ids = np.array(columns['id'], dtype=np.int64)
+        self.features = np.hstack(
+            [np.zeros((len(self.ids), 0), dtype=np.float32)]
+            + [one_hot(encode(columns[name]), weight) for name, weight in WEIGHTS.items()]
+        )
+        prices = np.array(columns['price_value'], dtype=np.float32)
+        self.price_bands = np.log2(np.maximum(prices, 0.01)) / PRICE_BANDS
+        years = np.array([year or 0 for year in columns['year']], dtype=np.float32)
+        self.years = np.where(years > 0, years / YEARS, np.nan).astype(np.float32)
+
+    @classmethod
+    def load(cls, **filters):
+        # Prices are read as floats; building a Decimal per row is slower than the scoring.
+        rows = list(
+            Product.objects.filter(is_active=True, **filters).order_by('pk')
+            .annotate(price_value=Cast('price', FloatField())).values_list(*COLUMNS)
+        )
+        return cls(rows)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def positions(self, ids):
+        return np.flatnonzero(np.isin(self.ids, list(ids)))
+
+    def score(self, positions):
+        """Similarity of the products at ``positions`` to every product, as a len(positions) x len(self) matrix."""
+        scores = self.features[positions] @ self.features.T
+        closeness = np.empty_like(scores)
+        for values, weight in ((self.price_bands, PRICE_WEIGHT), (self.years, YEAR_WEIGHT)):
+            # 1 - distance, floored at 0; unknown years are NaN and score nothing.
+            np.subtract(values[positions][:, None], values[None, :], out=closeness)
+            np.abs(closeness, out=closeness)
+            np.subtract(1, closeness, out=closeness)
+            np.fmax(closeness, 0, out=closeness)
+            closeness *= weight
+            scores += closeness
+        scores[np.arange(len(positions)), positions] = -np.inf
+        return scores
+
+    def neighbours(self, positions, count):
+        """Yield ``(product_id, [(related_id, score), ...])`` with the best ``count`` matches first."""
+        count = min(count, len(self) - 1)
+        for start in range(0, len(positions), CHUNK_SIZE):
+            chunk = positions[start:start + CHUNK_SIZE]
+            if count <= 0:
+                for position in chunk:
+                    yield int(self.ids[position]), []
+                continue
+            scores = self.score(chunk)
+            best = np.argpartition(scores, -count, axis=1)[:, -count:]
+            best_scores = np.take_along_axis(scores, best, axis=1)
+            # Highest score first, the older product first among equals.
+            order = np.lexsort((self.ids[best], -best_scores), axis=1)
+            best = np.take_along_axis(best, order, axis=1)
+            best_scores = np.take_along_axis(best_scores, order, axis=1)
+            for position, related, related_scores in zip(chunk, best, best_scores):
+                yield int(self.ids[position]), [
+                    (int(self.ids[index]), float(score)) for index, score in zip(related, related_scores)
+                ]
+
+
+def related_rows(catalog, positions, count):
+    return [
+        (product_id, related_id, rank, score)
+        for product_id, neighbours in catalog.neighbours(positions, count)
+        for rank, (related_id, score) in enumerate(neighbours)
+    ]
+
+
+def insert_rows(rows):
+    """Insert ``(product_id, related_id, rank, score)`` tuples with one prepared statement."""
+    quote = connection.ops.quote_name
+    fields = [RelatedProduct._meta.get_field(name) for name in ('product', 'related', 'rank', 'score')]
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(RelatedProduct._meta.db_table),
+        ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), WRITE_BATCH_SIZE):
+            cursor.executemany(sql, rows[start:start + WRITE_BATCH_SIZE])
+
+
+@retry_on_locked
+@transaction.atomic
+def replace_related(product_ids, rows):
+    RelatedProduct.objects.filter(product_id__in=product_ids).delete()
+    insert_rows(rows)
+
+
+def category_ids():
+    return (
+        Product.objects.filter(is_active=True).order_by()
+        .values_list('product_category__category_id', flat=True).distinct()
+    )
+
+
+def rebuild_related_products(count=None):
+    """Recompute the neighbours of every active product, one category at a time."""
+    if np is None:
+        raise ImproperlyConfigured('NumPy is required to compute related products')
+    count = count or get_count()
+    timings = {'load_s': 0.0, 'compute_s': 0.0, 'write_s': 0.0}
+    products = rows = 0
+    with transaction.atomic():
+        started = time.perf_counter()
+        RelatedProduct.objects.all().delete()
+        timings['write_s'] += time.perf_counter() - started
+
+        for category_id in list(category_ids()):
+            started = time.perf_counter()
+            catalog = Catalog.load(product_category__category_id=category_id)
+            timings['load_s'] += time.perf_counter() - started
+
+            started = time.perf_counter()
+            related = related_rows(catalog, np.arange(len(catalog)), count)
+            timings['compute_s'] += time.perf_counter() - started
+
+            started = time.perf_counter()
+            insert_rows(related)
+            timings['write_s'] += time.perf_counter() - started
+            products += len(catalog)
+            rows += len(related)
+    bump_version(RelatedProduct)
+    return {'products': products, 'rows': rows, **{key: round(value, 3) for key, value in timings.items()}}
+
+
+def update_related_products(product_ids, count=None):
+    """
+    Recompute the neighbours of the given products after they changed, and
+    of every product whose list they entered or left.
+    """
+    if np is None:
+        return 0
+    count = count or get_count()
+    changed = set(product_ids)
+    affected = changed | set(RelatedProduct.objects.filter(related_id__in=changed).values_list('product_id', flat=True))
+    category_ids = set(
+        Product.objects.filter(pk__in=affected, is_active=True).values_list('product_category__category_id', flat=True)
+    )
+
+    related = []
+    for category_id in category_ids:
+        catalog = Catalog.load(product_category__category_id=category_id)
+        positions = catalog.positions(changed)
+        if len(positions):
+            # Scores are symmetric, so the best score any changed product gets
+            # from a neighbour tells whether it now beats that neighbour's last pick.
+            best = catalog.score(positions).max(axis=0)
+            thresholds = {
+                row['product_id']: row['lowest'] if row['total'] >= count else -np.inf
+                for row in RelatedProduct.objects.filter(product__product_category__category_id=category_id)
+                .values('product_id').annotate(lowest=Min('score'), total=Count('id'))
+            }
+            lowest = np.array([thresholds.get(int(product_id), -np.inf) for product_id in catalog.ids])
+            affected.update(int(product_id) for product_id in catalog.ids[best > lowest])
+        related += related_rows(catalog, catalog.positions(affected), count)
+
+    replace_related(affected, related)
+    touch_objects(*[(Product, product_id) for product_id in affected])
+    return len(affected)
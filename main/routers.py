@@ -0,0 +1,80 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPLICA_SYNCED_KEY = 'main:replica:synced'
+# Sessions are saved on most requests and say nothing about the catalog.
+UNTRACKED_APPS = ('sessions',)
+
+_state = ContextVar('main_database_routing', default=None)
+
+
+class RoutingState:
+    """Where the current request may read from, and whether it has written."""
+
+    def __init__(self, replica=None):
+        self.replica = replica
+        self.wrote = False
+
+
+@contextmanager
+def routing_state():
+    state = RoutingState()
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+def get_replica_alias():
+    """
+    The configured read replica, or ``None`` when it is missing or is the
+    primary itself, as a test mirror is.
+    """
+    alias = getattr(settings, 'DATABASE_READ_REPLICA', None)
+    if not alias or alias not in connections.settings:
+        return None
+    replica = connections[alias].settings_dict
+    if str(replica['NAME']) == str(connections[DEFAULT_DB_ALIAS].settings_dict['NAME']):
+        return None
+    if replica['ENGINE'].endswith('sqlite3') and not os.path.exists(replica['NAME']):
+        return None
+    return alias
+
+
+def reading_from_replica():
+    state = _state.get()
+    return bool(state and state.replica and not state.wrote)
+
+
+class PrimaryReplicaRouter:
+    """
+    Catalog reads made by the storefront views go to the read replica once
+    ``ReplicaRoutingMiddleware`` allows it; every write and every other
+    read goes to the primary. Users, sessions and admin pages always read
+    the primary, so a lagging replica never signs anyone out.
+    """
+    replica_apps = ('main',)
+
+    def db_for_read(self, model, **hints):
+        if reading_from_replica() and model._meta.app_label in self.replica_apps:
+            return _state.get().replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None and model._meta.app_label not in UNTRACKED_APPS:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets the primary's schema along with its data.
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,131 @@
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+
+DEFAULT_SEARCH_BACKEND = 'main.search.SQLiteFTSBackend'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class BaseSearchBackend:
+    """Interface every product search backend implements."""
+
+    def index(self, products):
+        raise NotImplementedError
+
+    def remove(self, product_ids):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def search(self, queryset, query):
+        """Filter ``queryset`` by ``query`` and order it by relevance."""
+        raise NotImplementedError
+
+    def rebuild(self, batch_size=1000):
+        from .models import Product
+
+        self.clear()
+        batch = []
+        total = 0
+        for product in Product.objects.only('id', 'title', 'desc', 'brand', 'company').iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) >= batch_size:
+                self.index(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            self.index(batch)
+            total += len(batch)
+        return total
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """Plain ``icontains`` lookups, for databases without a full-text index."""
+
+    def index(self, products):
+        pass
+
+    def remove(self, product_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def search(self, queryset, query):
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(desc__icontains=query) |
+            Q(brand__icontains=query) |
+            Q(company__icontains=query)
+        )
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """Inverted index stored in an FTS5 virtual table, keyed by product id."""
+
+    table = 'main_product_fts'
+    # bm25() column weights: title, description, brand, company
+    weights = (10.0, 1.0, 4.0, 4.0)
+
+    def index(self, products):
+        rows = [
+            (product.pk, product.title, product.desc, product.brand, product.company)
+            for product in products
+        ]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, title, description, brand, company) VALUES (%s, %s, %s, %s, %s)',
+                rows
+            )
+
+    def remove(self, product_ids):
+        product_ids = [(pk,) for pk in product_ids]
+        if not product_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', product_ids)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    def build_match(self, query):
+        # Every word has to match as a prefix, so results show up while
+        # the user is still typing.
+        tokens = TOKEN_RE.findall(query.lower())
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def search(self, queryset, query):
+        match = self.build_match(query)
+        if not match:
+            return queryset.none()
+
+        # Joining the virtual table lets SQLite drive the query from the
+        # index and compute bm25() once per matching row.
+        product_table = queryset.model._meta.db_table
+        weights = ', '.join(str(weight) for weight in self.weights)
+        return queryset.extra(
+            tables=[self.table],
+            where=[f'{self.table}.rowid = "{product_table}"."id"', f'{self.table} MATCH %s'],
+            params=[match],
+            select={'search_rank': f'bm25({self.table}, {weights})'},
+        ).order_by('search_rank', '-id')
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    return import_string(getattr(settings, 'SEARCH_BACKEND', DEFAULT_SEARCH_BACKEND))()
+
+
+def search_products(queryset, query):
+    return get_backend().search(queryset, query)
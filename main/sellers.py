@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .database import retry_on_locked
+from .models import Product, SellerSummary, WishlistItem
+
+
+SUMMARY_FIELDS = (
+    'product_count', 'active_count', 'stock_total', 'stock_value', 'low_stock_count', 'view_count', 'wishlist_count',
+    'refreshed_at',
+)
+
+
+class ViewCounter:
+    """
+    Counts product page views in memory and adds them to
+    ``Product.view_count`` at most every ``PRODUCT_VIEW_FLUSH_INTERVAL``
+    seconds, one UPDATE per distinct count, so browsing does not write a
+    row per request. Views counted since the last flush die with the process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.flushed_at = time.monotonic()
+
+    def add(self, product_id):
+        """Count one view; returns the pending counts once they are due to be written."""
+        interval = getattr(settings, 'PRODUCT_VIEW_FLUSH_INTERVAL', 10)
+        with self.lock:
+            self.counts[product_id] += 1
+            if time.monotonic() - self.flushed_at < interval:
+                return None
+            counts, self.counts = self.counts, Counter()
+            self.flushed_at = time.monotonic()
+        return counts
+
+    def flush(self, counts=None):
+        if counts is None:
+            with self.lock:
+                counts, self.counts = self.counts, Counter()
+                self.flushed_at = time.monotonic()
+        groups = defaultdict(list)
+        for product_id, count in counts.items():
+            groups[count].append(product_id)
+        # Straight to the primary rather than through the router, which would
+        # pin the visitor whose view happened to flush the batch to it.
+        products = Product.objects.using(DEFAULT_DB_ALIAS)
+        for count, product_ids in groups.items():
+            retry_on_locked(products.filter(pk__in=product_ids).update)(view_count=F('view_count') + count)
+
+
+product_views = ViewCounter()
+
+
+def low_stock_threshold():
+    return getattr(settings, 'SELLER_LOW_STOCK', 5)
+
+
+def seller_totals(products):
+    """Every figure of the summary but the wishlists, one row per seller."""
+    return products.values('seller').annotate(
+        product_count=Count('pk'),
+        active_count=Count('pk', filter=Q(is_active=True)),
+        stock_total=Coalesce(Sum('quantity'), 0),
+        stock_value=Coalesce(
+            Sum(F('price') * F('quantity'), output_field=DecimalField(max_digits=16, decimal_places=2)),
+            Value(Decimal(0)),
+        ),
+        low_stock_count=Count('pk', filter=Q(is_active=True, quantity__lte=low_stock_threshold())),
+        view_count=Coalesce(Sum('view_count'), 0),
+    )
+
+
+@retry_on_locked
+def store_summaries(summaries):
+    SellerSummary.objects.bulk_create(
+        summaries, update_conflicts=True, unique_fields=['user'], update_fields=SUMMARY_FIELDS, batch_size=500
+    )
+
+
+def refresh_seller_summaries(seller_ids=None):
+    """
+    Recompute the summaries of ``seller_ids``, or of every seller, with two
+    grouped aggregate queries whatever the number of sellers and listings.
+    Returns the number of summaries written.
+    """
+    products = Product.objects.filter(seller__isnull=False).order_by()
+    wishlists = WishlistItem.objects.filter(product__seller__isnull=False).order_by()
+    if seller_ids is None:
+        sellers = set(get_user_model().objects.filter(status='seller').values_list('pk', flat=True))
+    else:
+        sellers = set(seller_ids)
+        products = products.filter(seller__in=sellers)
+        wishlists = wishlists.filter(product__seller__in=sellers)
+
+    totals = {row.pop('seller'): row for row in seller_totals(products)}
+    wishlisted = dict(wishlists.values('product__seller').annotate(total=Count('pk')).values_list('product__seller', 'total'))
+    now = timezone.now()
+    summaries = [
+        SellerSummary(user_id=seller_id, refreshed_at=now, wishlist_count=wishlisted.get(seller_id, 0), **totals.get(seller_id, {}))
+        for seller_id in sellers | totals.keys()
+    ]
+    store_summaries(summaries)
+    return len(summaries)
+
+
+def get_seller_summary(user):
+    """The seller's stored summary, refreshed first when missing or older than ``SELLER_SUMMARY_MAX_AGE`` seconds."""
+    max_age = timedelta(seconds=getattr(settings, 'SELLER_SUMMARY_MAX_AGE', 60 * 5))
+    summary = SellerSummary.objects.filter(user=user).first()
+    if summary is None or summary.refreshed_at < timezone.now() - max_age:
+        refresh_seller_summaries([user.pk])
+        summary = SellerSummary.objects.get(user=user)
+    return summary
+
+
+def low_stock_products(user, limit=10):
+    return list(
+        Product.objects.filter(seller=user, is_active=True, quantity__lte=low_stock_threshold())
+        .order_by('quantity', 'id')[:limit]
+    )
+
+
+def counted_product_wishlists():
+    counts = (
+        WishlistItem.objects.filter(product=OuterRef('pk')).order_by()
+        .values('product').annotate(total=Count('pk')).values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
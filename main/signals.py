@@ -0,0 +1,189 @@
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .cache import bump_version, touch_objects
+from .counters import apply_counter_deltas, move_product_category, product_counter_keys
+from .database import configure_connection, stats
+from .facets import FACET_FIELDS, apply_facet_deltas, product_facet_keys
+from .images import schedule_derivatives
+from .models import Category, ProductCategory, Country, Product, ProductImage, RelatedProduct, Service, WishlistItem
+from .related import update_related_products
+from .wishlist import recount_wishlists
+from .search import get_backend
+
+
+FACET_COLUMNS = ['is_active', 'price', *FACET_FIELDS.values()]
+
+
+@receiver(connection_created)
+def setup_connection(sender, connection, **kwargs):
+    configure_connection(connection)
+
+
+@receiver(request_started)
+def count_request(sender, **kwargs):
+    stats.add('requests')
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    get_backend().index([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_backend().remove([instance.pk])
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_facets(sender, instance, **kwargs):
+    previous = None
+    if instance.pk:
+        previous = Product.objects.filter(pk=instance.pk).values(*FACET_COLUMNS, 'product_category__category_id').first()
+    instance._facet_keys = product_facet_keys(previous or {})
+    instance._counter_keys = product_counter_keys(previous or {})
+    instance._previous_pages = product_pages(previous) if previous else []
+
+
+@receiver(post_save, sender=Product)
+def update_facet_counts(sender, instance, **kwargs):
+    after = product_facet_keys({column: getattr(instance, column) for column in FACET_COLUMNS})
+    apply_facet_deltas(getattr(instance, '_facet_keys', set()), after)
+    instance._facet_keys = after
+
+
+@receiver(post_delete, sender=Product)
+def remove_facet_counts(sender, instance, **kwargs):
+    before = getattr(instance, '_facet_keys', None)
+    if before is None:
+        before = product_facet_keys({column: getattr(instance, column) for column in FACET_COLUMNS})
+    apply_facet_deltas(before, set())
+
+
+def category_id_of(product):
+    if Product.product_category.is_cached(product):
+        return product.product_category.category_id
+    return ProductCategory.objects.filter(pk=product.product_category_id).values_list('category_id', flat=True).first()
+
+
+def current_counter_keys(product):
+    return product_counter_keys({
+        'is_active': product.is_active,
+        'product_category_id': product.product_category_id,
+        'product_category__category_id': category_id_of(product),
+    })
+
+
+@receiver(post_save, sender=Product)
+def update_product_counters(sender, instance, **kwargs):
+    after = current_counter_keys(instance)
+    apply_counter_deltas(getattr(instance, '_counter_keys', set()), after)
+    instance._counter_keys = after
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_counters(sender, instance, **kwargs):
+    before = getattr(instance, '_counter_keys', None)
+    if before is None:
+        before = current_counter_keys(instance)
+    apply_counter_deltas(before, set())
+
+
+@receiver(pre_save, sender=ProductCategory)
+def remember_parent_category(sender, instance, **kwargs):
+    instance._previous_parent = None
+    if instance.pk:
+        instance._previous_parent = ProductCategory.objects.filter(pk=instance.pk).values('category_id', 'product_count').first()
+
+
+@receiver(post_save, sender=ProductCategory)
+def move_category_counters(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_parent', None)
+    if previous:
+        move_product_category(previous['category_id'], instance.category_id, previous['product_count'])
+
+
+def bump_cache_version(sender, **kwargs):
+    # Bumped again after commit, in case another request cached the old rows
+    # under the new version in between.
+    bump_version(sender)
+    transaction.on_commit(lambda: bump_version(sender))
+
+
+for model in (Category, ProductCategory, Country, Product, Service):
+    post_save.connect(bump_cache_version, sender=model, dispatch_uid=f'bump_cache_version_save_{model.__name__}')
+    post_delete.connect(bump_cache_version, sender=model, dispatch_uid=f'bump_cache_version_delete_{model.__name__}')
+
+
+IMAGE_FIELDS = {Product: 'main_image', ProductImage: 'image', Category: 'image', Country: 'icon'}
+
+
+def create_image_derivatives(sender, instance, **kwargs):
+    schedule_derivatives(getattr(instance, IMAGE_FIELDS[sender]).name)
+
+
+for model in IMAGE_FIELDS:
+    post_save.connect(create_image_derivatives, sender=model, dispatch_uid=f'create_image_derivatives_{model.__name__}')
+
+
+def product_pages(values):
+    """The category pages a product is listed on, and thus whose validators it affects."""
+    return [(ProductCategory, values['product_category_id']), (Category, values['product_category__category_id'])]
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def touch_product_pages(sender, instance, **kwargs):
+    category_id = category_id_of(instance)
+    pages = product_pages({'product_category_id': instance.product_category_id, 'product_category__category_id': category_id})
+    objects = [(Product, instance.pk), *pages, *getattr(instance, '_previous_pages', [])]
+    # Touched again after commit, in case a reader took the old content
+    # with the new stamp in between.
+    touch_objects(*objects)
+    transaction.on_commit(lambda: touch_objects(*objects))
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_image_product(sender, instance, **kwargs):
+    product_id = instance.product_id
+    touch_objects((Product, product_id))
+    transaction.on_commit(lambda: touch_objects((Product, product_id)))
+
+
+def updates_related_products():
+    return getattr(settings, 'RELATED_PRODUCTS_UPDATE_ON_SAVE', True)
+
+
+@receiver(post_save, sender=Product)
+def refresh_related_products(sender, instance, **kwargs):
+    if updates_related_products():
+        transaction.on_commit(lambda: update_related_products([instance.pk]))
+
+
+@receiver(pre_delete, sender=Product)
+def remember_related_to(sender, instance, **kwargs):
+    # The rows pointing at the product are gone by post_delete.
+    instance._related_to = list(RelatedProduct.objects.filter(related=instance).values_list('product_id', flat=True))
+
+
+@receiver(post_delete, sender=Product)
+def replace_deleted_related(sender, instance, **kwargs):
+    product_ids = getattr(instance, '_related_to', [])
+    if product_ids and updates_related_products():
+        transaction.on_commit(lambda: update_related_products(product_ids))
+
+
+@receiver(pre_delete, sender=Product)
+def remember_wishlisted_by(sender, instance, **kwargs):
+    # The wishlist rows go with the product, without signals of their own.
+    instance._wishlisted_by = list(WishlistItem.objects.filter(product=instance).values_list('user_id', flat=True))
+
+
+@receiver(post_delete, sender=Product)
+def recount_deleted_wishlists(sender, instance, **kwargs):
+    recount_wishlists(getattr(instance, '_wishlisted_by', []))
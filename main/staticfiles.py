@@ -0,0 +1,171 @@
+import fnmatch
+import gzip
+import json
+import re
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico', '.ttf', '.otf', '.eot')
+MIN_COMPRESS_SIZE = 512
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+REPORT_NAME = 'build-report.json'
+
+TOKEN_RE = re.compile(r'[A-Za-z0-9_-]+')
+# class="alert-{{ message.tags }}" means any class starting with "alert-" may be used.
+DYNAMIC_PREFIX_RE = re.compile(r'([A-Za-z0-9_-]+-)\{[{%]')
+COMMENT_RE = re.compile(r'/\*.*?\*/', re.DOTALL)
+NOT_RE = re.compile(r':not\([^)]*\)|\[[^\]]*\]')
+NAME_RE = re.compile(r'[.#](-?[A-Za-z_][A-Za-z0-9_-]*)')
+# At-rules whose blocks hold ordinary rules; every other block is kept as is.
+NESTED_AT_RULES = ('@media', '@supports', '@document')
+
+
+def is_hashed(name):
+    return bool(HASHED_NAME_RE.search(name))
+
+
+def source_files():
+    """Templates, scripts and Python modules that may mention a CSS class."""
+    directories = [Path(directory) for engine in settings.TEMPLATES for directory in engine.get('DIRS', [])]
+    for label in ('main', 'accounts'):
+        app_path = Path(apps.get_app_config(label).path)
+        directories += [app_path / 'templates', app_path]
+    for directory in directories:
+        for pattern in ('**/*.html', '*.py'):
+            yield from directory.glob(pattern)
+    for directory in settings.STATICFILES_DIRS:
+        yield from Path(directory).glob('**/*.js')
+
+
+def used_names():
+    tokens, prefixes = set(), set(getattr(settings, 'STATIC_PURGE_SAFELIST', ()))
+    for path in source_files():
+        text = path.read_text(encoding='utf-8', errors='ignore')
+        tokens.update(TOKEN_RE.findall(text))
+        prefixes.update(DYNAMIC_PREFIX_RE.findall(text))
+    return tokens, tuple(prefixes)
+
+
+def selector_is_used(selector, tokens, prefixes):
+    for name in NAME_RE.findall(NOT_RE.sub('', selector)):
+        if name not in tokens and not name.startswith(prefixes):
+            return False
+    return True
+
+
+def split_blocks(css):
+    """Yield ``(prelude, body)`` for every top level block and ``(statement, None)`` for the rest."""
+    position, length = 0, len(css)
+    while position < length:
+        brace = css.find('{', position)
+        semicolon = css.find(';', position)
+        if brace == -1:
+            rest = css[position:].strip()
+            if rest:
+                yield rest, None
+            return
+        if semicolon != -1 and semicolon < brace and css[position:semicolon].strip().startswith('@'):
+            yield css[position:semicolon + 1].strip(), None
+            position = semicolon + 1
+            continue
+        depth, end = 1, brace + 1
+        while depth and end < length:
+            if css[end] == '{':
+                depth += 1
+            elif css[end] == '}':
+                depth -= 1
+            end += 1
+        yield css[position:brace].strip(), css[brace + 1:end - 1]
+        position = end
+
+
+def purge_css(css, tokens, prefixes):
+    """Drop selectors that name a class or id no template or script uses."""
+    output = []
+    for prelude, body in split_blocks(COMMENT_RE.sub('', css)):
+        if body is None:
+            output.append(prelude)
+        elif prelude.startswith(NESTED_AT_RULES):
+            inner = purge_css(body, tokens, prefixes)
+            if inner:
+                output.append(f'{prelude}{{{inner}}}')
+        elif prelude.startswith('@'):
+            output.append(f'{prelude}{{{body}}}')
+        else:
+            selectors = [selector.strip() for selector in prelude.split(',')]
+            kept = [selector for selector in selectors if selector_is_used(selector, tokens, prefixes)]
+            if kept:
+                output.append(f'{",".join(kept)}{{{body.strip()}}}')
+    return '\n'.join(output)
+
+
+class StorefrontStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage that purges unused CSS before hashing and writes gzip
+    and brotli siblings of every hashed file, for ``StaticFilesMiddleware``
+    to serve. Until ``collectstatic`` has run, URLs use the plain names.
+    """
+    purge_patterns = ('css/*.css',)
+    # bootstrap.bundle.min.js points at a source map that isn't shipped, which
+    # would fail the build, so only CSS references are rewritten.
+    patterns = tuple(pattern for pattern in ManifestStaticFilesStorage.patterns if pattern[0] == '*.css')
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            yield from super().post_process(paths, dry_run, **options)
+            return
+
+        report = {'purged': {}, 'gzip': [0, 0], 'brotli': [0, 0]}
+        tokens, prefixes = used_names()
+        for name in list(paths):
+            if any(fnmatch.fnmatch(name, pattern) for pattern in self.purge_patterns):
+                storage, path = paths[name]
+                with storage.open(path) as source:
+                    original = source.read().decode('utf-8')
+                purged = purge_css(original, tokens, prefixes)
+                self.delete(name)
+                self._save(name, ContentFile(purged.encode('utf-8')))
+                paths[name] = (self, name)
+                report['purged'][name] = [len(original.encode('utf-8')), len(purged.encode('utf-8'))]
+
+        yield from super().post_process(paths, dry_run, **options)
+
+        for hashed_name in set(self.hashed_files.values()):
+            if hashed_name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.compress(hashed_name, report)
+        report['files'] = len(self.hashed_files)
+        self.delete(REPORT_NAME)
+        self._save(REPORT_NAME, ContentFile(json.dumps(report, indent=2).encode('utf-8')))
+
+    def compress(self, name, report):
+        with self.open(name) as source:
+            content = source.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+        variants = [('gzip', '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('brotli', '.br', lambda data: brotli.compress(data, quality=11)))
+        for encoding, suffix, compress in variants:
+            compressed = compress(content)
+            if len(compressed) >= len(content):
+                continue
+            self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(compressed))
+            report[encoding][0] += len(content)
+            report[encoding][1] += len(compressed)
@@ -0,0 +1,44 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from main.images import derivative_url, fallback_format, get_widths, has_derivatives
+
+
+register = template.Library()
+
+
+def srcset(name, format):
+    return ', '.join(f'{derivative_url(name, width, format)} {width}w' for width in get_widths())
+
+
+@register.simple_tag
+def image_url(file, width):
+    """URL of the smallest derivative at least ``width`` pixels wide, or of the original."""
+    if not file:
+        return ''
+    if not has_derivatives(file.name):
+        return file.url
+    width = next((size for size in get_widths() if size >= int(width)), get_widths()[-1])
+    return derivative_url(file.name, width, fallback_format(file.name))
+
+
+@register.simple_tag
+def responsive_image(file, sizes='100vw', **attributes):
+    """
+    ``<picture>`` with WebP and fallback ``srcset`` lists, so the browser
+    downloads the smallest variant that fills ``sizes``. Falls back to a
+    plain ``<img>`` of the original until derivatives are generated.
+    """
+    if not file:
+        return ''
+    attributes.setdefault('loading', 'lazy')
+    extra = format_html_join('', ' {}="{}"', ((key.replace('_', '-'), value) for key, value in attributes.items()))
+    if not has_derivatives(file.name):
+        return format_html('<img src="{}"{}>', file.url, extra)
+
+    fallback = fallback_format(file.name)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}"><img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        srcset(file.name, 'webp'), sizes,
+        derivative_url(file.name, get_widths()[0], fallback), srcset(file.name, fallback), sizes, extra,
+    )
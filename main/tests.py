@@ -1,3 +1,1326 @@
-from django.test import TestCase
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.db import OperationalError, close_old_connections, connection, connections, transaction
+from django.db.models import Q
+from django.http import QueryDict
+from django.template import Context, Template
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from .catalog import CatalogImporter, export_products, read_rows
+from .counters import reconcile_product_counts
+from .inventory import OutOfStock, ReservationExpired, confirm, release, release_expired, reserve
+from .orders import OrderError, place_order, set_order_status
+from .database import retry_on_locked, stats as connection_stats
+from .facets import facet_counts, facet_options, rebuild_facet_counts
+from .related import rebuild_related_products, update_related_products
+from .sellers import ViewCounter, refresh_seller_summaries
+from .routers import PrimaryReplicaRouter, get_replica_alias, routing_state
+from .slugs import SlugAllocator
+from .search import get_backend, search_products
+from .sorting import SORT_ORDERS, rating_score
+from . import images
+from .staticfiles import purge_css
+from .metrics import QueryBudgetExceeded, store as metrics_store
+from .cache import get_object_versions, get_versions, touch_objects
+from .views import CategoryDetailView, IndexView, ProductDetailView, ProductListView, SearchView
+from .models import (
+    Category, ProductCategory, Country, Product, ProductImage, RelatedProduct, Service, WishlistItem, Order, OrderStatus,
+    OrderSummary, FacetCount, SellerSummary, StockReservation,
+)
+
+
+def create_catalog(categories=2, product_categories=3, products=4):
+    country = Country.objects.create(name='Uzbekistan', icon='country/icons/uz.png')
+    Service.objects.create(title='Delivery', image='services/images/delivery.png', desc='Fast delivery')
+    for category_number in range(categories):
+        category = Category.objects.create(
+            name=f'Category {category_number}', image='category/image/c.png', description='Category'
+        )
+        for product_category_number in range(product_categories):
+            product_category = ProductCategory.objects.create(
+                name=f'Product category {category_number}-{product_category_number}', category=category
+            )
+            for number in range(products):
+                product = Product.objects.create(
+                    title=f'Phone {category_number}-{product_category_number}-{number}',
+                    desc='Smart phone with a large screen',
+                    main_image='products/main_images/p.png',
+                    price=100 + number,
+                    country=country,
+                    product_category=product_category,
+                    delivery_time='3 days',
+                    company='apple',
+                    size='m',
+                    condition='new',
+                    recommended=number % 2 == 0,
+                    verified=number % 3 == 0,
+                )
+                ProductImage.objects.create(image='products/images/p.png', product=product)
+
+
+class SearchBackendTests(TestCase):
+
+    def setUp(self):
+        create_catalog(categories=1, product_categories=1, products=2)
+        self.product_category = ProductCategory.objects.get()
+
+    def create(self, title, desc='Plain description', **fields):
+        return Product.objects.create(
+            title=title, desc=desc, main_image='products/main_images/p.png', price=10,
+            product_category=self.product_category, delivery_time='3 days', **fields
+        )
+
+    def search(self, query):
+        return list(search_products(Product.objects.all(), query))
+
+    def test_words_match_as_prefixes(self):
+        watch = self.create('Smartwatch Ultra')
+        self.assertEqual(self.search('smartw'), [watch])
+        self.assertEqual(self.search('ULTRA smart'), [watch])
+        self.assertEqual(self.search('ultras'), [])
+
+    def test_title_matches_rank_above_description_matches(self):
+        described = self.create('Charger', desc='Works with every tablet')
+        titled = self.create('Tablet stand')
+        self.assertEqual(self.search('tablet'), [titled, described])
+
+    def test_index_follows_saves_and_deletes(self):
+        product = self.create('Keyboard')
+        product.title = 'Mouse'
+        product.save()
+        self.assertEqual(self.search('keyboard'), [])
+        self.assertEqual(self.search('mouse'), [product])
+        product.delete()
+        self.assertEqual(self.search('mouse'), [])
+
+    def test_rebuild_restores_a_cleared_index(self):
+        product = self.create('Headphones')
+        get_backend().clear()
+        self.assertEqual(self.search('headphones'), [])
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(self.search('headphones'), [product])
+        self.assertEqual(len(self.search('phone')), 2)
+
+    def test_queries_without_words_match_nothing(self):
+        for query in ('', '   ', '"*()-:^', '!!! ???'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), [])
+
+
+class CursorPaginationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        create_catalog(categories=1, product_categories=3, products=10)
+        # Spread the sort keys out, with ties, so every order has pages to walk.
+        for number, product in enumerate(Product.objects.order_by('pk')):
+            product.star, product.review, product.dicount = number % 4, number % 5, number % 3 * 10
+            product.save()
+        self.url = reverse('main:product_list')
+
+    def get(self, query):
+        response = self.client.get(f'{self.url}?{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    def ids(self, context):
+        return [product.pk for product in context['products']]
+
+    def test_next_and_previous_round_trip_for_every_sort(self):
+        for sort, ordering in SORT_ORDERS.items():
+            with self.subTest(sort=sort):
+                expected = list(Product.objects.filter(is_active=True).order_by(*ordering).values_list('pk', flat=True))
+                context = self.get(f'sort={sort}&cursor=')
+                self.assertFalse(context['page_obj'].has_previous())
+                pages = [self.ids(context)]
+                while context['page_obj'].has_next():
+                    context = self.get(context['page_obj'].next_query)
+                    pages.append(self.ids(context))
+                self.assertEqual([pk for page in pages for pk in page], expected)
+                self.assertEqual(len(pages), 3)
+
+                for page in reversed(pages[:-1]):
+                    context = self.get(context['page_obj'].previous_query)
+                    self.assertEqual(self.ids(context), page)
+                self.assertFalse(context['page_obj'].has_previous())
+
+    def test_tampered_and_foreign_cursors_restart_from_the_first_page(self):
+        first_page = self.ids(self.get('sort=-price&cursor='))
+        self.assertEqual(self.ids(self.get('sort=-price&cursor=garbage')), first_page)
+        price_cursor = self.get('sort=price&cursor=')['page_obj'].next_cursor
+        self.assertEqual(self.ids(self.get(f'sort=-price&cursor={price_cursor}')), first_page)
+
+    def test_next_query_keeps_the_filters(self):
+        country = Country.objects.get()
+        context = self.get(f'country={country.pk}&sort=price&page=2&cursor=')
+        params = QueryDict(context['page_obj'].next_query)
+        self.assertEqual((params['country'], params['sort']), (str(country.pk), 'price'))
+        self.assertNotIn('page', params)
+        self.assertTrue(params['cursor'])
+
+    def test_capped_counts_are_shown_with_a_plus(self):
+        with mock.patch.object(ProductListView, 'count_cap', 20):
+            response = self.client.get(self.url + '?cursor=')
+        self.assertTrue(response.context['page_obj'].paginator.count_is_capped)
+        self.assertContains(response, '20+ Items found')
+        response = self.client.get(self.url + '?cursor=')
+        self.assertContains(response, '30 Items found')
+
+    def test_search_rank_order_falls_back_to_page_numbers(self):
+        context = self.get('search=phone&cursor=')
+        self.assertFalse(getattr(context['page_obj'], 'is_cursor', False))
+        self.assertEqual(context['paginator'].count, 30)
+        self.assertEqual(len(self.ids(self.get('search=phone&page=3'))), 6)
+
+
+class FacetCountTests(TestCase):
+
+    def setUp(self):
+        create_catalog(categories=1, product_categories=2, products=4)
+        for number, product in enumerate(Product.objects.order_by('pk')):
+            product.condition = 'used' if number % 2 else 'new'
+            product.company = 'samsung' if number < 3 else 'apple'
+            product.save()
+
+    def stored(self):
+        return sorted(FacetCount.objects.filter(count__gt=0).values_list('facet', 'value', 'count'))
+
+    def rebuilt(self):
+        rebuild_facet_counts()
+        return self.stored()
+
+    def test_each_facet_leaves_out_its_own_selection(self):
+        options = facet_options(ProductCategory.objects.all(), Country.objects.all())
+        selected = {'condition': Q(condition='used'), 'company': Q(company='samsung')}
+        active = Product.objects.filter(is_active=True)
+        with self.assertNumQueries(1):
+            counts = facet_counts(active, options, selected)
+        counts = {facet: {item.value: item.count for item in values} for facet, values in counts.items()}
+
+        for condition in ('new', 'used'):
+            self.assertEqual(counts['condition'][condition], active.filter(company='samsung', condition=condition).count())
+        for company in ('apple', 'samsung'):
+            self.assertEqual(counts['company'][company], active.filter(condition='used', company=company).count())
+        self.assertEqual((counts['condition']['new'], counts['company']['apple']), (2, 3))
+        self.assertEqual(counts['size']['m'], active.filter(*selected.values()).count())
+
+    def test_stored_counts_follow_create_change_deactivate_and_delete(self):
+        expected = self.stored()
+        self.assertEqual(self.rebuilt(), expected)
+        other_category = ProductCategory.objects.order_by('pk').last()
+
+        product = Product.objects.create(
+            title='Tablet', desc='Tablet', main_image='products/main_images/p.png', price=10, condition='used',
+            product_category=other_category, delivery_time='3 days', company='xiaomi', color='red', verified=True,
+        )
+        expected = self.stored()
+        self.assertIn(('company', 'xiaomi', 1), expected)
+        self.assertEqual(self.rebuilt(), expected)
+
+        product = Product.objects.order_by('pk').first()
+        product.company, product.color, product.country = 'xiaomi', 'red', None
+        product.product_category = other_category
+        product.save()
+        expected = self.stored()
+        self.assertIn(('company', 'xiaomi', 2), expected)
+        self.assertEqual(self.rebuilt(), expected)
+
+        product.is_active = False
+        product.save()
+        expected = self.stored()
+        self.assertIn(('company', 'xiaomi', 1), expected)
+        self.assertEqual(self.rebuilt(), expected)
+
+        product.is_active = True
+        product.save()
+        Product.objects.get(title='Tablet').delete()
+        expected = self.stored()
+        self.assertIn(('color', 'red', 1), expected)
+        self.assertEqual(self.rebuilt(), expected)
+
+    def test_price_ranges_are_counted_in_both_paths(self):
+        product = Product.objects.order_by('pk').first()
+        product.price = 30
+        product.save()
+        expected = self.stored()
+        self.assertIn(('price', '0', 1), expected)
+        self.assertIn(('price', '100', 7), expected)
+        self.assertEqual(self.rebuilt(), expected)
+
+        response = self.client.get(reverse('main:product_list') + '?condition=used&min_price=100&max_price=249.99')
+        counts = {facet: {item.value: item.count for item in values} for facet, values in response.context['facets'].items()}
+        self.assertEqual(counts['price']['min_price=0&max_price=49.99'], 0)
+        self.assertEqual(counts['price']['min_price=100&max_price=249.99'], 4)
+        self.assertEqual((counts['condition']['new'], counts['condition']['used']), (3, 4))
+        self.assertEqual(len(response.context['products']), 4)
+        self.assertContains(response, 'href="?min_price=100&amp;max_price=249.99"')
+
+
+class QueryPlanTests(TestCase):
+    """
+    Runs EXPLAIN QUERY PLAN on every query the storefront views issue and
+    fails when one of them scans the product tables, even through an index,
+    or sorts in a temporary B-tree, unless the page lists that step as
+    accepted. Category, country and service tables are tiny lookup lists
+    and are expected to be scanned.
+    """
+    indexed_tables = ('main_product', 'main_productimage', 'main_relatedproduct')
+
+    # An unfiltered page walks the index of its sort order and stops after one page.
+    sort_walk = r'SCAN main_product USING INDEX product_active_\w+_idx'
+    # The total of an unfiltered listing counts every active product; the
+    # covering index keeps it off the wide rows.
+    count_all = r'SCAN main_product USING COVERING INDEX product_active_facets_idx'
+    # Partial indexes hold exactly the recommended or verified products listed.
+    partial_index = r'SCAN main_product USING (COVERING )?INDEX product_(recommended|verified)_idx'
+    # Search results come in bm25 order and a price range in any order but
+    # price has to be sorted; no index holds either order for the matches.
+    temp_sort = r'USE TEMP B-TREE FOR ORDER BY'
+
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog()
+        cls.category = Category.objects.first()
+        cls.product_category = ProductCategory.objects.first()
+        cls.product = Product.objects.first()
+        cls.country = Country.objects.first()
+
+    def setUp(self):
+        cache.clear()
+        rebuild_related_products()
+
+    def storefront_urls(self):
+        """``(url, accepted)`` pairs, ``accepted`` being the plan steps the page may take."""
+        products = reverse('main:product_list')
+        large = reverse('main:product_list_large')
+        return [
+            # The showcase keeps the newest products of each category with a
+            # window function over the category index, then sorts those few.
+            (reverse('main:home'), (self.sort_walk, self.partial_index, self.temp_sort)),
+            (reverse('main:category_list'), ()),
+            (reverse('main:category_detail', args=[self.category.slug]), ()),
+            (reverse('main:product_detail', args=[self.product.slug]), ()),
+            (reverse('main:content'), ()),
+            (reverse('main:search'), (self.sort_walk, self.count_all)),
+            (reverse('main:search') + '?q=phone', (self.temp_sort,)),
+            (products, (self.sort_walk, self.count_all)),
+            (products + '?sort=price', (self.sort_walk, self.count_all)),
+            (products + '?sort=-price', (self.sort_walk, self.count_all)),
+            (products + f'?category={self.product_category.slug}', ()),
+            (products + f'?country={self.country.id}', ()),
+            (products + '?condition=new', ()),
+            (products + '?verified=true', (self.partial_index,)),
+            (products + '?min_price=100&max_price=102', (self.temp_sort,)),
+            (products + '?search=phone', (self.temp_sort,)),
+            (products + '?cursor=', (self.sort_walk, self.count_all)),
+            (large + '?company=apple', ()),
+            # A filter in an order other than newest either walks the sort
+            # index or sorts the matches; an index per pair is not worth the writes.
+            (large + '?size=m&sort=price', (self.sort_walk, self.temp_sort)),
+        ]
+
+    def unindexed_steps(self, sql, accepted=()):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = [row[3] for row in cursor.fetchall()]
+        if ' FILTER (WHERE ' in sql:
+            # The facet aggregate counts every value of the listing in one
+            # pass, which reads all of its products by design.
+            accepted = (*accepted, self.count_all)
+        return [
+            step for step in plan
+            if (
+                any(re.match(rf'SCAN {table}\b', step) for table in self.indexed_tables)
+                or step.startswith('USE TEMP B-TREE') and 'FROM "main_product"' in sql
+            )
+            and not any(re.fullmatch(pattern, step) for pattern in accepted)
+        ]
+
+    def test_every_sort_order_reads_an_index(self):
+        for sort in SORT_ORDERS:
+            for query in ('', '&cursor='):
+                url = reverse('main:product_list') + f'?sort={sort}{query}'
+                with self.subTest(url=url), CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                ordered = [query['sql'] for query in queries.captured_queries if 'ORDER BY' in query['sql']]
+                self.assertTrue(ordered)
+                for sql in ordered:
+                    self.assertEqual(self.unindexed_steps(sql, (self.sort_walk,)), [], sql)
+
+    def test_storefront_queries_use_indexes(self):
+        for url, accepted in self.storefront_urls():
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                for query in queries.captured_queries:
+                    if not query['sql'].startswith('SELECT'):
+                        continue
+                    self.assertEqual(self.unindexed_steps(query['sql'], accepted), [], query['sql'])
+
+
+class IndexViewQueryCountTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def count_home_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('main:home'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries.captured_queries)
+
+    def test_showcase_query_count_does_not_grow_with_catalog(self):
+        create_catalog(categories=1, product_categories=1, products=1)
+        small = self.count_home_queries()
+
+        create_catalog(categories=3, product_categories=6, products=5)
+        self.assertEqual(self.count_home_queries(), small)
+
+    def test_showcase_renders_first_product_of_each_product_category(self):
+        create_catalog(categories=2, product_categories=3, products=2)
+        response = self.client.get(reverse('main:home'))
+
+        showcase = response.context['showcase_categories']
+        self.assertEqual(len(showcase), 2)
+        for category in showcase:
+            self.assertEqual(len(category.showcase_product_categories), 3)
+            for product_category in category.showcase_product_categories:
+                self.assertEqual(len(product_category.showcase_products), 1)
+        self.assertContains(response, 'Uzbekistan')
+
+
+class IndexViewCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        create_catalog(categories=2, product_categories=2, products=2)
+
+    def test_unchanged_home_page_does_not_query_database(self):
+        self.client.get(reverse('main:home'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('main:home'))
+        self.assertContains(response, 'Category 0')
+
+    def test_saving_a_model_invalidates_the_cached_sections(self):
+        self.client.get(reverse('main:home'))
+
+        category = Category.objects.get(name='Category 0')
+        category.name = 'Renamed category'
+        category.save()
+
+        response = self.client.get(reverse('main:home'))
+        self.assertContains(response, 'Renamed category')
+        self.assertNotContains(response, 'Category 0')
+
+    def test_deleting_a_product_invalidates_the_cached_sections(self):
+        self.client.get(reverse('main:home'))
+        Product.objects.get(title='Phone 1-1-1').delete()
+
+        response = self.client.get(reverse('main:home'))
+        self.assertNotContains(response, 'Phone 1-1-1')
+
+    def test_versions_are_bumped_again_after_commit(self):
+        category = Category.objects.get(name='Category 0')
+        with self.captureOnCommitCallbacks() as callbacks:
+            category.save()
+        bumped = get_versions(Category)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(get_versions(Category)['category'], bumped['category'])
+
+    def test_tests_keep_out_of_the_shared_cache(self):
+        # cache.clear() above would otherwise empty a running server's cache.
+        self.assertIsInstance(caches['default'], LocMemCache)
+
+
+class RequestMetricsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        metrics_store.clear()
+        create_catalog(categories=1, product_categories=2, products=3)
+
+    def test_metrics_are_recorded_per_url_name(self):
+        self.client.get(reverse('main:product_list'))
+        self.client.get(reverse('main:product_list'))
+
+        report = metrics_store.report()
+        self.assertEqual(report['main:product_list']['requests'], 2)
+        self.assertGreater(report['main:product_list']['queries']['p50'], 0)
+        self.assertIn('p99', report['main:product_list']['wall_ms'])
+
+    @override_settings(QUERY_BUDGETS={'main:product_list': 1}, QUERY_BUDGET_ACTION='raise')
+    def test_exceeding_a_query_budget_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('main:product_list'))
+
+    def test_report_endpoint_is_staff_only(self):
+        url = reverse('main:request_metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        staff = get_user_model().objects.create_user('staff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('main:request_metrics', response.json())
+
+
+class CatalogImportExportTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        create_catalog(categories=1, product_categories=2, products=3)
+
+    def export(self, format):
+        stream = io.StringIO()
+        export_products(stream, format)
+        stream.seek(0)
+        return stream
+
+    def test_export_then_import_updates_products_in_place(self):
+        exported = self.export('csv').getvalue()
+        importer = CatalogImporter()
+        result = importer.run(read_rows(io.StringIO(exported), 'csv'))
+
+        self.assertEqual((result['created'], result['updated'], result['errors']), (0, 6, 0))
+        self.assertEqual(Product.objects.count(), 6)
+        self.assertEqual(self.export('csv').getvalue(), exported)
+
+    def test_rows_with_different_columns_only_change_their_own(self):
+        first, second = Product.objects.order_by('pk')[:2]
+        Product.objects.filter(pk__in=[first.pk, second.pk]).update(quantity=107, star=7, desc='Kept')
+        category = first.product_category.slug
+        rows = [
+            {'slug': first.slug, 'title': first.title, 'price': '5', 'product_category': category, 'star': 9},
+            {'slug': second.slug, 'title': second.title, 'price': '6', 'product_category': category, 'quantity': 3},
+        ]
+        result = CatalogImporter().run(rows)
+
+        self.assertEqual((result['updated'], result['errors']), (2, 0))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.star, first.quantity, first.desc), (9, 107, 'Kept'))
+        self.assertEqual((second.star, second.quantity, second.desc), (7, 3, 'Kept'))
+        self.assertEqual(first.rating_score, rating_score(9, first.review))
+        # Indexed from the stored rows, so the descriptions the file left out stay searchable.
+        self.assertCountEqual(search_products(Product.objects.all(), 'kept'), [first, second])
+
+    def test_new_rows_get_unique_slugs_with_a_fixed_number_of_queries(self):
+        rows = [json.loads(line) for line in self.export('jsonl')]
+        for row in rows:
+            del row['slug']
+        rows.append({**rows[0], 'product_category': 'Tablets', 'category': 'Gadgets', 'country': 'Japan'})
+
+        CatalogImporter().run(rows)
+        with CaptureQueriesContext(connection) as small:
+            CatalogImporter().run(rows)
+        with CaptureQueriesContext(connection) as large:
+            CatalogImporter().run(rows * 5)
+
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertEqual(Product.objects.count(), 6 + 7 + 7 + 35)
+        self.assertEqual(Product.objects.values('slug').distinct().count(), Product.objects.count())
+        self.assertTrue(Product.objects.filter(
+            product_category__name='Tablets', product_category__category__name='Gadgets', country__name='Japan'
+        ).exists())
+
+
+class SlugAllocationTests(TestCase):
+
+    def test_same_names_get_numbered_slugs_from_one_query(self):
+        Category.objects.create(name='Phones', image='category/image/c.png', description='Phones')
+        Category.objects.create(name='Phones', image='category/image/c.png', description='Phones')
+        Category.objects.create(name='Phones case', image='category/image/c.png', description='Phones')
+
+        with self.assertNumQueries(1):
+            slugs = SlugAllocator(Category).allocate_many(['Phones', 'Phones', 'Phones case'])
+        self.assertEqual(slugs, ['phones-2', 'phones-3', 'phones-case-1'])
+
+    def test_existing_slug_is_kept_on_save(self):
+        category = Category.objects.create(name='Phones', image='category/image/c.png', description='Phones')
+        category.name = 'Smart phones'
+        category.save()
+        self.assertEqual(category.slug, 'phones')
+
+
+class ConcurrentSlugTests(TransactionTestCase):
+
+    def test_threads_creating_same_named_categories_get_unique_slugs(self):
+        threads, workers, per_worker = [], 8, 5
+        errors = []
+        barrier = threading.Barrier(workers)
+
+        def create():
+            try:
+                barrier.wait()
+                for _ in range(per_worker):
+                    Category.objects.create(name='Phones', image='category/image/c.png', description='Phones')
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        for _ in range(workers):
+            threads.append(threading.Thread(target=create))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        slugs = list(Category.objects.values_list('slug', flat=True))
+        self.assertEqual(len(slugs), workers * per_worker)
+        self.assertEqual(len(set(slugs)), len(slugs))
+        self.assertIn('phones', slugs)
+
+
+@override_settings(IMAGE_DERIVATIVE_WORKERS=0, IMAGE_DERIVATIVE_WIDTHS=(160, 320))
+class ImageDerivativeTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        images._existing.clear()
+
+        from PIL import Image
+        output = io.BytesIO()
+        Image.new('RGB', (1200, 900), 'orange').save(output, 'JPEG')
+        self.name = default_storage.save('category/image/photo.jpg', ContentFile(output.getvalue()))
+
+    def render(self, category):
+        return Template(
+            '{% load responsive_images %}{% responsive_image category.image sizes="200px" alt=category.name %}'
+        ).render(Context({'category': category}))
+
+    def test_upload_creates_resized_variants_and_srcset(self):
+        category = Category(name='Photos', image='category/image/photo.jpg', description='Photos')
+        self.assertIn('src="/media/category/image/photo.jpg"', self.render(category))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+
+        from PIL import Image
+        for width in (160, 320):
+            for format in ('webp', 'jpg'):
+                with default_storage.open(images.derivative_name(self.name, width, format)) as derivative:
+                    self.assertEqual(Image.open(derivative).width, width)
+        html = self.render(category)
+        self.assertIn('<source type="image/webp" srcset="/media/derivatives/category/image/photo-160w.webp 160w, ', html)
+        self.assertIn('photo-320w.jpg 320w" sizes="200px" alt="Photos" loading="lazy"></picture>', html)
+
+    def test_missing_or_broken_files_are_skipped(self):
+        with self.assertLogs('main.images', 'WARNING'):
+            self.assertIsNone(images.generate_derivatives('category/image/missing.jpg'))
+        self.assertIsNone(images.generate_derivatives('category/image/icon.svg'))
+
+
+class StaticBuildTests(TestCase):
+
+    def test_purge_keeps_only_selectors_used_by_templates(self):
+        css = (
+            '/* theme */ .btn, .btn-unused { color: red }\n'
+            '.collapse:not(.show) { display: none }\n'
+            'a[href$=".pdf"] { color: blue }\n'
+            '@media (min-width: 768px) { .unused { top: 0 } .alert-success:hover { top: 1px } }\n'
+            '@font-face { font-family: Roboto; src: url(roboto.woff) }'
+        )
+        purged = purge_css(css, {'btn', 'collapse'}, ('alert-',))
+
+        self.assertIn('.btn{color: red}', purged)
+        self.assertNotIn('btn-unused', purged)
+        self.assertIn('.collapse:not(.show)', purged)
+        self.assertIn('a[href$=".pdf"]', purged)
+        self.assertIn('@media (min-width: 768px){.alert-success:hover{top: 1px}}', purged)
+        self.assertIn('@font-face', purged)
+        self.assertNotIn('theme', purged)
+
+    def test_precompressed_hashed_file_is_served_with_immutable_caching(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        os.makedirs(os.path.join(root, 'css'))
+        for name, content in [('ui.0123456789ab.css', b'.btn{}'), ('ui.0123456789ab.css.br', b'brotli'), ('ui.css', b'.btn{}')]:
+            with open(os.path.join(root, 'css', name), 'wb') as output:
+                output.write(content)
+
+        with override_settings(STATIC_ROOT=root):
+            response = self.client.get('/static/css/ui.0123456789ab.css', HTTP_ACCEPT_ENCODING='gzip, br')
+            self.assertEqual(response['Content-Encoding'], 'br')
+            self.assertEqual(response['Content-Type'], 'text/css')
+            self.assertEqual(b''.join(response.streaming_content), b'brotli')
+            self.assertIn('immutable', response['Cache-Control'])
+            self.assertIn('Accept-Encoding', response['Vary'])
+
+            response = self.client.get('/static/css/ui.css', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEqual(response.status_code, 304)
+            self.assertNotIn('immutable', response['Cache-Control'])
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        create_catalog(categories=2, product_categories=1, products=2)
+        self.product = Product.objects.first()
+        self.product_url = reverse('main:product_detail', args=[self.product.slug])
+        self.category = self.product.product_category.category
+        self.category_url = reverse('main:category_detail', args=[self.category.slug])
+
+    def test_matching_etag_returns_304_without_rendering(self):
+        etag = self.client.get(self.product_url)['ETag']
+
+        with self.assertNumQueries(1), self.assertTemplateNotUsed('main/page-detail-product.html'):
+            response = self.client.get(self.product_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(self.product_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_head_returns_validators_without_rendering(self):
+        etag = self.client.get(self.product_url)['ETag']
+        with self.assertTemplateNotUsed('main/page-detail-product.html'):
+            response = self.client.head(self.product_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_new_image_changes_the_product_etag(self):
+        etag = self.client.get(self.product_url)['ETag']
+        ProductImage.objects.create(image='products/images/new.png', product=self.product)
+        response = self.client.get(self.product_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_last_modified_moves_with_the_sidebar_models(self):
+        response = self.client.get(self.category_url)
+        later = get_object_versions((Category, self.category.pk))[0] + 5000
+        with mock.patch('main.cache.new_version', return_value=later):
+            Country.objects.get().save()
+        response = self.client.get(self.category_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Last-Modified'], http_date(later // 1000))
+
+    def test_product_stamps_are_written_again_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.product.save()
+        later = get_object_versions((Product, self.product.pk))[0] + 5000
+        with mock.patch('main.cache.new_version', return_value=later):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(get_object_versions((Product, self.product.pk), (Category, self.category.pk)), [later, later])
+
+    def test_category_etag_follows_its_own_products_only(self):
+        etag = self.client.get(self.category_url)['ETag']
+
+        other = Product.objects.exclude(product_category__category=self.category).first()
+        other.price = 1
+        other.save()
+        self.assertEqual(self.client.get(self.category_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.product.price = 1
+        self.product.save()
+        self.assertEqual(self.client.get(self.category_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_differs_per_user(self):
+        etag = self.client.get(self.product_url)['ETag']
+        self.client.force_login(get_user_model().objects.create_user('buyer', password='secret'))
+        self.assertEqual(self.client.get(self.product_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(RELATED_PRODUCTS_COUNT=3)
+class RelatedProductTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        create_catalog(categories=2, product_categories=2, products=3)
+        self.product = Product.objects.order_by('pk').first()
+        # A product of the same product category and company beats one that
+        # only shares the top level category.
+        Product.objects.filter(product_category=self.product.product_category).exclude(pk=self.product.pk).update(company='sony')
+        self.twin = Product.objects.filter(product_category=self.product.product_category).exclude(pk=self.product.pk).first()
+        Product.objects.filter(pk=self.twin.pk).update(company='apple')
+
+    def neighbours(self, product):
+        return list(RelatedProduct.objects.filter(product=product).order_by('rank').values_list('related_id', flat=True))
+
+    def test_rebuild_ranks_neighbours_within_the_category(self):
+        result = rebuild_related_products()
+        self.assertEqual(result['products'], 12)
+        self.assertEqual(result['rows'], 36)
+
+        neighbours = self.neighbours(self.product)
+        self.assertEqual(neighbours[0], self.twin.pk)
+        self.assertEqual(
+            set(Product.objects.filter(pk__in=neighbours).values_list('product_category__category', flat=True)),
+            {self.product.product_category.category_id}
+        )
+
+    def test_detail_page_reads_stored_neighbours_in_order(self):
+        rebuild_related_products()
+        response = self.client.get(reverse('main:product_detail', args=[self.product.slug]))
+        self.assertEqual([product.pk for product in response.context['related_products']], self.neighbours(self.product))
+
+    def test_saving_a_product_updates_the_neighbourhood(self):
+        rebuild_related_products()
+        other = Product.objects.exclude(product_category__category=self.product.product_category.category).first()
+        self.assertNotIn(self.product.pk, self.neighbours(other))
+
+        self.product.product_category = other.product_category
+        self.product.company = other.company
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertIn(self.product.pk, self.neighbours(other))
+        self.assertNotIn(self.product.pk, self.neighbours(self.twin))
+        self.assertEqual(len(self.neighbours(self.product)), 3)
+
+    def test_deleting_a_product_replaces_it_in_other_lists(self):
+        rebuild_related_products()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.twin.delete()
+        self.assertEqual(len(self.neighbours(self.product)), 3)
+        self.assertEqual(update_related_products([]), 0)
+
+
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        metrics_store.clear()
+        create_catalog(categories=2, product_categories=2, products=2)
+        self.product = Product.objects.first()
+
+    def test_read_views_are_async(self):
+        for view in (IndexView, ProductListView, ProductDetailView, SearchView, CategoryDetailView):
+            self.assertTrue(view.view_is_async, view.__name__)
+
+    async def test_views_render_through_the_asgi_handler(self):
+        urls = [
+            reverse('main:home'),
+            reverse('main:product_list') + '?sort=price&cursor=',
+            reverse('main:product_detail', args=[self.product.slug]),
+            reverse('main:search') + '?q=phone',
+            reverse('main:category_detail', args=[(await Category.objects.afirst()).slug]),
+        ]
+        for url in urls:
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+        response = await self.async_client.get(reverse('main:product_detail', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+
+        report = metrics_store.report()
+        self.assertGreater(report['main:product_list']['queries']['max'], 0)
+
+    def test_home_page_reads_only_expired_sections(self):
+        self.client.force_login(get_user_model().objects.create_user('buyer', password='secret'))
+        self.client.get(reverse('main:home'))
+        # The session and the user are cached too, every section comes from its fragment.
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('main:home'))
+        self.assertContains(response, 'Category 0')
+
+
+class DatabaseRoutingTests(TestCase):
+
+    def test_only_catalog_reads_before_a_write_use_the_replica(self):
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Product), 'default')
+        with routing_state() as state:
+            state.replica = 'replica'
+            self.assertEqual(router.db_for_read(Product), 'replica')
+            self.assertEqual(router.db_for_read(get_user_model()), 'default')
+
+            router.db_for_write(Session)
+            self.assertEqual(router.db_for_read(Product), 'replica')
+            self.assertEqual(router.db_for_write(Product), 'default')
+            self.assertEqual(router.db_for_read(Product), 'default')
+
+    def test_test_mirror_is_not_treated_as_a_replica(self):
+        self.assertIsNone(get_replica_alias())
+
+
+class ReplicaLagTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        # Point the mirror at a file of its own, synced like the real stand-in.
+        replica = connections['replica']
+        replica.close()
+        self.mirror_settings = replica.settings_dict
+        replica.settings_dict = {**self.mirror_settings, 'NAME': os.path.join(self.directory, 'replica.sqlite3')}
+        create_catalog(categories=1, product_categories=1, products=1)
+        call_command('sync_replica', stdout=io.StringIO())
+
+    def tearDown(self):
+        connections['replica'].close()
+        connections['replica'].settings_dict = self.mirror_settings
+        shutil.rmtree(self.directory)
+
+    def test_storefront_reads_lag_until_synced_except_after_an_own_write(self):
+        product = Product.objects.create(
+            title='Fresh phone', desc='New', main_image='products/main_images/p.png', price=10,
+            product_category=ProductCategory.objects.get(), delivery_time='3 days'
+        )
+        url = reverse('main:product_detail', args=[product.slug])
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertTrue(replica_queries.captured_queries)
+
+        self.client.force_login(get_user_model().objects.create_user('buyer', password='secret'))
+        with override_settings(MEDIA_ROOT=self.directory):
+            response = self.client.post(reverse('accounts:profile_settings'), {
+                'username': 'buyer', 'first_name': 'New', 'last_name': 'Name', 'email': 'buyer@example.com',
+                'phone': '123', 'address': 'Street', 'image': SimpleUploadedFile('avatar.png', b'avatar'),
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('primary_until', response.cookies)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        del self.client.cookies['primary_until']
+        self.assertEqual(self.client.get(url).status_code, 404)
+        call_command('sync_replica', stdout=io.StringIO())
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_replica_connections_do_not_outlive_the_request(self):
+        # A kept connection would go on reading the file sync_replica replaced.
+        Product.objects.using('replica').count()
+        close_old_connections()
+        self.assertIsNone(connections['replica'].connection)
+
+
+class DatabaseConnectionTests(TransactionTestCase):
+
+    def test_new_connections_get_the_configured_pragmas(self):
+        connection.close()
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -32000)
+
+    @override_settings(DATABASE_WRITE_RETRY_DELAY=0.001)
+    def test_locked_writes_are_retried_outside_transactions_only(self):
+        connection_stats.clear()
+        calls = []
+
+        @retry_on_locked
+        def write():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return Country.objects.create(name='Uzbekistan', icon='country/icons/uz.png')
+
+        self.assertTrue(write().pk)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(connection_stats.report()['write_retries'], 2)
+
+        calls.clear()
+        with self.assertRaises(OperationalError), transaction.atomic():
+            write()
+        self.assertEqual(len(calls), 1)
+
+    def test_report_counts_requests_and_connections(self):
+        connection.ensure_connection()
+        connection_stats.clear()
+        for _ in range(4):
+            self.client.get(reverse('main:home'))
+        report = connection_stats.report()
+        self.assertEqual(report['requests'], 4)
+        self.assertEqual(report['reuse_ratio'], 1.0)
+
+
+class ProductSortTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(categories=1, product_categories=1, products=3)
+
+    def setUp(self):
+        cache.clear()
+
+    def listed(self, sort):
+        response = self.client.get(reverse('main:product_list'), {'sort': sort})
+        return [product.pk for product in response.context['products']]
+
+    def test_sort_keys_follow_star_and_review(self):
+        product = Product.objects.first()
+        product.star, product.review = 9, 40
+        product.save(update_fields=['star', 'review'])
+        product.refresh_from_db()
+        self.assertEqual(product.popularity_score, 360)
+        self.assertAlmostEqual(product.rating_score, (9 * 40 + 5 * 10) / 50)
+        self.assertEqual(self.listed('popularity')[0], product.pk)
+        self.assertEqual(self.listed('rating')[0], product.pk)
+
+    def test_imported_updates_recompute_sort_keys(self):
+        product = Product.objects.first()
+        CatalogImporter().run([{
+            'slug': product.slug, 'title': product.title, 'price': '10',
+            'product_category': product.product_category.name, 'review': '30',
+        }])
+        product.refresh_from_db()
+        self.assertEqual(product.popularity_score, product.star * 30)
+
+    def test_unknown_sorts_fall_back_to_newest(self):
+        newest = self.listed('newest')
+        self.assertEqual(self.listed('desc'), newest)
+        self.assertEqual(self.listed('-created_at'), newest)
+        self.assertEqual(self.listed('price'), sorted(newest, key=lambda pk: Product.objects.get(pk=pk).price))
+
+
+class ProductCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(categories=2, product_categories=2, products=3)
+
+    def assertCounts(self):
+        self.assertEqual(reconcile_product_counts(fix=False), {'productcategory': 0, 'category': 0})
+
+    def test_counters_follow_product_changes(self):
+        self.assertEqual(list(Category.objects.values_list('product_count', flat=True)), [6, 6])
+        first, second = ProductCategory.objects.order_by('pk')[:2]
+        product = first.products.first()
+
+        product.is_active = False
+        product.save()
+        first.refresh_from_db()
+        self.assertEqual(first.product_count, 2)
+
+        product.is_active = True
+        product.product_category = ProductCategory.objects.order_by('pk').last()
+        product.save()
+        self.assertCounts()
+
+        second.products.first().delete()
+        self.assertCounts()
+        # One product moved to the other category, one was deleted.
+        self.assertEqual(list(Category.objects.order_by('pk').values_list('product_count', flat=True)), [4, 7])
+
+    def test_moving_a_product_category_moves_its_count(self):
+        product_category = ProductCategory.objects.order_by('pk').first()
+        product_category.category = Category.objects.order_by('pk').last()
+        product_category.save()
+        self.assertEqual(list(Category.objects.order_by('pk').values_list('product_count', flat=True)), [3, 9])
+        self.assertCounts()
+
+    def test_saving_a_stale_category_keeps_the_counter(self):
+        category = Category.objects.first()
+        Product.objects.filter(product_category__category=category).first().delete()
+        category.name = 'Renamed'
+        category.save()
+        category.refresh_from_db()
+        self.assertEqual(category.product_count, 5)
+
+    def test_reconcile_repairs_drift(self):
+        ProductCategory.objects.update(product_count=0)
+        self.assertEqual(reconcile_product_counts(), {'productcategory': 4, 'category': 0})
+        self.assertCounts()
+
+
+class WishlistTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(categories=1, product_categories=2, products=6)
+        cls.user = get_user_model().objects.create_user('buyer', password='secret')
+        cls.products = list(Product.objects.order_by('pk'))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def post(self, name, *products):
+        return self.client.post(reverse(name), {'product': [product.pk for product in products]})
+
+    def test_bulk_updates_are_idempotent_and_keep_the_count(self):
+        first, second, third = self.products[:3]
+        third.is_active = False
+        third.save()
+        for _ in range(2):
+            response = self.post('main:wishlist_add', first, second, third)
+        self.assertEqual(response.json(), {'products': [first.pk, second.pk], 'count': 2})
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.wishlist_count, 2)
+
+        for _ in range(2):
+            response = self.post('main:wishlist_remove', first)
+        self.assertEqual(response.json(), {'products': [second.pk], 'count': 1})
+        second.delete()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.wishlist_count, 0)
+
+    def test_grid_marks_wishlisted_products_with_at_most_one_query(self):
+        self.post('main:wishlist_add', *self.products[:3])
+        url = reverse('main:product_list') + '?sort=price'
+        self.client.get(url)
+        touch_objects((WishlistItem, self.user.pk))
+        with CaptureQueriesContext(connection) as cold:
+            response = self.client.get(url)
+        self.assertContains(response, 'fa-heart text-danger', count=3)
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get(url)
+        wishlist_queries = [query for query in cold.captured_queries if 'main_wishlistitem' in query['sql']]
+        self.assertEqual(len(wishlist_queries), 1)
+        self.assertEqual(len(cold), len(warm) + 1)
+
+    def test_profile_reads_the_stored_count(self):
+        self.post('main:wishlist_add', *self.products[:2])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('accounts:profile_main'))
+        self.assertEqual(response.context['wishlist_count'], 2)
+        self.assertFalse([query for query in queries.captured_queries if 'COUNT' in query['sql']])
+        response = self.client.get(reverse('accounts:profile_wishlist'))
+        self.assertContains(response, self.products[1].title)
+
+    def test_anonymous_visitors_cannot_change_wishlists(self):
+        self.client.logout()
+        self.assertEqual(self.post('main:wishlist_add', self.products[0]).status_code, 403)
+
+
+class OrderTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(categories=1, product_categories=2, products=6)
+        cls.user = get_user_model().objects.create_user('customer', password='secret')
+        cls.products = list(Product.objects.order_by('pk'))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def place(self, *quantities):
+        return place_order(self.user.pk, [(product.pk, quantity) for product, quantity in zip(self.products, quantities)])
+
+    def test_transitions_keep_the_summary_in_step(self):
+        first, second, third = self.place(2, 1), self.place(3), self.place(1)
+        set_order_status(first, OrderStatus.PAID)
+        set_order_status(first, OrderStatus.SHIPPED)
+        set_order_status(first, OrderStatus.DELIVERED)
+        set_order_status(second, OrderStatus.CANCELLED)
+        with self.assertRaises(OrderError):
+            set_order_status(third, OrderStatus.DELIVERED)
+        with self.assertRaises(OrderError):
+            set_order_status(Order.objects.get(pk=second.pk), OrderStatus.PAID)
+
+        summary = OrderSummary.objects.get(user=self.user)
+        self.assertEqual((summary.orders_count, summary.awaiting_delivery, summary.delivered_items), (3, 1, 3))
+        self.assertEqual(
+            [(order['id'], order['status']) for order in summary.recent_orders],
+            [(third.pk, 'pending'), (second.pk, 'cancelled'), (first.pk, 'delivered')]
+        )
+        self.assertEqual(first.total, self.products[0].price * 2 + self.products[1].price)
+
+    def test_unavailable_products_are_refused(self):
+        self.products[0].is_active = False
+        self.products[0].save()
+        with self.assertRaises(OrderError):
+            self.place(1)
+        with self.assertRaises(OrderError):
+            place_order(self.user.pk, [(self.products[1].pk, 0)])
+        self.assertFalse(Order.objects.exists())
+
+    def test_profile_reads_one_summary_row(self):
+        for _ in range(6):
+            self.place(1, 2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('accounts:profile_main'))
+        self.assertEqual(response.context['orders_count'], 6)
+        self.assertEqual(len(response.context['recent_orders']), 4)
+        order_queries = [query['sql'] for query in queries.captured_queries if 'order' in query['sql']]
+        self.assertEqual(len(order_queries), 1)
+        self.assertIn('main_ordersummary', order_queries[0])
+
+    def test_orders_page_costs_the_same_however_many_items(self):
+        url = reverse('accounts:profile_orders')
+        self.place(1)
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        for _ in range(12):
+            self.place(1, 2, 3, 4)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(response.context['orders']), 10)
+        self.assertContains(response, self.products[3].title)
+
+        response = self.client.get(url + '?' + response.context['page_obj'].next_query)
+        self.assertEqual(len(response.context['orders']), 3)
+        self.assertFalse(response.context['page_obj'].has_next())
+
+
+class InventoryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(categories=1, product_categories=1, products=3)
+        cls.products = list(Product.objects.order_by('pk'))
+        Product.objects.update(quantity=5)
+
+    def stock(self):
+        return list(Product.objects.order_by('pk').values_list('quantity', flat=True))
+
+    def test_multi_item_reservations_are_all_or_nothing(self):
+        first, second, third = self.products
+        key = reserve([(first.pk, 2), (second.pk, 1), (first.pk, 1)])
+        self.assertEqual(self.stock(), [2, 4, 5])
+        with self.assertRaises(OutOfStock) as raised:
+            reserve([(second.pk, 1), (first.pk, 3), (third.pk, 1)])
+        self.assertEqual(raised.exception.product_id, first.pk)
+        self.assertEqual(self.stock(), [2, 4, 5])
+
+        self.assertEqual(release(key), 4)
+        self.assertEqual(release(key), 0)
+        self.assertEqual(self.stock(), [5, 5, 5])
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_confirmed_stock_stays_taken(self):
+        key = reserve([(self.products[0].pk, 2)])
+        self.assertEqual(confirm(key), {self.products[0].pk: 2})
+        self.assertEqual(self.stock(), [3, 5, 5])
+        with self.assertRaises(ReservationExpired):
+            confirm(key)
+
+    def test_sweeper_releases_expired_reservations_in_batches(self):
+        for product in self.products:
+            reserve([(product.pk, 1)], ttl=timedelta(seconds=-1))
+        kept = reserve([(self.products[0].pk, 1)])
+        with self.assertRaises(ReservationExpired):
+            confirm(StockReservation.objects.filter(expires_at__lte=timezone.now()).values_list('key', flat=True)[0])
+
+        self.assertEqual(release_expired(batch_size=2), 3)
+        self.assertEqual(self.stock(), [4, 5, 5])
+        self.assertEqual(list(StockReservation.objects.values_list('key', flat=True)), [kept])
+
+    def test_stock_changes_change_the_product_etag(self):
+        cache.clear()
+        url = reverse('main:product_detail', args=[self.products[0].slug])
+        etags = [self.client.get(url)['ETag']]
+        for change in (
+            lambda: reserve([(self.products[0].pk, 1)], ttl=timedelta(seconds=-1)),
+            lambda: release_expired(),
+            lambda: release(reserve([(self.products[0].pk, 1)])),
+        ):
+            change()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[-1])
+            self.assertEqual(response.status_code, 200)
+            etags.append(response['ETag'])
+        self.assertEqual(len(set(etags)), 4)
+
+
+class ConcurrentReservationTests(TransactionTestCase):
+
+    def test_threads_never_oversell(self):
+        create_catalog(categories=1, product_categories=1, products=2)
+        first, second = Product.objects.order_by('pk')
+        Product.objects.update(quantity=10)
+        workers, errors, sold = 8, [], []
+        barrier = threading.Barrier(workers)
+
+        def buy(number):
+            try:
+                barrier.wait()
+                for _ in range(3):
+                    # Half the threads name the products the other way round.
+                    items = [(first.pk, 1), (second.pk, 1)]
+                    try:
+                        sold.append(reserve(items[::-1] if number % 2 else items))
+                    except OutOfStock:
+                        pass
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=buy, args=(number,)) for number in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(sold), 10)
+        self.assertEqual(list(Product.objects.values_list('quantity', flat=True)), [0, 0])
+
+
+class SellerDashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(categories=1, product_categories=1, products=4)
+        cls.seller = get_user_model().objects.create_user('seller', password='secret', status='seller')
+        cls.products = list(Product.objects.order_by('pk'))
+        Product.objects.update(seller=cls.seller, quantity=10)
+        Product.objects.filter(pk=cls.products[0].pk).update(quantity=2)
+        Product.objects.filter(pk=cls.products[1].pk).update(is_active=False, quantity=1)
+        buyer = get_user_model().objects.create_user('buyer', password='secret')
+        WishlistItem.objects.create(user=buyer, product=cls.products[0])
+        WishlistItem.objects.create(user=cls.seller, product=cls.products[0])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.seller)
+
+    def test_summary_totals_come_from_aggregates(self):
+        with override_settings(PRODUCT_VIEW_FLUSH_INTERVAL=0), mock.patch('main.views.product_views', ViewCounter()):
+            for _ in range(3):
+                self.client.get(reverse('main:product_detail', args=[self.products[2].slug]))
+        self.assertEqual(refresh_seller_summaries(), 1)
+
+        summary = SellerSummary.objects.get(user=self.seller)
+        self.assertEqual((summary.product_count, summary.active_count, summary.stock_total), (4, 3, 23))
+        self.assertEqual(summary.stock_value, sum(product.price * quantity for product, quantity in zip(self.products, [2, 1, 10, 10])))
+        self.assertEqual((summary.low_stock_count, summary.view_count, summary.wishlist_count), (1, 3, 2))
+
+    def test_dashboard_costs_the_same_however_many_listings(self):
+        url = reverse('accounts:profile_seller')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        product = Product.objects.get(pk=self.products[2].pk)
+        for number in range(30):
+            product.pk, product.slug = None, f'listing-{number}'
+            product.save()
+        refresh_seller_summaries([self.seller.pk])
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+
+        self.assertEqual(len(small), len(large))
+        self.assertFalse([query for query in large.captured_queries if 'COUNT(*)' in query['sql']])
+        self.assertEqual(len(response.context['products']), 20)
+        self.assertEqual(response.context['summary'].product_count, 34)
+        self.assertEqual([product.pk for product in response.context['low_stock']], [self.products[0].pk])
+        response = self.client.get(url + '?' + response.context['page_obj'].next_query)
+        self.assertEqual(len(response.context['products']), 14)
+        wishlisted = {product.pk: product.wishlisted for product in response.context['products']}
+        self.assertEqual(wishlisted[self.products[0].pk], 2)
+
+    def test_customers_see_no_listings(self):
+        self.client.force_login(get_user_model().objects.get(username='buyer'))
+        response = self.client.get(reverse('accounts:profile_seller'))
+        self.assertEqual(list(response.context['products']), [])
+        self.assertNotIn('summary', response.context)
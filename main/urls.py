@@ -7,7 +7,10 @@ from .views import (
     ProductListLargeView,
     ProductDetailView,
     ContentView,
-    SearchView
+    SearchView,
+    RequestMetricsView,
+    WishlistAddView,
+    WishlistRemoveView
 )
 
 app_name = 'main'
@@ -21,4 +24,7 @@ urlpatterns = [
     path('product/<slug:slug>/', ProductDetailView.as_view(), name='product_detail'),
     path('search/', SearchView.as_view(), name='search'),
     path('content/', ContentView.as_view(), name='content'),
+    path('metrics/', RequestMetricsView.as_view(), name='request_metrics'),
+    path('wishlist/add/', WishlistAddView.as_view(), name='wishlist_add'),
+    path('wishlist/remove/', WishlistRemoveView.as_view(), name='wishlist_remove'),
 ]
\ No newline at end of file
@@ -1,32 +1,163 @@
-from django.shortcuts import render, get_object_or_404
-from django.views.generic import ListView, DetailView, TemplateView
-from django.db.models import Q
+import asyncio
 
-from .models import Category, ProductCategory, Country, Product, ProductImage, Service
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404
+from django.views.generic import ListView, DetailView, TemplateView, View
+from django.views.generic.base import ContextMixin
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.http import Http404, JsonResponse
+from django.db.models import Prefetch, Q
+from django.utils.http import url_has_allowed_host_and_scheme
 
+from .cache import ConditionalGetMixin, VersionedCacheMixin, aget_page_versions, get_user_pk
+from .database import stats as connection_stats
+from .facets import facet_counts, facet_options, stored_facet_counts
+from .metrics import store as metrics_store
+from .models import Category, ProductCategory, Country, Product, ProductImage, RelatedProduct, Service
+from .pagination import CursorPaginationMixin
+from .search import search_products
+from .sellers import product_views
+from .sorting import SORT_ORDERS, get_sort
+from .wishlist import add_to_wishlist, product_ids, remove_from_wishlist, wishlisted_ids
 
-class IndexView(TemplateView):
+
+async def fetch(queryset):
+    return [obj async for obj in queryset]
+
+
+class AsyncListMixin:
+    """
+    ``get()`` for async list views: the page is read off the event loop while
+    ``get_extra_context()`` runs its own queries, and ``get_context_data()``
+    is handed both instead of paginating a second time.
+    """
+    
+    def get_page_context(self):
+        queryset = self.object_list
+        paginator, page, object_list, is_paginated = self.paginate_queryset(queryset, self.get_paginate_by(queryset))
+        page.object_list = list(object_list)
+        # Counted now, or the template would query while rendering.
+        paginator.count
+        return {
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': is_paginated,
+            'object_list': page.object_list,
+            self.get_context_object_name(page.object_list): page.object_list,
+        }
+    
+    async def get_extra_context(self):
+        return {}
+    
+    async def get(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()
+        page, extra = await asyncio.gather(sync_to_async(self.get_page_context)(), self.get_extra_context())
+        return self.render_to_response(self.get_context_data(**page, **extra))
+    
+    def get_context_data(self, **kwargs):
+        return ContextMixin.get_context_data(self, **kwargs)
+
+
+class WishlistMarksMixin:
+    """``get_wishlisted()`` gives the signed in user's wishlisted product ids for marking a grid."""
+    
+    async def get_wishlisted(self):
+        return await sync_to_async(wishlisted_ids)(await get_user_pk(self.request))
+
+
+class IndexView(VersionedCacheMixin, TemplateView):
     template_name = 'main/index.html'
+    cache_models = (Category, ProductCategory, Product, Service, Country)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['categories'] = Category.objects.filter(is_active=True)
+        # Sliced prefetches are windowed per parent, so the showcase costs
+        # three queries however many categories and products there are.
+        context['showcase_categories'] = Category.objects.filter(is_active=True).prefetch_related(
+            Prefetch(
+                'product_categories',
+                queryset=ProductCategory.objects.filter(is_active=True).order_by('id')[:8],
+                to_attr='showcase_product_categories'
+            ),
+            Prefetch(
+                'showcase_product_categories__products',
+                queryset=Product.objects.filter(is_active=True).select_related('country').order_by('-created_at', '-id')[:1],
+                to_attr='showcase_products'
+            ),
+        )[:2]
         context['services'] = Service.objects.filter(is_active=True)
-        context['featured_products'] = Product.objects.filter(is_active=True, recommended=True)[:8]
+        context['featured_products'] = Product.objects.filter(is_active=True, recommended=True).order_by('-created_at')[:8]
         context['new_products'] = Product.objects.filter(is_active=True).order_by('-created_at')[:12]
         context['countries'] = Country.objects.filter(is_active=True)
         return context
+    
+    def get_fragment_keys(self):
+        """The ``{% cache %}`` fragments each lazy context entry is rendered in."""
+        versions = self.get_versions()
+        view_name = self.request.resolver_match.view_name
+        
+        def key(name, *vary_on):
+            return make_template_fragment_key(name, vary_on)
+        
+        return {
+            'categories': [
+                key('header_categories', view_name, versions['category']),
+                key('index_nav_categories', versions['category']),
+                key('index_menu_categories', versions['category']),
+            ],
+            'showcase_categories': [
+                key('index_showcase', versions['category'], versions['productcategory'], versions['product'], versions['country']),
+            ],
+            'services': [key('index_services', versions['service'])],
+            'featured_products': [
+                key('index_popular_products', versions['product']),
+                key('index_deal_products', versions['product']),
+            ],
+            'new_products': [key('index_new_products', versions['product'])],
+            'countries': [key('index_countries', versions['country'])],
+        }
+    
+    async def get(self, request, *args, **kwargs):
+        context = self.get_context_data(**kwargs)
+        # Only sections whose fragment has expired are read, all at once.
+        fragments = self.get_fragment_keys()
+        cached = await cache.aget_many([key for keys in fragments.values() for key in keys])
+        names = [name for name, keys in fragments.items() if not all(key in cached for key in keys)]
+        for name, objects in zip(names, await asyncio.gather(*(fetch(context[name]) for name in names))):
+            context[name] = objects
+        return self.render_to_response(context)
 
 
-class CategoryDetailView(DetailView):
+class CategoryDetailView(ConditionalGetMixin, DetailView):
     model = Category
     template_name = 'main/page-category.html'
     context_object_name = 'category'
     slug_url_kwarg = 'slug'
     
+    async def get_validators(self):
+        pk = await self.get_queryset().filter(slug=self.kwargs['slug']).values_list('pk', flat=True).afirst()
+        if pk is None:
+            return None
+        versions, stamps = await aget_page_versions((Category, ProductCategory, Country), [(Category, pk)])
+        return [pk, *versions.values()], stamps
+    
+    async def get_object(self, queryset=None):
+        try:
+            return await self.get_queryset().aget(slug=self.kwargs['slug'])
+        except Category.DoesNotExist:
+            raise Http404('No category found matching the query')
+    
+    async def get(self, request, *args, **kwargs):
+        self.object = await self.get_object()
+        return self.render_to_response(self.get_context_data(object=self.object))
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        category = self.get_object()
+        category = self.object
+        # The template reads neither, so they are left lazy rather than fetched.
         context['products'] = Product.objects.filter(
             product_category__category=category,
             is_active=True
@@ -35,95 +166,150 @@ class CategoryDetailView(DetailView):
         return context
 
 
-class ProductListView(ListView):
+class ProductListView(AsyncListMixin, WishlistMarksMixin, CursorPaginationMixin, ListView):
     model = Product
     template_name = 'main/page-listing-grid.html'
     context_object_name = 'products'
     paginate_by = 12
     
-    def get_queryset(self):
-        queryset = Product.objects.filter(is_active=True)
+    def get_facet_filters(self):
+        filters = {}
         
         category_slug = self.request.GET.get('category')
         if category_slug:
-            queryset = queryset.filter(product_category__slug=category_slug)
+            filters['category'] = Q(product_category__slug=category_slug)
         
         country_id = self.request.GET.get('country')
         if country_id:
-            queryset = queryset.filter(country_id=country_id)
+            filters['country'] = Q(country_id=country_id)
         
         condition = self.request.GET.get('condition')
         if condition:
-            queryset = queryset.filter(condition=condition)
+            filters['condition'] = Q(condition=condition)
         
+        verified = self.request.GET.get('verified')
+        if verified == 'true':
+            filters['verified'] = Q(verified=True)
+        
+        price = Q()
         min_price = self.request.GET.get('min_price')
         max_price = self.request.GET.get('max_price')
         if min_price:
-            queryset = queryset.filter(price__gte=min_price)
+            price &= Q(price__gte=min_price)
         if max_price:
-            queryset = queryset.filter(price__lte=max_price)
+            price &= Q(price__lte=max_price)
+        if price:
+            filters['price'] = price
         
-        verified = self.request.GET.get('verified')
-        if verified == 'true':
-            queryset = queryset.filter(verified=True)
+        return filters
+    
+    def get_base_queryset(self):
+        queryset = Product.objects.filter(is_active=True).select_related('country')
         
         search = self.request.GET.get('search')
         if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) | 
-                Q(desc__icontains=search) |
-                Q(brand__icontains=search) |
-                Q(company__icontains=search)
-            )
+            queryset = search_products(queryset, search)
         
-        sort = self.request.GET.get('sort', '-created_at')
-        queryset = queryset.order_by(sort)
+        return queryset
+    
+    def get_queryset(self):
+        queryset = self.get_base_queryset().filter(*self.get_facet_filters().values())
+        
+        # Searches keep their relevance order unless a sort is picked.
+        if self.request.GET.get('sort') or not self.request.GET.get('search'):
+            queryset = queryset.order_by(*SORT_ORDERS[self.get_sort()])
         
         return queryset
     
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['categories'] = ProductCategory.objects.filter(is_active=True)
-        context['countries'] = Country.objects.filter(is_active=True)
-        return context
+    def get_sort(self):
+        return get_sort(self.request.GET.get('sort'))
+    
+    async def get_extra_context(self):
+        categories, countries, wishlisted = await asyncio.gather(
+            fetch(ProductCategory.objects.filter(is_active=True)),
+            fetch(Country.objects.filter(is_active=True)),
+            self.get_wishlisted(),
+        )
+        
+        options = facet_options(categories, countries)
+        selected = self.get_facet_filters()
+        if selected or self.request.GET.get('search'):
+            facets = await sync_to_async(facet_counts)(self.get_base_queryset(), options, selected)
+        else:
+            facets = await sync_to_async(stored_facet_counts)(options)
+        return {
+            'categories': categories, 'countries': countries, 'facets': facets, 'sort': self.get_sort(),
+            'wishlisted': wishlisted,
+        }
 
 
 class ProductListLargeView(ProductListView):
     template_name = 'main/page-listing-large.html'
     paginate_by = 10
     
-    def get_queryset(self):
-        queryset = super().get_queryset()
+    def get_facet_filters(self):
+        filters = super().get_facet_filters()
         
         company = self.request.GET.get('company')
         if company:
-            queryset = queryset.filter(company=company)
+            filters['company'] = Q(company=company)
         
         size = self.request.GET.get('size')
         if size:
-            queryset = queryset.filter(size=size)
+            filters['size'] = Q(size=size)
         
-        return queryset
+        return filters
 
 
-class ProductDetailView(DetailView):
+class ProductDetailView(ConditionalGetMixin, DetailView):
     model = Product
     template_name = 'main/page-detail-product.html'
     context_object_name = 'product'
     slug_url_kwarg = 'slug'
     
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        product = self.get_object()
-        
-        context['product_images'] = product.images.filter(is_active=True)
+    async def get_validators(self):
+        row = await self.get_queryset().filter(slug=self.kwargs['slug']).values_list('pk', 'product_category_id').afirst()
+        if row is None:
+            return None
+        pk, product_category_id = row
+        versions, stamps = await aget_page_versions(
+            (Category, ProductCategory, Country, RelatedProduct), [(Product, pk), (ProductCategory, product_category_id)]
+        )
+        return [pk, *versions.values()], stamps
+    
+    def get_queryset(self):
+        return super().get_queryset().select_related('product_category__category', 'country')
+    
+    async def get_object(self, queryset=None):
+        try:
+            return await self.get_queryset().aget(slug=self.kwargs['slug'])
+        except Product.DoesNotExist:
+            raise Http404('No product found matching the query')
+    
+    async def get(self, request, *args, **kwargs):
+        self.object = product = await self.get_object()
+        views = product_views.add(product.pk)
+        if views:
+            await sync_to_async(product_views.flush)(views)
         
-        context['related_products'] = Product.objects.filter(
-            product_category=product.product_category,
-            is_active=True
-        ).exclude(id=product.id)[:4]
+        product_images, related_products = await asyncio.gather(
+            fetch(product.images.filter(is_active=True)),
+            fetch(Product.objects.filter(
+                related_to_rows__product=product,
+                is_active=True
+            ).order_by('related_to_rows__rank')[:4]),
+        )
+        # Until rebuild_related_products has run, show the product category.
+        if not related_products:
+            related_products = await fetch(Product.objects.filter(
+                product_category=product.product_category,
+                is_active=True
+            ).exclude(id=product.id)[:4])
         
-        return context
+        context = self.get_context_data(
+            object=product, product_images=product_images, related_products=related_products
+        )
+        return self.render_to_response(context)
 
 
 class ContentView(TemplateView):
@@ -144,7 +330,7 @@ class CategoryListView(TemplateView):
         return context
 
 
-class SearchView(ListView):
+class SearchView(AsyncListMixin, WishlistMarksMixin, CursorPaginationMixin, ListView):
     model = Product
     template_name = 'main/page-listing-grid.html'
     context_object_name = 'products'
@@ -152,19 +338,60 @@ class SearchView(ListView):
     
     def get_queryset(self):
         query = self.request.GET.get('q', '')
+        queryset = Product.objects.filter(is_active=True).select_related('country')
         if query:
-            return Product.objects.filter(
-                Q(title__icontains=query) | 
-                Q(desc__icontains=query) |
-                Q(brand__icontains=query) |
-                Q(company__icontains=query),
-                is_active=True
-            )
-        return Product.objects.filter(is_active=True)
+            return search_products(queryset, query)
+        return queryset.order_by('-created_at')
     
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['search_query'] = self.request.GET.get('q', '')
-        context['categories'] = ProductCategory.objects.filter(is_active=True)
-        context['countries'] = Country.objects.filter(is_active=True)
-        return context
\ No newline at end of file
+    async def get_extra_context(self):
+        search_query = self.request.GET.get('q', '')
+        categories, countries, wishlisted = await asyncio.gather(
+            fetch(ProductCategory.objects.filter(is_active=True)),
+            fetch(Country.objects.filter(is_active=True)),
+            self.get_wishlisted(),
+        )
+        
+        options = facet_options(categories, countries)
+        if search_query:
+            facets = await sync_to_async(facet_counts)(self.get_queryset(), options)
+        else:
+            facets = await sync_to_async(stored_facet_counts)(options)
+        return {
+            'search_query': search_query, 'categories': categories, 'countries': countries, 'facets': facets,
+            'wishlisted': wishlisted,
+        }
+
+
+class RequestMetricsView(UserPassesTestMixin, View):
+    raise_exception = True
+    
+    def test_func(self):
+        return self.request.user.is_staff
+    
+    def get(self, request, *args, **kwargs):
+        return JsonResponse({**metrics_store.report(), 'connections': connection_stats.report()})
+
+
+class WishlistUpdateView(LoginRequiredMixin, View):
+    """
+    Adds or removes the posted ``product`` ids in one go; repeating a request
+    changes nothing. Answers with the whole wishlist, or redirects to ``next``.
+    """
+    raise_exception = True
+    update = None
+    
+    def post(self, request, *args, **kwargs):
+        self.update(request.user.pk, product_ids(request.POST.getlist('product')))
+        next_url = request.POST.get('next')
+        if next_url and url_has_allowed_host_and_scheme(next_url, {request.get_host()}, request.is_secure()):
+            return redirect(next_url)
+        wishlist = wishlisted_ids(request.user.pk)
+        return JsonResponse({'products': sorted(wishlist), 'count': len(wishlist)})
+
+
+class WishlistAddView(WishlistUpdateView):
+    update = staticmethod(add_to_wishlist)
+
+
+class WishlistRemoveView(WishlistUpdateView):
+    update = staticmethod(remove_from_wishlist)
@@ -0,0 +1,87 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .cache import get_object_versions, touch_objects
+from .database import retry_on_locked
+from .models import Product, WishlistItem
+
+
+# Products a single add or remove request may name.
+MAX_BATCH = 100
+
+
+def wishlist_cache_key(user_id, version):
+    return f'main:wishlist:{user_id}:{version}'
+
+
+def wishlisted_ids(user_id):
+    """
+    The ids of the products ``user_id`` has wishlisted: from the cache, or
+    with one query that fills it. Keys carry a per-user version bumped on
+    every change, so no request sees a stale set.
+    """
+    if user_id is None:
+        return frozenset()
+    [version] = get_object_versions((WishlistItem, user_id))
+    key = wishlist_cache_key(user_id, version)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(WishlistItem.objects.filter(user_id=user_id).values_list('product_id', flat=True))
+        cache.set(key, ids, timeout=None)
+    return ids
+
+
+def counted_wishlist():
+    counts = (
+        WishlistItem.objects.filter(user=OuterRef('pk')).order_by()
+        .values('user').annotate(total=Count('pk')).values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def recount_wishlists(user_ids):
+    """
+    Store the wishlist size of ``user_ids`` from the rows themselves, in the
+    same UPDATE, so concurrent adds of the same product cannot skew it.
+    """
+    user_ids = [user_id for user_id in set(user_ids) if user_id is not None]
+    if not user_ids:
+        return
+    get_user_model().objects.filter(pk__in=user_ids).update(wishlist_count=counted_wishlist())
+    # The signed in user is cached with the old count and the ids with the
+    # old rows; touched again after commit in case a reader cached them meanwhile.
+    objects = [(model, user_id) for user_id in user_ids for model in (WishlistItem, get_user_model())]
+    touch_objects(*objects)
+    transaction.on_commit(lambda: touch_objects(*objects))
+
+
+def product_ids(values):
+    ids = set()
+    for value in values[:MAX_BATCH]:
+        try:
+            ids.add(int(value))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+@retry_on_locked
+@transaction.atomic
+def add_to_wishlist(user_id, ids):
+    """Wishlist the active products among ``ids``; ones already there are left alone."""
+    ids = list(Product.objects.filter(pk__in=ids, is_active=True).values_list('pk', flat=True))
+    WishlistItem.objects.bulk_create(
+        [WishlistItem(user_id=user_id, product_id=product_id) for product_id in ids], ignore_conflicts=True
+    )
+    recount_wishlists([user_id])
+    return ids
+
+
+@retry_on_locked
+@transaction.atomic
+def remove_from_wishlist(user_id, ids):
+    WishlistItem.objects.filter(user_id=user_id, product_id__in=ids).delete()
+    recount_wishlists([user_id])